@@ -0,0 +1,41 @@
+from asgiref.sync import sync_to_async
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework.exceptions import ParseError
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+from recoMusique.executors import ExecutorOverloaded
+from recoMusique.responses import json_response
+from .serializers import RegisterSerializer
+from .services.PasswordHashingService import hash_password
+
+# Inscription async (ASGI), activée par ACCOUNTS_PASSWORD_HASHING['ASYNC'].
+# Mêmes paramètres et mêmes réponses que RegisterView, mais le hachage du mot de passe se fait
+# dans le pool borné de PasswordHashingService : la boucle d'événements et le thread des
+# requêtes synchrones restent libres pendant les vagues d'inscriptions.
+
+def save_registration(serializer, password_hash):
+    # Écritures en base et représentation dans le même thread synchrone
+    serializer.save(password_hash=password_hash)
+    return serializer.data
+
+@csrf_exempt
+async def register(request):
+    if request.method != 'POST':
+        return json_response({"detail": f'Method "{request.method}" not allowed.'}, status=405, headers={'Allow': 'POST'})
+
+    try:
+        data = Request(request, parsers=[parser() for parser in api_settings.DEFAULT_PARSER_CLASSES]).data
+    except ParseError as e:
+        return json_response({"detail": e.detail}, status=400)
+
+    # Validation (unicité du username) en base, puis hachage hors du thread des requêtes
+    serializer = RegisterSerializer(data=data)
+    if not await sync_to_async(serializer.is_valid)():
+        return json_response(serializer.errors, status=400)
+
+    try:
+        password_hash = await hash_password(serializer.validated_data['password'])
+    except ExecutorOverloaded:
+        return json_response({"error": "Trop d'inscriptions en cours, réessayez dans un instant"}, status=503, headers={'Retry-After': '1'})
+
+    return json_response(await sync_to_async(save_registration)(serializer, password_hash), status=201)
@@ -0,0 +1,30 @@
+from django.conf import settings
+from django.contrib.auth import hashers
+
+# Hashers de Django avec les coûts de settings.ACCOUNTS_PASSWORD_HASHING.
+# Mêmes noms d'algorithme que Django : les hachages existants restent vérifiés, et ceux
+# calculés avec d'autres coûts sont re-hachés au login (must_update).
+
+def hashing_cost(algorithm, name, default):
+    value = settings.ACCOUNTS_PASSWORD_HASHING.get(algorithm, {}).get(name)
+    return default if value is None else value
+
+
+class PBKDF2PasswordHasher(hashers.PBKDF2PasswordHasher):
+    iterations = hashing_cost('PBKDF2', 'ITERATIONS', hashers.PBKDF2PasswordHasher.iterations)
+
+
+class ScryptPasswordHasher(hashers.ScryptPasswordHasher):
+    work_factor = hashing_cost('SCRYPT', 'WORK_FACTOR', hashers.ScryptPasswordHasher.work_factor)
+    block_size = hashing_cost('SCRYPT', 'BLOCK_SIZE', hashers.ScryptPasswordHasher.block_size)
+    parallelism = hashing_cost('SCRYPT', 'PARALLELISM', hashers.ScryptPasswordHasher.parallelism)
+
+
+class Argon2PasswordHasher(hashers.Argon2PasswordHasher):
+    time_cost = hashing_cost('ARGON2', 'TIME_COST', hashers.Argon2PasswordHasher.time_cost)
+    memory_cost = hashing_cost('ARGON2', 'MEMORY_COST', hashers.Argon2PasswordHasher.memory_cost)
+    parallelism = hashing_cost('ARGON2', 'PARALLELISM', hashers.Argon2PasswordHasher.parallelism)
+
+
+class BCryptSHA256PasswordHasher(hashers.BCryptSHA256PasswordHasher):
+    rounds = hashing_cost('BCRYPT', 'ROUNDS', hashers.BCryptSHA256PasswordHasher.rounds)
@@ -0,0 +1,14 @@
+from datetime import date
+from django.core.management.base import BaseCommand
+from accounts.models import DailySignupCount
+
+
+class Command(BaseCommand):
+    help = "Recalcule la table des inscriptions par jour et par rôle à partir de auth_user"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', type=date.fromisoformat, default=None, help="Ne recalcule que les jours à partir de cette date (AAAA-MM-JJ)")
+
+    def handle(self, *args, **options):
+        rows = DailySignupCount.rebuild(options['since'])
+        self.stdout.write(self.style.SUCCESS(f"{rows} lignes (jour, rôle) recalculées"))
@@ -0,0 +1,68 @@
+import os
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils.module_loading import import_string
+from accounts.serializers import RegisterSerializer
+
+
+class Command(BaseCommand):
+    help = "Mesure le débit d'inscriptions (inscriptions/s et par cœur) pour chaque algorithme de hachage"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--algorithm', action='append', choices=list(settings.PASSWORD_HASHER_CLASSES),
+                            help="Algorithme à mesurer (répétable), tous par défaut")
+        parser.add_argument('--count', type=int, default=50, help="Nombre d'inscriptions par algorithme")
+        parser.add_argument('--workers', type=int, default=settings.ACCOUNTS_PASSWORD_HASHING['MAX_WORKERS'], help="Threads de hachage")
+
+    def handle(self, *args, **options):
+        workers = max(1, options['workers'])
+        cores = min(workers, os.cpu_count() or 1)
+        self.stdout.write(f"{options['count']} inscriptions par algorithme, {workers} threads de hachage sur {cores} cœur(s)")
+
+        for algorithm in options['algorithm'] or list(settings.PASSWORD_HASHER_CLASSES):
+            hasher = import_string(settings.PASSWORD_HASHER_CLASSES[algorithm])()
+            try:
+                encoded = hasher.encode('benchmark', hasher.salt())
+            except ValueError as e:
+                # argon2-cffi / bcrypt non installés
+                self.stdout.write(f"- {algorithm} : ignoré ({e})")
+                continue
+
+            elapsed, hashing = self.run_registrations(hasher, options['count'], workers)
+            rate = options['count'] / elapsed
+            params = ', '.join(f'{key}={value}' for key, value in hasher.safe_summary(encoded).items() if key not in ('algorithm', 'salt', 'hash'))
+            self.stdout.write(
+                f"- {algorithm} ({params}) : {rate:.1f} inscriptions/s, {rate / cores:.1f} /s/cœur, "
+                f"hachage {hashing * 1000 / options['count']:.1f} ms par inscription"
+            )
+
+    def run_registrations(self, hasher, count, workers):
+        # Pipeline de la vue async : validation et écritures dans le thread principal, hachage dans le pool.
+        # Tout est annulé à la fin : la base n'est pas modifiée.
+        prefix = uuid.uuid4().hex[:8]
+        hashing = 0.0
+
+        def encode(password):
+            start = time.perf_counter()
+            encoded = hasher.encode(password, hasher.salt())
+            return encoded, time.perf_counter() - start
+
+        start = time.perf_counter()
+        with transaction.atomic(), ThreadPoolExecutor(workers, thread_name_prefix='password-hashing') as pool:
+            serializers = []
+            for i in range(count):
+                serializer = RegisterSerializer(data={
+                    'username': f'bench-{prefix}-{i}', 'password': f'Mot-de-passe-{prefix}-{i}', 'role': 'listener',
+                })
+                serializer.is_valid(raise_exception=True)
+                serializers.append(serializer)
+
+            for serializer, (encoded, duration) in zip(serializers, pool.map(encode, [s.validated_data['password'] for s in serializers])):
+                serializer.save(password_hash=encoded)
+                hashing += duration
+            transaction.set_rollback(True)
+        return time.perf_counter() - start, hashing
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from accounts.models import UserCounter
+
+
+class Command(BaseCommand):
+    help = "Recalcule les compteurs d'utilisateurs par rôle (après des modifications en masse sans signaux)"
+
+    def handle(self, *args, **options):
+        counts = UserCounter.rebuild()
+
+        for key, count in sorted(counts.items()):
+            self.stdout.write(f"- {key} : {count}")
+        self.stdout.write(self.style.SUCCESS("Compteurs d'utilisateurs recalculés"))
@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-18 01:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='userprofile',
+            name='role',
+            field=models.CharField(choices=[('artist', 'Artist'), ('listener', 'Listener'), ('admin', 'admin')], max_length=50),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2 on 2026-10-18 01:37
+
+from django.db import migrations, models
+
+
+def fill_user_counters(apps, schema_editor):
+    # Compteurs initiaux à partir des utilisateurs et profils existants
+    User = apps.get_model('auth', 'User')
+    UserProfile = apps.get_model('accounts', 'UserProfile')
+    UserCounter = apps.get_model('accounts', 'UserCounter')
+    counters = [UserCounter(key='users', count=User.objects.count())]
+    for row in UserProfile.objects.values('role').annotate(total=models.Count('id')):
+        counters.append(UserCounter(key=f"role:{row['role']}", count=row['total']))
+    UserCounter.objects.bulk_create(counters)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0002_alter_userprofile_role'),
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserCounter',
+            fields=[
+                ('key', models.CharField(max_length=50, primary_key=True, serialize=False)),
+                ('count', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(fill_user_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2 on 2026-10-18 01:38
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce, TruncDate
+
+
+def fill_daily_signup_counts(apps, schema_editor):
+    # Inscriptions existantes, par jour et par rôle ('' = sans profil)
+    User = apps.get_model('auth', 'User')
+    DailySignupCount = apps.get_model('accounts', 'DailySignupCount')
+    rows = (
+        User.objects.annotate(day=TruncDate('date_joined'), signup_role=Coalesce('profile__role', models.Value('')))
+        .values('day', 'signup_role')
+        .annotate(total=models.Count('id'))
+    )
+    DailySignupCount.objects.bulk_create([DailySignupCount(day=row['day'], role=row['signup_role'], count=row['total']) for row in rows])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0003_user_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailySignupCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('role', models.CharField(blank=True, max_length=50)),
+                ('count', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('day', 'role'), name='unique_daily_signup_role')],
+            },
+        ),
+        migrations.RunPython(fill_daily_signup_counts, migrations.RunPython.noop),
+    ]
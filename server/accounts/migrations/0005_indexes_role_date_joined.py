@@ -0,0 +1,30 @@
+# Generated by Django 5.2 on 2026-10-18 01:40
+
+from django.db import migrations, models
+
+# auth_user appartient à django.contrib.auth : son index est créé en SQL (syntaxe SQLite / PostgreSQL)
+USER_DATE_JOINED_INDEX = 'accounts_user_date_joined_idx'
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0004_daily_signup_counts'),
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='userprofile',
+            name='role',
+            field=models.CharField(choices=[('artist', 'Artist'), ('listener', 'Listener'), ('admin', 'admin')], db_index=True, max_length=50),
+        ),
+        migrations.AddIndex(
+            model_name='dailysignupcount',
+            index=models.Index(fields=['role', 'day'], name='daily_signup_role_day_idx'),
+        ),
+        migrations.RunSQL(
+            f'CREATE INDEX {USER_DATE_JOINED_INDEX} ON auth_user (date_joined)',
+            f'DROP INDEX {USER_DATE_JOINED_INDEX}',
+        ),
+    ]
@@ -1,11 +1,97 @@
+from datetime import datetime, time
 from django.db import models
+from django.utils import timezone
 from django.contrib.auth.models import User
+from django.db.models.functions import Coalesce, TruncDate
 
 class UserProfile(models.Model): 
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='profile')
     favorite_genres = models.CharField(max_length=255, blank=True)
     birth_date = models.DateField(null=True, blank=True)
-    role = models.CharField(max_length=50, choices=[('artist', 'Artist'), ('listener', 'Listener'), ('admin', 'admin')])
+    # Indexé : filtre par rôle de l'admin (list_filter) et des statistiques
+    role = models.CharField(max_length=50, choices=[('artist', 'Artist'), ('listener', 'Listener'), ('admin', 'admin')], db_index=True)
 
     def __str__(self):
         return f"{self.user.username}'s Profile"
+
+
+class UserCounter(models.Model):
+    """Compteurs dénormalisés pour les statistiques admin : nombre d'utilisateurs et nombre de profils par rôle.
+
+    Tenus à jour par les signaux de accounts/signals.py ; rebuild() les recalcule depuis les tables.
+    """
+    USERS = 'users'
+
+    key = models.CharField(max_length=50, primary_key=True)
+    count = models.BigIntegerField(default=0)
+
+    @staticmethod
+    def role_key(role):
+        return f"role:{role}"
+
+    @classmethod
+    def increment(cls, key, delta=1):
+        # Mise à jour atomique en base (F) : pas de perte si deux inscriptions arrivent en même temps
+        if not cls.objects.filter(key=key).update(count=models.F('count') + delta):
+            # Première occurrence : la ligne est créée directement avec delta, sauf si une autre requête vient de la créer
+            if not cls.objects.get_or_create(key=key, defaults={'count': delta})[1]:
+                cls.objects.filter(key=key).update(count=models.F('count') + delta)
+
+    @classmethod
+    def rebuild(cls):
+        counts = {cls.USERS: User.objects.count()}
+        for row in UserProfile.objects.values('role').annotate(total=models.Count('id')):
+            counts[cls.role_key(row['role'])] = row['total']
+        cls.objects.all().delete()
+        cls.objects.bulk_create([cls(key=key, count=count) for key, count in counts.items()])
+        return counts
+
+    def __str__(self):
+        return f"{self.key} = {self.count}"
+
+
+class DailySignupCount(models.Model):
+    """Nombre d'inscriptions par jour et par rôle ('' = utilisateur sans profil).
+
+    Tenu à jour par les signaux de accounts/signals.py ; les séries semaine / mois / année
+    de get_user_growth_statistics en sont dérivées sans parcourir auth_user.
+    """
+    NO_ROLE = ''
+
+    day = models.DateField()
+    role = models.CharField(max_length=50, blank=True)
+    count = models.BigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'role'], name='unique_daily_signup_role'),
+        ]
+        indexes = [
+            # Séries d'un seul rôle sur un intervalle de jours
+            models.Index(fields=['role', 'day'], name='daily_signup_role_day_idx'),
+        ]
+
+    @classmethod
+    def increment(cls, day, role, delta=1):
+        if not cls.objects.filter(day=day, role=role).update(count=models.F('count') + delta):
+            if not cls.objects.get_or_create(day=day, role=role, defaults={'count': delta})[1]:
+                cls.objects.filter(day=day, role=role).update(count=models.F('count') + delta)
+
+    @classmethod
+    def rebuild(cls, since=None):
+        """Recalcule toute la table, ou seulement les jours à partir de since (parcours de l'index sur date_joined)."""
+        users = User.objects.all()
+        days = cls.objects.all()
+        if since is not None:
+            users = users.filter(date_joined__gte=timezone.make_aware(datetime.combine(since, time.min)))
+            days = days.filter(day__gte=since)
+        rows = (
+            users.annotate(day=TruncDate('date_joined'), signup_role=Coalesce('profile__role', models.Value(cls.NO_ROLE)))
+            .values('day', 'signup_role')
+            .annotate(total=models.Count('id'))
+        )
+        days.delete()
+        return len(cls.objects.bulk_create([cls(day=row['day'], role=row['signup_role'], count=row['total']) for row in rows]))
+
+    def __str__(self):
+        return f"{self.day} {self.role or '-'} = {self.count}"
@@ -1,5 +1,7 @@
 from rest_framework import serializers
+from django.contrib.auth.hashers import make_password
 from django.contrib.auth.models import User
+from django.db import transaction
 from .models import UserProfile
 
 class UserSerializer(serializers.ModelSerializer):
@@ -31,11 +33,25 @@ class RegisterSerializer(serializers.ModelSerializer):
         favorite_genres = validated_data.pop('favorite_genres', '')
         birth_date = validated_data.pop('birth_date', None)
         role = validated_data.pop('role', 'listener')
-        # Creation de l'utilisateur 
-        user = User.objects.create_user(**validated_data)
+        # Mot de passe déjà haché hors du thread de la requête (save(password_hash=...), vue async)
+        password_hash = validated_data.pop('password_hash', None)
+        password = validated_data.pop('password')
+        # Creation de l'utilisateur : même normalisation et mêmes champs que create_user(),
+        # mot de passe haché ici ou déjà haché, puis un seul save()
+        user = User(
+            username=User.normalize_username(validated_data.pop('username')),
+            email=User.objects.normalize_email(validated_data.pop('email', None)),
+            is_staff=False, is_superuser=False, **validated_data,
+        )
+        user.password = password_hash if password_hash is not None else make_password(password)
+        # L'inscription est comptée directement sous le rôle du profil (accounts/signals.py)
+        user._signup_role = role
 
-        # Creation du profil utilisateur
-        UserProfile.objects.create(user=user, favorite_genres=favorite_genres, birth_date=birth_date, role=role)
+        # Utilisateur et profil ensemble : une inscription sans profil n'est pas comptée sous ce rôle
+        with transaction.atomic():
+            user.save()
+            # Creation du profil utilisateur (user.profile est renseigné au passage, sans requête)
+            UserProfile.objects.create(user=user, favorite_genres=favorite_genres, birth_date=birth_date, role=role)
 
         return user
     
@@ -45,8 +61,9 @@ class RegisterSerializer(serializers.ModelSerializer):
         representation = super().to_representation(instance)
         
         # Add UserProfile fields to the representation
+        # Après create(), le profil est déjà en cache sur l'utilisateur : aucune requête supplémentaire
         try:
-            user_profile = UserProfile.objects.get(user=instance)
+            user_profile = instance.profile
             representation['favorite_genres'] = user_profile.favorite_genres
             representation['birth_date'] = user_profile.birth_date
             representation['role'] = user_profile.role
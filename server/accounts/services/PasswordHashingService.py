@@ -0,0 +1,14 @@
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from recoMusique.executors import AsyncExecutor
+
+# Pool borné dédié au hachage : une vague d'inscriptions n'occupe ni la boucle d'événements
+# ni le pool de calcul des recommandations. PBKDF2, scrypt, argon2 et bcrypt relâchent le GIL,
+# les hachages s'exécutent donc réellement en parallèle sur MAX_WORKERS cœurs.
+password_hashing_executor = AsyncExecutor(
+    settings.ACCOUNTS_PASSWORD_HASHING['MAX_WORKERS'], settings.ACCOUNTS_PASSWORD_HASHING['MAX_PENDING'], 'password-hashing',
+)
+
+async def hash_password(password):
+    """make_password (hasher de PASSWORD_HASHERS) exécuté dans le pool ; ExecutorOverloaded si saturé."""
+    return await password_hashing_executor.submit(make_password, password)
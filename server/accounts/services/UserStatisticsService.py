@@ -1,6 +1,8 @@
-from typing import Dict, Any
-from accounts.models import User, UserProfile
-from django.db.models import Count
+from datetime import date, datetime, time
+from typing import Dict, Any, Optional
+from accounts.models import DailySignupCount, UserCounter
+from django.db.models import Sum
+from django.utils import timezone
 from django.db.models.functions import TruncMonth, TruncYear, TruncDay, TruncWeek
 
 class UserStatisticsService:
@@ -8,9 +10,11 @@ class UserStatisticsService:
     @staticmethod
     def get_user_statistics() -> Dict[str, Any]:
         
-        total_users = User.objects.count()
-        total_artists = UserProfile.objects.filter(role='artist').count()
-        total_listeners = UserProfile.objects.filter(role='listener').count()
+        # Une seule lecture de quelques lignes, quel que soit le nombre d'utilisateurs
+        counters = dict(UserCounter.objects.values_list('key', 'count'))
+        total_users = counters.get(UserCounter.USERS, 0)
+        total_artists = counters.get(UserCounter.role_key('artist'), 0)
+        total_listeners = counters.get(UserCounter.role_key('listener'), 0)
 
         return {
             "total_users" : total_users,
@@ -21,7 +25,8 @@ class UserStatisticsService:
         }
     
     @staticmethod
-    def get_user_growth_statistics(period: str = 'month') -> Dict[str, Any]:
+    def get_user_growth_statistics(period: str = 'month', role: Optional[str] = None, start: Optional[date] = None,
+                                   end: Optional[date] = None, by_role: bool = False) -> Dict[str, Any]:
 
         trunc_map = {
             'day': TruncDay,
@@ -30,15 +35,39 @@ class UserStatisticsService:
             'year': TruncYear,
         }
 
+        # Séries calculées sur la table des inscriptions par jour (une ligne par jour et par rôle)
         trunc_function = trunc_map.get(period, TruncMonth)
+        rows = DailySignupCount.objects.all()
+        if role is not None:
+            rows = rows.filter(role=role)
+        if start:
+            rows = rows.filter(day__gte=start)
+        if end:
+            rows = rows.filter(day__lte=end)
+
+        fields = ['period', 'role'] if by_role else ['period']
         user_growth = (
-            User.objects.annotate(period=trunc_function('date_joined'))
-            .values('period')
-            .annotate(user_count=Count('id'))
-            .order_by('period')
+            rows.annotate(period=trunc_function('day'))
+            .values(*fields)
+            .annotate(user_count=Sum('count'))
+            .order_by(*fields)
         )
 
+        growth_data = {}
+        for row in user_growth:
+            if not row['user_count']:
+                continue
+            # Début de période à minuit dans le fuseau courant, comme avec TruncX('date_joined')
+            period_start = timezone.make_aware(datetime.combine(row['period'], time.min))
+            item = growth_data.setdefault(period_start, {'period': period_start, 'user_count': 0})
+            item['user_count'] += row['user_count']
+            if by_role:
+                item.setdefault('roles', {})[row['role']] = row['user_count']
+
         return {
             "period": period,
-            "growth_data": list(user_growth)
+            "role": role,
+            "start": start,
+            "end": end,
+            "growth_data": list(growth_data.values())
         }
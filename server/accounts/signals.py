@@ -0,0 +1,85 @@
+from django.contrib.auth.models import User
+from django.db.models.signals import post_delete, post_init, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+from .models import DailySignupCount, UserCounter, UserProfile
+
+def signup_day(user):
+    # Même jour que TruncDate('date_joined') dans le fuseau courant
+    return timezone.localdate(user.date_joined) if timezone.is_aware(user.date_joined) else user.date_joined.date()
+
+# Les compteurs sont modifiés dans la même transaction que l'utilisateur / le profil :
+# une inscription annulée n'est pas comptée. Les update() / delete() en masse ne déclenchent
+# pas ces signaux : lancer ensuite python manage.py rebuild_user_counters et backfill_signup_rollups.
+
+@receiver(post_save, sender=User)
+def count_created_user(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        UserCounter.increment(UserCounter.USERS)
+        # Rôle du profil créé juste après (RegisterSerializer) : l'inscription est comptée une seule fois
+        DailySignupCount.increment(signup_day(instance), getattr(instance, '_signup_role', DailySignupCount.NO_ROLE))
+
+@receiver(post_delete, sender=User)
+def count_deleted_user(sender, instance, **kwargs):
+    UserCounter.increment(UserCounter.USERS, -1)
+    DailySignupCount.increment(signup_day(instance), DailySignupCount.NO_ROLE, -1)
+
+# Rôle non chargé (only() / defer()) : lu en base seulement si le profil est enregistré
+DEFERRED_ROLE = object()
+
+@receiver(post_init, sender=UserProfile)
+def remember_profile_role(sender, instance, **kwargs):
+    # Rôle tel qu'il est en base, pour détecter un changement de rôle au prochain save().
+    # __dict__ : lire instance.role sur un champ différé lancerait une requête par instance
+    if not instance.pk:
+        instance._counted_role = None
+    else:
+        instance._counted_role = instance.__dict__.get('role', DEFERRED_ROLE)
+
+@receiver(pre_save, sender=UserProfile)
+def load_deferred_role(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw or instance._counted_role is not DEFERRED_ROLE:
+        return
+    if update_fields is not None and 'role' not in update_fields:
+        return
+    instance._counted_role = sender.objects.filter(pk=instance.pk).values_list('role', flat=True).first()
+
+@receiver(post_save, sender=UserProfile)
+def count_saved_profile(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    previous_role = None if created else instance._counted_role
+    if previous_role is DEFERRED_ROLE:
+        # Rôle ni chargé ni enregistré (update_fields sans role) : inchangé
+        return
+    if previous_role != instance.role:
+        if previous_role is not None:
+            UserCounter.increment(UserCounter.role_key(previous_role), -1)
+        UserCounter.increment(UserCounter.role_key(instance.role))
+        # L'inscription du jour passe de "sans profil" (ou du rôle sous lequel elle est comptée) au rôle du profil
+        if previous_role is None:
+            counted_role = instance.user.__dict__.pop('_signup_role', DailySignupCount.NO_ROLE)
+        else:
+            counted_role = previous_role
+        if counted_role != instance.role:
+            day = signup_day(instance.user)
+            DailySignupCount.increment(day, counted_role, -1)
+            DailySignupCount.increment(day, instance.role)
+    instance._counted_role = instance.role
+
+@receiver(pre_delete, sender=UserProfile)
+def load_profile_before_delete(sender, instance, **kwargs):
+    # Après la suppression, un champ différé (rôle, utilisateur) ne peut plus être lu
+    if instance._counted_role is DEFERRED_ROLE:
+        instance._counted_role = instance.role
+    if instance._counted_role is not None:
+        instance._counted_day = signup_day(instance.user)
+
+@receiver(post_delete, sender=UserProfile)
+def count_deleted_profile(sender, instance, **kwargs):
+    if instance._counted_role is not None:
+        UserCounter.increment(UserCounter.role_key(instance._counted_role), -1)
+        # Le profil est supprimé avant son utilisateur : celui-ci redevient "sans profil"
+        day = instance._counted_day
+        DailySignupCount.increment(day, instance._counted_role, -1)
+        DailySignupCount.increment(day, DailySignupCount.NO_ROLE)
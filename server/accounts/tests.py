@@ -1,3 +1,272 @@
-from django.test import TestCase
+import os
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.db import connection
+from django.contrib.auth.hashers import identify_hasher
+from django.test import AsyncRequestFactory, TestCase
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+from . import async_views
+from .models import DailySignupCount, UserCounter, UserProfile
+from .services.PasswordHashingService import password_hashing_executor
 
-# Create your tests here.
+# Nombre d'utilisateurs générés pour les tests d'index ; 1 000 000 pour le benchmark complet :
+# ACCOUNTS_BENCHMARK_USERS=1000000 python manage.py test accounts
+BENCHMARK_USERS = int(os.environ.get('ACCOUNTS_BENCHMARK_USERS', 5000))
+BATCH_SIZE = 5000
+
+def seed_users(total):
+    """Insère total utilisateurs répartis sur ~3 ans, 1 % d'admins et ~1/8 sans profil."""
+    first_day = datetime(2023, 1, 1, tzinfo=dt_timezone.utc)
+    roles = ['artist', 'listener', 'listener', 'artist', 'listener', 'listener', 'artist']
+    for offset in range(0, total, BATCH_SIZE):
+        numbers = range(offset, min(offset + BATCH_SIZE, total))
+        # bulk_create ne déclenche pas les signaux : compteurs et rollups sont recalculés à la fin
+        users = User.objects.bulk_create([
+            User(username=f'bench{i}', password='!', date_joined=first_day + timedelta(minutes=i * 97 % (3 * 365 * 24 * 60)))
+            for i in numbers
+        ])
+        UserProfile.objects.bulk_create([
+            UserProfile(user=user, role='admin' if i % 100 == 0 else roles[i % len(roles)])
+            for i, user in zip(numbers, users) if i % 8
+        ])
+    UserCounter.rebuild()
+    DailySignupCount.rebuild()
+    # Statistiques du planificateur à jour, comme en production après un ANALYZE
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE')
+
+
+class IndexUsageTests(TestCase):
+    """Les requêtes de l'admin et des statistiques passent par les index de la migration 0005."""
+
+    @classmethod
+    def setUpTestData(cls):
+        seed_users(BENCHMARK_USERS)
+
+    def index_names(self, table, columns):
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(cursor, table)
+        return [name for name, info in constraints.items() if info['index'] and info['columns'][:len(columns)] == columns]
+
+    def assertUsesIndex(self, queryset, table, columns):
+        names = self.index_names(table, columns)
+        self.assertTrue(names, f"Aucun index sur {table}{columns}")
+        plan = queryset.explain()
+        self.assertTrue(any(name in plan for name in names), f"Index {names} non utilisé :\n{plan}")
+
+    def test_admin_role_filter(self):
+        # list_filter = ('role',) de UserProfileAdmin
+        self.assertUsesIndex(UserProfile.objects.filter(role='admin'), 'accounts_userprofile', ['role'])
+
+    def test_role_count(self):
+        self.assertUsesIndex(UserProfile.objects.filter(role='admin').values('id'), 'accounts_userprofile', ['role'])
+        self.assertEqual(
+            UserProfile.objects.filter(role='admin').count(),
+            UserCounter.objects.get(key=UserCounter.role_key('admin')).count,
+        )
+
+    def test_date_joined_range(self):
+        since = datetime(2025, 6, 1, tzinfo=dt_timezone.utc)
+        self.assertUsesIndex(User.objects.filter(date_joined__gte=since), 'auth_user', ['date_joined'])
+
+    def test_growth_by_role(self):
+        # Filtre de get_user_growth_statistics(role=..., start=..., end=...)
+        rows = DailySignupCount.objects.filter(role='artist', day__gte=date(2024, 1, 1), day__lte=date(2024, 12, 31))
+        self.assertUsesIndex(rows, 'accounts_dailysignupcount', ['role', 'day'])
+
+    def test_rollups_match_users(self):
+        total = sum(DailySignupCount.objects.values_list('count', flat=True))
+        self.assertEqual(total, User.objects.count())
+
+
+class AccountViewsQueryCountTests(TestCase):
+    """Nombre de requêtes SQL par endpoint de accounts/views.py, compteurs déjà initialisés.
+
+    force_authenticate évite la requête d'authentification, comptée à part dans test_profile_with_jwt.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        # Un utilisateur de chaque rôle inscrit aujourd'hui : les lignes de compteurs et de rollups existent
+        for username, role in (('artist', 'artist'), ('listener', 'listener')):
+            user = User.objects.create_user(username, password='MotDePasse-123')
+            UserProfile.objects.create(user=user, role=role, favorite_genres='Pop')
+        cls.user = User.objects.get(username='artist')
+        cls.admin = User.objects.create_user('admin', password='MotDePasse-123', is_staff=True)
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def test_register(self):
+        # unicité du username, début et fin de transaction, utilisateur, profil, 2 compteurs, 1 rollup
+        with self.assertNumQueries(8) as queries:
+            response = self.client.post('/api/auth/register/', {
+                'username': 'nouveau', 'password': 'MotDePasse-123', 'email': 'nouveau@example.com', 'role': 'artist', 'favorite_genres': 'Rock',
+            }, format='json')
+        self.assertEqual(response.status_code, 201)
+        # Inscription comptée une seule fois, directement sous son rôle
+        self.assertEqual(len([query for query in queries.captured_queries if 'accounts_dailysignupcount' in query['sql']]), 1)
+        self.assertEqual(dict(DailySignupCount.objects.values_list('role', 'count')), {'artist': 2, 'listener': 1, DailySignupCount.NO_ROLE: 1})
+        self.assertEqual(response.data['role'], 'artist')
+        self.assertEqual(response.data['favorite_genres'], 'Rock')
+
+    def test_register_invalid(self):
+        with self.assertNumQueries(1):
+            response = self.client.post('/api/auth/register/', {'username': 'artist', 'password': 'x', 'role': 'artist'}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_profile(self):
+        self.client.force_authenticate(self.user)
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/auth/profile/')
+        self.assertEqual(response.data['user']['username'], 'artist')
+
+    def test_profile_with_jwt(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/auth/profile/')
+        self.assertEqual(response.status_code, 200)
+
+    def test_profile_update(self):
+        self.client.force_authenticate(self.user)
+        with self.assertNumQueries(2):
+            response = self.client.patch('/api/auth/profile/', {'favorite_genres': 'Jazz'}, format='json')
+        self.assertEqual(response.data['favorite_genres'], 'Jazz')
+        self.assertEqual(response.data['user']['username'], 'artist')
+
+    def test_profile_role_change(self):
+        self.client.force_authenticate(self.user)
+        # lecture, mise à jour, 2 compteurs de rôle, 2 rollups
+        with self.assertNumQueries(6):
+            response = self.client.patch('/api/auth/profile/', {'role': 'listener'}, format='json')
+        self.assertEqual(response.data['role'], 'listener')
+
+    def test_current_user(self):
+        self.client.force_authenticate(self.user)
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/auth/me/')
+        self.assertEqual(response.data['username'], 'artist')
+
+    def test_user_statistics(self):
+        self.client.force_authenticate(self.admin)
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/auth/user-statistics/')
+        self.assertEqual(response.data['total_users'], 3)
+
+    def test_user_growth_statistics(self):
+        self.client.force_authenticate(self.admin)
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/auth/user-growth-statistics/', {'period': 'day', 'by_role': 'true'})
+        self.assertEqual(response.data['growth_data'][0]['user_count'], 3)
+
+
+class ProfileRoleCounterTests(TestCase):
+    """Compteurs de rôle tenus à jour par les signaux, y compris sur des profils chargés sans leur rôle."""
+
+    def setUp(self):
+        for i, role in enumerate(('artist', 'listener', 'listener')):
+            UserProfile.objects.create(user=User.objects.create_user(f'user{i}'), role=role)
+
+    def role_count(self, role):
+        return UserCounter.objects.get(key=UserCounter.role_key(role)).count
+
+    def test_deferred_role_without_queries(self):
+        with self.assertNumQueries(1):
+            profiles = list(UserProfile.objects.only('id', 'favorite_genres'))
+        self.assertEqual(len(profiles), 3)
+
+    def test_deferred_role_change(self):
+        profile = UserProfile.objects.only('id').get(user__username='user0')
+        profile.role = 'listener'
+        profile.save()
+        self.assertEqual((self.role_count('artist'), self.role_count('listener')), (0, 3))
+
+        # Enregistrement sans le rôle : aucun compteur modifié
+        profile = UserProfile.objects.only('id', 'favorite_genres').get(user__username='user1')
+        profile.favorite_genres = 'Jazz'
+        profile.save(update_fields=['favorite_genres'])
+        self.assertEqual((self.role_count('artist'), self.role_count('listener')), (0, 3))
+
+    def test_deferred_role_delete(self):
+        UserProfile.objects.only('id').get(user__username='user1').delete()
+        self.assertEqual(self.role_count('listener'), 1)
+
+    def test_rollups_match_rebuild(self):
+        client = APIClient()
+        for username, role in (('inscrit1', 'artist'), ('inscrit2', 'listener')):
+            client.post('/api/auth/register/', {'username': username, 'password': 'MotDePasse-123', 'role': role}, format='json')
+        User.objects.create_user('sans-profil')
+        profile = UserProfile.objects.get(user__username='inscrit1')
+        profile.role = 'listener'
+        profile.save()
+        User.objects.get(username='inscrit2').delete()
+
+        counted = sorted(DailySignupCount.objects.filter(count__gt=0).values_list('day', 'role', 'count'))
+        DailySignupCount.rebuild()
+        self.assertEqual(counted, sorted(DailySignupCount.objects.values_list('day', 'role', 'count')))
+
+
+class AsyncRegisterTests(TestCase):
+    """Inscription async : mêmes réponses que RegisterView, hachage dans le pool borné."""
+
+    def setUp(self):
+        self.factory = AsyncRequestFactory()
+
+    def post(self, data):
+        return self.factory.post('/api/auth/register/', data, content_type='application/json')
+
+    async def test_register(self):
+        response = await async_views.register(self.post({'username': 'async', 'password': 'MotDePasse-123', 'role': 'artist'}))
+        self.assertEqual(response.status_code, 201)
+        self.assertIn(b'"role":"artist"', response.content)
+
+        user = await User.objects.select_related('profile').aget(username='async')
+        self.assertEqual(user.profile.role, 'artist')
+        self.assertTrue(await user.acheck_password('MotDePasse-123'))
+        self.assertEqual(identify_hasher(user.password).__class__.__module__, 'accounts.hashers')
+
+    async def test_register_normalizes_like_create_user(self):
+        data = {'password': 'MotDePasse-123', 'role': 'listener', 'email': 'Nom@EXAMPLE.COM'}
+        await async_views.register(self.post({**data, 'username': 'ﬁnale'}))
+        user = await User.objects.aget(email='Nom@example.com')
+        self.assertEqual(user.username, 'finale')
+        self.assertFalse(user.is_staff or user.is_superuser)
+
+        # Même normalisation par la vue synchrone (mot de passe haché dans la requête)
+        await sync_to_async(APIClient().post)('/api/auth/register/', {**data, 'username': 'ﬁn', 'email': 'Autre@EXAMPLE.COM'}, format='json')
+        user = await User.objects.aget(email='Autre@example.com')
+        self.assertEqual(user.username, 'fin')
+        self.assertTrue(await user.acheck_password('MotDePasse-123'))
+
+    def test_register_matches_create_user(self):
+        # Mêmes champs que create_user() pour les mêmes données
+        data = {'username': 'ﬁgure', 'email': 'Nom@EXAMPLE.COM', 'password': 'MotDePasse-123', 'first_name': 'Nom'}
+        APIClient().post('/api/auth/register/', {**data, 'role': 'listener'}, format='json')
+        registered = User.objects.get(email='Nom@example.com')
+        registered_fields = {field: getattr(registered, field) for field in ('username', 'email', 'first_name', 'is_active', 'is_staff', 'is_superuser')}
+        registered.delete()
+
+        created = User.objects.create_user(**data)
+        self.assertEqual(registered_fields, {field: getattr(created, field) for field in registered_fields})
+        self.assertTrue(created.check_password('MotDePasse-123'))
+
+    async def test_register_invalid(self):
+        response = await async_views.register(self.post({'username': 'async', 'role': 'inconnu'}))
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(await User.objects.filter(username='async').aexists())
+
+    async def test_register_overloaded(self):
+        max_pending = password_hashing_executor.max_pending
+        password_hashing_executor.max_pending = 0
+        try:
+            response = await async_views.register(self.post({'username': 'async', 'password': 'MotDePasse-123', 'role': 'artist'}))
+        finally:
+            password_hashing_executor.max_pending = max_pending
+        self.assertEqual(response.status_code, 503)
+        self.assertFalse(await User.objects.filter(username='async').aexists())
+
+    async def test_method_not_allowed(self):
+        response = await async_views.register(self.factory.get('/api/auth/register/'))
+        self.assertEqual(response.status_code, 405)
@@ -1,9 +1,13 @@
+from django.conf import settings
 from django.urls import path
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
-from . import views
+from . import views, async_views
+
+# Sous ASGI, l'inscription peut être servie par sa version async (hachage dans un pool borné)
+register_view = async_views.register if settings.ACCOUNTS_PASSWORD_HASHING['ASYNC'] else views.RegisterView.as_view()
 
 urlpatterns = [
-    path('register/', views.RegisterView.as_view(), name='register'),
+    path('register/', register_view, name='register'),
     path('profile/', views.UserProfileView.as_view(), name='profile'),
     path('me/', views.current_user, name='current_user'),
     path('login/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
@@ -2,12 +2,24 @@ from rest_framework import generics, permissions
 from rest_framework.response import Response
 from rest_framework.decorators import api_view, permission_classes
 from django.contrib.auth.models import User
+from django.utils.dateparse import parse_date
 from .models import UserProfile
 from .serializers import UserProfileSerializer, UserSerializer, RegisterSerializer
 from .services.UserStatisticsService import UserStatisticsService
 
 user_statistics_service = UserStatisticsService()
 
+ROLES = [role for role, _ in UserProfile._meta.get_field('role').choices]
+
+def parse_date_param(value):
+    # None si le paramètre est absent, ValueError s'il n'est pas une date valide
+    if not value:
+        return None
+    parsed = parse_date(value)
+    if parsed is None:
+        raise ValueError(value)
+    return parsed
+
 class RegisterView(generics.CreateAPIView):
     queryset = User.objects.all()
     permission_classes = (permissions.AllowAny,)
@@ -18,7 +30,8 @@ class UserProfileView(generics.RetrieveUpdateAPIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def get_object(self):
-        return UserProfile.objects.get(user=self.request.user)
+        # L'utilisateur est chargé dans la même requête que le profil (UserSerializer imbriqué)
+        return UserProfile.objects.select_related('user').get(user=self.request.user)
     
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
@@ -36,5 +49,18 @@ def get_users_statistics(request):
 @permission_classes([permissions.IsAuthenticated, permissions.IsAdminUser])
 def get_user_growth_statistics(request):
     period = request.query_params.get('period', 'month')
-    statistics = user_statistics_service.get_user_growth_statistics(period)
-    return Response(statistics)
\ No newline at end of file
+    role = request.query_params.get('role', None)
+    by_role = request.query_params.get('by_role', '').lower() in ('1', 'true', 'yes')
+
+    # Bornes optionnelles au format AAAA-MM-JJ, incluses
+    try:
+        start = parse_date_param(request.query_params.get('start', None))
+        end = parse_date_param(request.query_params.get('end', None))
+    except ValueError:
+        return Response({"error": "start et end doivent être des dates au format AAAA-MM-JJ"}, status=400)
+
+    if role is not None and role not in ROLES:
+        return Response({"error": f"Rôle invalide, valeurs possibles : {', '.join(ROLES)}"}, status=400)
+
+    statistics = user_statistics_service.get_user_growth_statistics(period, role, start, end, by_role)
+    return Response(statistics)
@@ -0,0 +1,93 @@
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class ExecutorOverloaded(Exception):
+    """Trop de tâches en attente : la requête est refusée plutôt que mise en file indéfiniment."""
+
+
+class AsyncExecutor:
+    """Pool de threads borné pour le travail bloquant des vues async (calcul des recommandations, hachage des mots de passe).
+
+    Les tâches ne bloquent pas la boucle d'événements. Les requêtes identiques en cours
+    attendent le même calcul au lieu d'en lancer un chacune (run), et au-delà de max_pending
+    tâches en attente les nouvelles requêtes sont refusées (ExecutorOverloaded).
+    Chaque application crée son propre pool : une saturation de l'un ne bloque pas l'autre.
+    """
+
+    def __init__(self, max_workers=4, max_pending=64, thread_name_prefix='async-executor'):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.thread_name_prefix = thread_name_prefix
+        self._executor = None
+        self._executor_pid = None
+        self._lock = threading.Lock()
+        # (boucle, clé) -> future du calcul en cours ; uniquement manipulé depuis la boucle
+        self._in_flight = {}
+        self._pending = 0
+        self._submitted = 0
+        self._coalesced = 0
+        self._rejected = 0
+
+    def _pool(self):
+        # Créé à la demande dans chaque processus : les threads ne survivent pas au fork des workers
+        if self._executor_pid != os.getpid():
+            with self._lock:
+                if self._executor_pid != os.getpid():
+                    self._executor = ThreadPoolExecutor(self.max_workers, thread_name_prefix=self.thread_name_prefix)
+                    self._executor_pid = os.getpid()
+        return self._executor
+
+    def _done(self, flight_key):
+        self._in_flight.pop(flight_key, None)
+        self._pending -= 1
+
+    async def submit(self, func, *args, admitted=False):
+        """Exécute func(*args) dans le pool, sans fusion des requêtes identiques.
+
+        admitted=True : suite d'un travail déjà accepté (morceaux d'une réponse en cours d'envoi),
+        jamais refusée pour surcharge.
+        """
+        if not admitted and self._pending >= self.max_pending:
+            self._rejected += 1
+            raise ExecutorOverloaded()
+        self._pending += 1
+        self._submitted += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._pool(), func, *args)
+        finally:
+            self._pending -= 1
+
+    async def run(self, key, func):
+        """Exécute func() dans le pool ; les appels concurrents avec la même clé partagent le résultat."""
+        loop = asyncio.get_running_loop()
+        flight_key = (id(loop), key)
+
+        future = self._in_flight.get(flight_key)
+        if future is not None:
+            self._coalesced += 1
+            # shield : l'annulation d'une requête (client parti) n'annule pas le calcul des autres
+            return await asyncio.shield(future)
+
+        if self._pending >= self.max_pending:
+            self._rejected += 1
+            raise ExecutorOverloaded()
+
+        future = loop.run_in_executor(self._pool(), func)
+        self._pending += 1
+        self._submitted += 1
+        self._in_flight[flight_key] = future
+        future.add_done_callback(lambda _: self._done(flight_key))
+        return await asyncio.shield(future)
+
+    def stats(self):
+        return {
+            'max_workers': self.max_workers,
+            'max_pending': self.max_pending,
+            'pending': self._pending,
+            'submitted': self._submitted,
+            'coalesced': self._coalesced,
+            'rejected': self._rejected,
+        }
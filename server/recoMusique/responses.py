@@ -0,0 +1,7 @@
+from django.http import HttpResponse
+from rest_framework.renderers import JSONRenderer
+
+
+def json_response(data, status=200, headers=None):
+    """Réponse JSON des vues async, avec le même rendu que les Response DRF des vues synchrones."""
+    return HttpResponse(JSONRenderer().render(data), status=status, content_type='application/json', headers=headers)
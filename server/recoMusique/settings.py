@@ -109,6 +109,34 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# Hachage des mots de passe (accounts/hashers.py).
+# ALGORITHM : 'pbkdf2' (défaut Django), 'scrypt', 'argon2' (pip install argon2-cffi) ou 'bcrypt' (pip install bcrypt).
+# Les coûts de chaque algorithme sont réglables (None = valeur par défaut de Django) ; les mots de passe
+# hachés avec un autre algorithme ou d'autres coûts restent valides et sont re-hachés au prochain login.
+# ASYNC : inscription async (déploiement ASGI), le hachage passe par un pool de MAX_WORKERS threads ;
+# au-delà de MAX_PENDING hachages en attente, les inscriptions reçoivent un 503.
+# Mesure : python manage.py benchmark_registrations
+ACCOUNTS_PASSWORD_HASHING = {
+    'ALGORITHM': 'pbkdf2',
+    'PBKDF2': {'ITERATIONS': None},
+    'SCRYPT': {'WORK_FACTOR': None, 'BLOCK_SIZE': None, 'PARALLELISM': None},
+    'ARGON2': {'TIME_COST': None, 'MEMORY_COST': None, 'PARALLELISM': None},
+    'BCRYPT': {'ROUNDS': None},
+    'ASYNC': False,
+    'MAX_WORKERS': 4,
+    'MAX_PENDING': 64,
+}
+PASSWORD_HASHER_CLASSES = {
+    'pbkdf2': 'accounts.hashers.PBKDF2PasswordHasher',
+    'scrypt': 'accounts.hashers.ScryptPasswordHasher',
+    'argon2': 'accounts.hashers.Argon2PasswordHasher',
+    'bcrypt': 'accounts.hashers.BCryptSHA256PasswordHasher',
+}
+# Le premier hasher sert aux nouveaux mots de passe, les autres à vérifier les anciens
+PASSWORD_HASHERS = [PASSWORD_HASHER_CLASSES[ACCOUNTS_PASSWORD_HASHING['ALGORITHM']]] + [
+    path for algorithm, path in PASSWORD_HASHER_CLASSES.items() if algorithm != ACCOUNTS_PASSWORD_HASHING['ALGORITHM']
+] + ['django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher']
+
 
 # Internationalization
 # https://docs.djangoproject.com/en/5.2/topics/i18n/
@@ -156,6 +184,57 @@ CORS_ALLOW_ALL_ORIGINS = True  # For development only, restrict this in producti
 
 # Data directory settings
 DATA_DIR = os.path.join(BASE_DIR, 'data', 'csv')
+# Snapshot binaire des CSV (python manage.py build_data_snapshot)
+DATA_SNAPSHOT_DIR = os.path.join(BASE_DIR, 'data', 'snapshot')
+# Réponses précalculées des endpoints de recommandation (python manage.py precompute_recommendations)
+PRECOMPUTED_DIR = os.path.join(BASE_DIR, 'data', 'precomputed')
+# Intervalle (secondes) de vérification des CSV pour le rechargement à chaud, 0 = désactivé
+DATASET_RELOAD_INTERVAL = 0
+# Fichier touché par POST /api/music/datasets/reload/ : chaque worker qui voit sa date changer se recharge
+DATASET_RELOAD_SIGNAL = os.path.join(BASE_DIR, 'data', 'reload_signal')
+
+# Cache des réponses de /api/music/ (clé = endpoint + paramètres + version des données)
+# 'lru' : mémoire du processus, borné à MAX_ENTRIES
+# 'django' : cache Django ALIAS de CACHES (LocMemCache, RedisCache, ...), expiration TIMEOUT
+RECOMMENDATIONS_CACHE = {
+    'BACKEND': 'lru',
+    'MAX_ENTRIES': 1024,
+    'ALIAS': 'default',
+    'TIMEOUT': None,
+}
+# Cache-Control des réponses 200/304 de /api/music/ (accompagnées d'un ETag et de Vary: Authorization).
+# 'private' : seul le navigateur garde la réponse et la revalide avec If-None-Match.
+# 'public' ne convient que si le proxy frontal authentifie lui-même les requêtes (JWT) avant de
+# servir son cache : sinon une réponse mise en cache serait servie sans authentification.
+RECOMMENDATIONS_CACHE_CONTROL = 'private, max-age=60'
+# Vues async des endpoints de recommandation (déploiement ASGI : uvicorn recoMusique.asgi:application).
+# Le calcul pandas/NumPy passe par un pool de MAX_WORKERS threads ; au-delà de MAX_PENDING calculs
+# en attente, les requêtes reçoivent un 503. Les requêtes identiques en cours partagent le même calcul.
+RECOMMENDATIONS_ASYNC = {
+    'ENABLED': False,
+    'MAX_WORKERS': 4,
+    'MAX_PENDING': 64,
+}
+# Calcul des opérations lourdes de MusicServiceArtist (métriques, listes de pistes, similarité)
+# 'local' : dans le thread de la requête
+# 'process' : dans un pool de MAX_WORKERS processus (START_METHOD : forkserver par défaut), au plus
+#   MAX_QUEUE calculs en attente (503 au-delà) et TIMEOUT secondes par calcul (504 au-delà).
+#   Construire le snapshot (build_data_snapshot) pour que les processus partagent les données en mmap.
+RECOMMENDATIONS_COMPUTE = {
+    'BACKEND': 'local',
+    'MAX_WORKERS': 2,
+    'TIMEOUT': 10,
+    'MAX_QUEUE': 32,
+    'START_METHOD': None,
+    'OPERATIONS': [
+        'get_tracks_from_genre_and_region',
+        'get_similar_tracks',
+        'get_metrics_by_genre',
+        'get_metrics_by_region',
+    ],
+}
+# Réponses personnalisées (recommandations calculées à partir du profil) : jamais partagées par un proxy.
+RECOMMENDATIONS_PRIVATE_CACHE_CONTROL = 'private, max-age=60'
 
 X_FRAME_OPTIONS = "SAMEORIGIN"
 SILENCED_SYSTEM_CHECKS = ["security.W019"]
\ No newline at end of file
@@ -14,3 +14,9 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'recoMusique.settings')
 
 application = get_wsgi_application()
+
+# Chargement des jeux de données avant le fork des workers (gunicorn --preload) :
+# ils sont partagés en copy-on-write au lieu d'être rechargés par chaque worker
+from recommendations.services.DatasetRegistry import dataset_registry  # noqa: E402
+
+dataset_registry.load_all()
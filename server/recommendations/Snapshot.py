@@ -0,0 +1,158 @@
+import json
+import os
+import shutil
+import numpy as np
+import pandas as pd
+
+# Fichiers CSV sources de chaque jeu de données du snapshot
+SNAPSHOT_SOURCES = {
+    'genre_region_age': 'df_genre_region_age_augmente.csv',
+    'tracks': 'df_tracks.csv',
+}
+
+MANIFEST_NAME = 'manifest.json'
+
+def source_signature(path):
+    """Taille + date de modification du CSV, pour savoir si le snapshot est périmé."""
+    stat = os.stat(path)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+def _save(directory, file_name, array):
+    np.save(os.path.join(directory, file_name), np.ascontiguousarray(array), allow_pickle=False)
+    return file_name
+
+def _load(directory, file_name):
+    # mmap : les pages sont partagées entre processus et chargées à la demande
+    return np.load(os.path.join(directory, file_name), mmap_mode='r', allow_pickle=False)
+
+def _save_strings(directory, file_name, values):
+    return _save(directory, file_name, np.array([str(value) for value in values], dtype=str))
+
+def write_frame(directory, name, df, list_columns=None):
+    """Écrit un DataFrame colonne par colonne en fichiers .npy typés.
+
+    Les colonnes texte sont stockées en catégoriel (codes + catégories), les colonnes
+    de listes (list_columns, absentes du DataFrame) en codes à plat + offsets (voir parse_list_column).
+    """
+    list_columns = list_columns or {}
+    columns = []
+    for position, (col, lists) in enumerate(list_columns.items()):
+        prefix = f"{name}.list{position}"
+        columns.append({
+            'name': col,
+            'kind': 'list',
+            'codes': _save(directory, f"{prefix}.codes.npy", lists['codes']),
+            'offsets': _save(directory, f"{prefix}.offsets.npy", lists['offsets']),
+            'categories': _save_strings(directory, f"{prefix}.categories.npy", lists['categories']),
+        })
+
+    for position, col in enumerate(df.columns):
+        prefix = f"{name}.{position}"
+        series = df[col]
+
+        if isinstance(series.dtype, pd.CategoricalDtype) or not (pd.api.types.is_numeric_dtype(series) or pd.api.types.is_bool_dtype(series)):
+            categorical = series.astype('category')
+            columns.append({
+                'name': col,
+                'kind': 'category',
+                'codes': _save(directory, f"{prefix}.codes.npy", categorical.cat.codes.to_numpy(dtype=np.int32)),
+                'categories': _save_strings(directory, f"{prefix}.categories.npy", categorical.cat.categories),
+            })
+        else:
+            columns.append({
+                'name': col,
+                'kind': 'array',
+                'values': _save(directory, f"{prefix}.npy", series.to_numpy()),
+            })
+
+    return {'rows': len(df), 'columns': columns}
+
+def read_frame(directory, frame_manifest):
+    """Reconstruit le DataFrame et les colonnes de listes à partir des fichiers .npy.
+
+    Les colonnes de listes restent en codes + offsets mappés : aucune liste Python par piste.
+    """
+    data = {}
+    list_columns = {}
+    for column in frame_manifest['columns']:
+        if column['kind'] == 'list':
+            categories = _load(directory, column['categories']).tolist()
+            codes = _load(directory, column['codes'])
+            offsets = _load(directory, column['offsets'])
+            list_columns[column['name']] = {
+                'categories': categories,
+                'category_index': {item: i for i, item in enumerate(categories)},
+                'codes': codes,
+                'offsets': offsets,
+            }
+        elif column['kind'] == 'category':
+            categories = pd.Index(_load(directory, column['categories']).tolist())
+            data[column['name']] = pd.Categorical.from_codes(_load(directory, column['codes']), categories=categories)
+        else:
+            data[column['name']] = _load(directory, column['values'])
+
+    return pd.DataFrame(data, copy=False), list_columns
+
+def write_manifest_directory(directory, write_files):
+    """Écrit un répertoire à côté de `directory` puis le met en place d'un coup (snapshot, réponses précalculées).
+
+    write_files(tmp_dir) écrit les fichiers et retourne le manifeste, écrit en dernier :
+    sans lui, le répertoire est ignoré par les lecteurs.
+    """
+    tmp_dir = f"{directory}.tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    manifest = write_files(tmp_dir)
+    with open(os.path.join(tmp_dir, MANIFEST_NAME), 'w', encoding='utf-8') as manifest_file:
+        json.dump(manifest, manifest_file, ensure_ascii=False, indent=2)
+
+    shutil.rmtree(directory, ignore_errors=True)
+    os.replace(tmp_dir, directory)
+    return manifest
+
+def write_data_snapshot(snapshot_dir, data_dir, frames):
+    """Écrit le snapshot dans un répertoire temporaire puis le met en place d'un coup.
+
+    frames : {nom: (DataFrame, colonnes_de_listes)} pour les noms de SNAPSHOT_SOURCES.
+    """
+    def write_frames(tmp_dir):
+        manifest = {'sources': {}, 'frames': {}}
+        for name, (df, list_columns) in frames.items():
+            source = SNAPSHOT_SOURCES[name]
+            manifest['sources'][source] = source_signature(os.path.join(data_dir, source))
+            manifest['frames'][name] = write_frame(tmp_dir, name, df, list_columns)
+        return manifest
+
+    return write_manifest_directory(snapshot_dir, write_frames)
+
+def current_snapshot_manifest(snapshot_dir, data_dir, names):
+    """Manifeste du snapshot s'il contient les jeux de données demandés, à jour par rapport aux CSV ; None sinon."""
+    manifest_path = os.path.join(snapshot_dir, MANIFEST_NAME)
+    if not os.path.exists(manifest_path):
+        return None
+
+    with open(manifest_path, encoding='utf-8') as manifest_file:
+        manifest = json.load(manifest_file)
+
+    for name in names:
+        source = SNAPSHOT_SOURCES[name]
+        if name not in manifest['frames'] or source not in manifest['sources']:
+            return None
+        source_path = os.path.join(data_dir, source)
+        if os.path.exists(source_path) and source_signature(source_path) != manifest['sources'][source]:
+            print(f"Snapshot périmé pour {source}, lecture du CSV.")
+            return None
+
+    return manifest
+
+def read_data_snapshot(snapshot_dir, data_dir, names):
+    """Charge les jeux de données demandés depuis le snapshot.
+
+    Retourne None si le snapshot est absent, incomplet ou plus ancien que les CSV :
+    l'appelant retombe alors sur la lecture des CSV.
+    """
+    manifest = current_snapshot_manifest(snapshot_dir, data_dir, names)
+    if manifest is None:
+        return None
+    return {name: read_frame(snapshot_dir, manifest['frames'][name]) for name in names}
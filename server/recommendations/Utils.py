@@ -1,250 +1,1108 @@
+import ast
+import base64
+import io
+import json
 import os
+import re
+import unicodedata
+from datetime import date
 from django.conf import settings
+import numpy as np
 import pandas as pd
+from .Snapshot import SNAPSHOT_SOURCES, read_data_snapshot
 
-def load_data_artists():
+# Colonnes de listes de df_tracks (clé utilisée dans track_lists / track_index)
+TRACK_LIST_COLUMNS = {'genres': 'all_genres', 'regions': 'regions_recommandees'}
 
-    try:
-        # Chemin ver les données du CSV
-        genre_region_age_path = os.path.join(settings.DATA_DIR, 'df_genre_region_age_augmente.csv')
-        tracks_path = os.path.join(settings.DATA_DIR, 'df_tracks.csv')
+def read_csv_datasets(names):
+    """Lecture des CSV bruts, typés comme dans le snapshot : {nom: (DataFrame, colonnes_de_listes)}."""
+    frames = {}
 
-        # Chargement des données
-        df_genre_region_age = pd.read_csv(genre_region_age_path)
+    if 'genre_region_age' in names:
+        genre_region_age_path = os.path.join(settings.DATA_DIR, SNAPSHOT_SOURCES['genre_region_age'])
+        frames['genre_region_age'] = (pd.read_csv(genre_region_age_path), {})
+
+    if 'tracks' in names:
+        tracks_path = os.path.join(settings.DATA_DIR, SNAPSHOT_SOURCES['tracks'])
         df_tracks = pd.read_csv(tracks_path)
+        track_lists = parse_track_lists(df_tracks)
+        # Les listes ne sont gardées qu'encodées (codes + offsets), jamais en listes Python par piste
+        df_tracks = df_tracks.drop(columns=list(TRACK_LIST_COLUMNS.values()))
+
+        # Colonnes texte en catégoriel
+        text_columns = [
+            col for col in df_tracks.columns
+            if not (pd.api.types.is_numeric_dtype(df_tracks[col]) or pd.api.types.is_bool_dtype(df_tracks[col]))
+        ]
+        df_tracks = df_tracks.astype({col: 'category' for col in text_columns})
+
+        frames['tracks'] = (df_tracks, {TRACK_LIST_COLUMNS[key]: lists for key, lists in track_lists.items()})
+
+    return frames
+
+def read_datasets(names):
+    """Charge les jeux de données depuis le snapshot binaire, ou depuis les CSV s'il est absent ou périmé."""
+    frames = read_data_snapshot(settings.DATA_SNAPSHOT_DIR, settings.DATA_DIR, names)
+    if frames is None:
+        frames = read_csv_datasets(names)
+    return frames
+
+def load_data_genre_region_age():
+
+    try:
+        # Chargement des données
+        frames = read_datasets(('genre_region_age',))
+        df_genre_region_age, _ = frames['genre_region_age']
+        genre_scores = build_genre_scores(df_genre_region_age)
 
         print("Données chargées avec succès!")
         print(f"- Nombre de régions chargées : {df_genre_region_age.shape[0]}")
-        print(f"- Nombre de pistes chargées : {df_tracks.shape[0]}")
 
-        return df_genre_region_age, df_tracks, True
+        return {
+            'df_genre_region_age': df_genre_region_age,
+            'genre_scores': genre_scores,
+        }
     except Exception as e:
         print(f"Erreur lors du chargement des données : {e}")
-        return None, None, False
-    
-def load_data_listeners():
+        return None
 
-    try:
-        # Chemin ver les données du CSV
-        genre_region_age_path = os.path.join(settings.DATA_DIR, 'df_genre_region_age_augmente.csv')
+def load_data_tracks():
 
+    try:
         # Chargement des données
-        df_genre_region_age = pd.read_csv(genre_region_age_path)
+        frames = read_datasets(('tracks',))
+        df_tracks, list_columns = frames['tracks']
+        track_lists = {key: list_columns[column] for key, column in TRACK_LIST_COLUMNS.items()}
+        track_lists['genre_groups'] = build_genre_groups(track_lists['genres'])
+        track_index = build_track_index(track_lists)
+
+        # On s'assure d'avoir les colonnes dans le DF
+        valid_metrics = [metric for metric in TRACK_METRICS if metric in df_tracks.columns]
+        metric_aggregates = {key: build_metric_aggregates(df_tracks, lists, valid_metrics) for key, lists in track_lists.items()}
+        track_orders = build_track_orders(df_tracks)
+        feature_index = build_feature_index(df_tracks)
 
         print("Données chargées avec succès!")
-        print(f"- Nombre de régions chargées : {df_genre_region_age.shape[0]}")
+        print(f"- Nombre de pistes chargées : {df_tracks.shape[0]}")
 
-        return df_genre_region_age, True
+        return {
+            'df_tracks': df_tracks,
+            'track_lists': track_lists,
+            'track_index': track_index,
+            'metric_aggregates': metric_aggregates,
+            'track_orders': track_orders,
+            'feature_index': feature_index,
+        }
     except Exception as e:
         print(f"Erreur lors du chargement des données : {e}")
-        return None, False
-    
-def get_popular_genres_by_region(df_genre_region_age, region=None, artist=False):
-    if df_genre_region_age is None or df_genre_region_age.empty:
-        return {"error": "Données non chargées."}
+        return None
 
-    df = df_genre_region_age.copy()
+# Nombre de genres renvoyés aux auditeurs (les artistes reçoivent le classement complet)
+TOP_GENRES_LISTENERS = 10
 
-    if region:
-        if region not in df['Nom_region'].values:
-            return {"error": f"Région '{region}' non trouvée."}
-        
-        # Filtrer par région
-        df = df[df['Nom_region'] == region]
+def build_genre_scores(df_genre_region_age):
+    """Construit une seule fois le tenseur région × genre × tranche d'âge.
 
-    results = []
+    Les colonnes du CSV sont du type 'Rap_Jeune' : on les découpe ici au chargement
+    pour que les endpoints n'aient plus qu'à faire des réductions NumPy.
+    """
+    regions = df_genre_region_age['Nom_region'].astype(str).tolist()
+    genres, ages = [], []
+    genre_index, age_index = {}, {}
+    columns, genre_ids, age_ids = [], [], []
 
-    # On parcourt le DF pour chaque région
-    for idx, row in df.iterrows():
-        region_name = row['Nom_region']
-        region_data = {
-            'region': region_name,
-            'genres': []
-        }
+    for col in df_genre_region_age.columns:
+        if col == 'Nom_region':
+            continue
+        genre_part = col.split('_')
+        if len(genre_part) < 2:
+            continue
+        genre, age = genre_part[0], genre_part[1]
+        if genre not in genre_index:
+            genre_index[genre] = len(genres)
+            genres.append(genre)
+        if age not in age_index:
+            age_index[age] = len(ages)
+            ages.append(age)
+        columns.append(col)
+        genre_ids.append(genre_index[genre])
+        age_ids.append(age_index[age])
 
-    # Extraction des genres et de leur popularité
-    genres_columns = [col for col in df.columns if col != 'Nom_region']
-    genres_scores = {}
+    values = df_genre_region_age[columns].to_numpy(dtype=np.float64)
+    scores = np.zeros((len(regions), len(genres), len(ages)), dtype=np.float64)
+    # np.add.at cumule les éventuelles colonnes en double (même genre et même âge)
+    np.add.at(scores, (slice(None), np.array(genre_ids, dtype=np.intp), np.array(age_ids, dtype=np.intp)), values)
 
-    # On transforme le genre car data set du type 'jeune_rap'
-    for col in genres_columns:
-        genre_part = col.split('_')
-        if len(genre_part) >= 2:
-            genre = genre_part[0]
-            if genre not in genres_scores:
-                genres_scores[genre] = 0
-            genres_scores[genre] += row[col]
-
-    # On trie les genres par popularité
-    sorted_genres = sorted(genres_scores.items(), key=lambda x: x[1], reverse=True)
-
-    # Calculer le score maximum pour normaliser sur 10
-    if sorted_genres:
-        # Score du genre le plus populaire
-        max_score = sorted_genres[0][1]
-    else:
-        # Évite division par zéro
-        max_score = 1
-    
-    if artist:
-        # Ajout des scores dans le résultat, normalisés sur 10
-        for genre, score in sorted_genres:
-            # Normalisation du score sur 10
-            normalized_score = min(10, round((score / max_score) * 10, 1))
-            
-            region_data["genres"].append({
-                'genre': genre,
-                'score': f"{normalized_score}/10",
-                'raw_score': score
-            })
-    else: 
-        # Ajout des scores dans le résultat, normalisés sur 10
-        for genre, score in sorted_genres[:10]:
-            # Normalisation du score sur 10
-            normalized_score = min(10, round((score / max_score) * 10, 1))
-            
-            region_data["genres"].append({
-                'genre': genre,
-                'score': f"{normalized_score}/10",
+    return {
+        'regions': regions,
+        'genres': genres,
+        'ages': ages,
+        'scores': scores,
+        'region_index': {region: i for i, region in enumerate(regions)},
+        'genre_index': genre_index,
+        'age_index': age_index,
+    }
+
+def rank_genres(genres, totals, artist=False):
+    """Classe les genres de chaque ligne de totals (une ligne = une région / tranche d'âge).
+
+    Le tri est fait pour toutes les lignes en une fois ; seuls les scores
+    retenus sont ensuite formatés (normalisés sur 10 par rapport au meilleur genre).
+    """
+    totals = np.atleast_2d(totals)
+    n_genres = totals.shape[1]
+    if n_genres == 0:
+        return [[] for _ in range(totals.shape[0])]
+
+    # Tri stable : à score égal, le genre qui vient en premier dans les colonnes du CSV reste devant
+    # (comme le sorted() d'origine), y compris à la limite du top 10
+    order = np.argsort(-totals, axis=1, kind='stable')
+    if not artist:
+        order = order[:, :TOP_GENRES_LISTENERS]
+
+    ranked_scores = np.take_along_axis(totals, order, axis=1)
+    # Score du genre le plus populaire (évite la division par zéro)
+    max_scores = np.where(ranked_scores[:, 0] != 0, ranked_scores[:, 0], 1)
+
+    ranked = []
+    for row_order, row_scores, max_score in zip(order.tolist(), ranked_scores.tolist(), max_scores.tolist()):
+        ranked.append([
+            {
+                'genre': genres[i],
+                # Normalisation du score sur 10
+                'score': f"{min(10, round((score / max_score) * 10, 1))}/10",
                 'raw_score': score
-            })
+            }
+            for i, score in zip(row_order, row_scores)
+        ])
+    return ranked
 
-    results.append(region_data)
+def select_regions(genre_scores, region=None):
+    """Positions des régions demandées : None = toutes, un nom = une seule, une liste = plusieurs."""
+    if not region:
+        return list(range(len(genre_scores['regions']))), None
 
-    if region:
+    regions = [region] if isinstance(region, str) else list(region)
+    for name in regions:
+        if name not in genre_scores['region_index']:
+            return None, {"error": f"Région '{name}' non trouvée."}
+    return [genre_scores['region_index'][name] for name in regions], None
+
+def get_popular_genres_by_region(genre_scores, region=None, artist=False):
+    if genre_scores is None or not genre_scores['regions']:
+        return {"error": "Données non chargées."}
+
+    region_ids, error = select_regions(genre_scores, region)
+    if error:
+        return error
+
+    # Somme sur les tranches d'âge : une ligne de scores par région, en une seule réduction
+    totals = genre_scores['scores'][region_ids].sum(axis=2)
+
+    results = [
+        {
+            'region': genre_scores['regions'][r],
+            'genres': genres
+        }
+        for r, genres in zip(region_ids, rank_genres(genre_scores['genres'], totals, artist))
+    ]
+
+    if isinstance(region, str) and region:
         return results[0] if results else {"error": f"Aucune donnée pour la région: {region}"}
-    
+
     return results
 
-def get_popular_genres_by_region_and_age(df_genre_region_age, region=None, age_group=None, artist=False):
-    if df_genre_region_age is None or df_genre_region_age.empty:
+def get_popular_genres_by_region_and_age(genre_scores, region=None, age_group=None, artist=False):
+    if genre_scores is None or not genre_scores['regions']:
         return {"error": "Données pas chargées"}
-    
-    df = df_genre_region_age.copy()
 
-    if region:
-        if region not in df['Nom_region'].values:
-            return {"error": f"Région '{region}' non trouvée."}
-        
-        df = df[df['Nom_region'] == region]
+    region_ids, error = select_regions(genre_scores, region)
+    if error:
+        return error
 
-    results = []
+    age_groups = list(age_group) if isinstance(age_group, (list, tuple)) else [age_group]
+    known_ages = [age for age in age_groups if age in genre_scores['age_index']]
 
-    # On parcourt le DF pour chaque région
-    for idx, row in df.iterrows():
-        region_name = row['Nom_region']
-        region_data = {
-            'region': region_name,
-            'genres': [],
-        }
-    
-    genres_columns = [col for col in df.columns if col != 'Nom_region']
-    genres_scores = {}
+    # Toutes les paires (région, tranche d'âge) classées en une passe : lignes (R × A) × genres
+    ranked = {}
+    if known_ages:
+        age_ids = [genre_scores['age_index'][age] for age in known_ages]
+        rows = genre_scores['scores'][np.ix_(region_ids, range(len(genre_scores['genres'])), age_ids)]
+        rows = rows.transpose(0, 2, 1).reshape(-1, len(genre_scores['genres']))
+        ranked_rows = iter(rank_genres(genre_scores['genres'], rows, artist))
+        ranked = {(r, age): next(ranked_rows) for r in region_ids for age in known_ages}
 
-    # On transforme les genres et on recupère juste ceux qui correspondent à l'age
-    for col in genres_columns:
-        genre_part = col.split('_')
-        if len(genre_part) >= 2:
-            genre = genre_part[0]
-            age = genre_part[1]
-
-            if age_group == age:
-                if genre not in genres_scores:
-                    genres_scores[genre] = 0
-                genres_scores[genre] += row[col]
-    
-    # On trie les genres par popularité
-    sorted_genres = sorted(genres_scores.items(), key=lambda x: x[1], reverse=True)
-
-    # Calculer le score maximum pour normaliser sur 10
-    if sorted_genres:
-        # Score du genre le plus populaire
-        max_score = sorted_genres[0][1]
-    else:
-        # Évite division par zéro
-        max_score = 1
-    
-    if artist:
-        # Ajout des scores dans le résultat, normalisés sur 10
-        for genre, score in sorted_genres:
-            # Normalisation du score sur 10
-            normalized_score = min(10, round((score / max_score) * 10, 1))
-            
-            region_data["genres"].append({
-                'genre': genre,
-                'score': f"{normalized_score}/10",
-                'raw_score': score
-            })
-    else:
-        # Ajout des scores dans le résultat, normalisés sur 10
-        for genre, score in sorted_genres[:10]:
-            # Normalisation du score sur 10
-            normalized_score = min(10, round((score / max_score) * 10, 1))
-            
-            region_data["genres"].append({
-                'genre': genre,
-                'score': f"{normalized_score}/10",
-                'raw_score': score
+    results = []
+    for r in region_ids:
+        for age in age_groups:
+            results.append({
+                'region': genre_scores['regions'][r],
+                # Tranche d'âge inconnue : aucun genre ne correspond
+                'genres': ranked.get((r, age), []),
+                'age_group': age,
             })
-    
-    region_data["age_group"] = age_group
-    results.append(region_data)
 
-    if region:
+    if isinstance(region, str) and region and not isinstance(age_group, (list, tuple)):
         return results[0] if results else {"error": f"Aucune donnée pour la région: {region}"}
-    
+
     return results
 
-def calculate_genre_metrics(df, genre, valid_metrics):
-    print(f"LE GENRE EST {genre}")
-    # On explode la liste des genres pour avoir une ligne par genre
-    df_exploded = df.explode('all_genres')
+def get_popular_genres_map(genre_scores, artist=False):
+    """Classement des genres de toutes les régions, tous âges confondus ('all') et par tranche d'âge."""
+    if genre_scores is None or not genre_scores['regions']:
+        return {"error": "Données non chargées."}
+
+    genre_map = {
+        region_data['region']: {'all': region_data['genres']}
+        for region_data in get_popular_genres_by_region(genre_scores, None, artist)
+    }
+    for region_data in get_popular_genres_by_region_and_age(genre_scores, None, genre_scores['ages'], artist):
+        genre_map[region_data['region']][region_data['age_group']] = region_data['genres']
+
+    return genre_map
+
+def parse_list_cell(value):
+    """Transforme une cellule du type "['Rap/Hip Hop', 'Rap français']" en liste."""
+    if isinstance(value, list):
+        return value
+    if not isinstance(value, str) or not value.startswith('['):
+        return []
+    return list(ast.literal_eval(value))
+
+def parse_list_column(values):
+    """Encode une colonne de listes en codes catégoriels à plat + offsets par piste.
+
+    Les éléments de la piste i sont codes[offsets[i]:offsets[i + 1]].
+    """
+    categories, category_index = [], {}
+    codes, offsets = [], [0]
+    for value in values:
+        for item in parse_list_cell(value):
+            if item not in category_index:
+                category_index[item] = len(categories)
+                categories.append(item)
+            codes.append(category_index[item])
+        offsets.append(len(codes))
+
+    return {
+        'categories': categories,
+        'category_index': category_index,
+        'codes': np.array(codes, dtype=np.int32),
+        'offsets': np.array(offsets, dtype=np.int64),
+    }
+
+def parse_track_lists(df_tracks):
+    """Parse une seule fois all_genres et regions_recommandees (stockées en texte dans le CSV)."""
+    return {key: parse_list_column(df_tracks[column]) for key, column in TRACK_LIST_COLUMNS.items()}
+
+def build_track_index(track_lists):
+    """Index inversé : chaque genre et chaque région pointe vers les positions triées des pistes."""
+    track_index = {}
+    for key, lists in track_lists.items():
+        counts = np.diff(lists['offsets'])
+        rows = np.repeat(np.arange(len(counts), dtype=np.int64), counts)
+        # Tri stable par code : les positions restent croissantes dans chaque groupe
+        order = np.argsort(lists['codes'], kind='stable')
+        bounds = np.cumsum(np.bincount(lists['codes'], minlength=len(lists['categories'])))
+        postings = np.split(rows[order], bounds[:-1])
+        track_index[key] = {item: np.unique(ids) for item, ids in zip(lists['categories'], postings)}
+    return track_index
+
+# Colonnes renvoyées pour chaque piste (titre, artist, longeur)
+TRACK_DISPLAY_COLUMNS = ['title', 'artist_name', 'duration']
+
+# Colonnes qu'on peut demander avec fields= (les colonnes de listes et les doublons sont exclus)
+TRACK_FIELDS = ['rank', 'title', 'artist_name', 'duration', 'popularity', 'bpm', 'gain', 'main_genre',
+                'duration_minutes', 'artist_nb_fans', 'artist_nb_album', 'danceability', 'energy',
+                'acousticness', 'instrumentalness', 'valence']
+
+# Clés de tri précalculées : order_by=popularity (croissant) ou order_by=-popularity (décroissant)
+TRACK_SORT_KEYS = ['rank', 'popularity', 'bpm', 'energy']
+
+# Taille des pages de pistes (limit=)
+DEFAULT_TRACKS_PAGE_SIZE = 100
+MAX_TRACKS_PAGE_SIZE = 1000
+
+# Nombre de pistes sérialisées par morceau de réponse en streaming
+TRACKS_STREAM_CHUNK_SIZE = 1000
+
+def track_sort_values(series, descending=False):
+    """Valeurs de tri d'une colonne : les valeurs manquantes sont toujours placées en dernier."""
+    values = series.to_numpy(dtype=np.float64)
+    if descending:
+        return -np.where(np.isnan(values), -np.inf, values)
+    return np.where(np.isnan(values), np.inf, values)
+
+def build_track_orders(df_tracks, keys=TRACK_SORT_KEYS):
+    """Ordres de tri précalculés pour chaque clé, dans les deux sens.
+
+    'order' contient les positions des pistes triées (égalités départagées par position),
+    'position' le rang de chaque piste dans cet ordre : c'est la clé des curseurs de pagination.
+    """
+    rows = np.arange(len(df_tracks), dtype=np.int64)
+    track_orders = {}
+    for key in keys:
+        if key not in df_tracks.columns:
+            continue
+        for order_by, descending in ((key, False), (f"-{key}", True)):
+            order = np.lexsort((rows, track_sort_values(df_tracks[key], descending)))
+            position = np.empty_like(order)
+            position[order] = rows
+            track_orders[order_by] = {'order': order, 'position': position}
+    return track_orders
+
+def order_tracks(track_orders, row_ids, order_by, n_rows):
+    """Positions des pistes sélectionnées dans l'ordre demandé (None = tout le catalogue dans l'ordre du fichier)."""
+    if order_by is None:
+        return row_ids
+
+    order = track_orders[order_by]
+    if row_ids is None:
+        return order['order']
+    if len(row_ids) * 16 > n_rows:
+        # Grosse sélection : on filtre l'ordre précalculé, en O(n) sans tri
+        selected = np.zeros(n_rows, dtype=bool)
+        selected[row_ids] = True
+        return order['order'][selected[order['order']]]
+    return row_ids[np.argsort(order['position'][row_ids], kind='stable')]
+
+def encode_tracks_cursor(order_by, row):
+    return base64.urlsafe_b64encode(json.dumps([order_by, int(row)]).encode()).decode().rstrip('=')
+
+def decode_tracks_cursor(cursor):
+    """Retourne (order_by, position de la dernière piste renvoyée) ou None si le curseur est invalide."""
+    try:
+        order_by, row = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except (ValueError, TypeError):
+        return None
+    # bool est une sous-classe de int : true ne doit pas passer pour une position
+    if type(row) is not int or not (order_by is None or isinstance(order_by, str)):
+        return None
+    return order_by, row
+
+def page_tracks(track_orders, ordered_ids, n_rows, order_by=None, after=None, limit=DEFAULT_TRACKS_PAGE_SIZE):
+    """Page suivant la piste `after` (pagination par clé : stable même si des pistes sont ajoutées).
+
+    ordered_ids=None : tout le catalogue dans l'ordre order_by, la page est lue directement dans l'ordre
+    précalculé (O(limit)). Retourne (positions de la page, position de la dernière piste si la suite existe, sinon None).
+    """
+    if ordered_ids is None:
+        start = 0
+        if after is not None:
+            start = (after if order_by is None else int(track_orders[order_by]['position'][after])) + 1
+        stop = min(start + limit, n_rows)
+        if order_by is None:
+            page = np.arange(start, max(start, stop), dtype=np.int64)
+        else:
+            page = track_orders[order_by]['order'][start:stop]
+        return page, (int(page[-1]) if stop < n_rows and len(page) else None)
+
+    start = 0
+    if after is not None:
+        # Les pistes sont triées par rang dans l'ordre demandé : recherche dichotomique du curseur
+        keys = ordered_ids if order_by is None else track_orders[order_by]['position'][ordered_ids]
+        after_key = after if order_by is None else track_orders[order_by]['position'][after]
+        start = int(np.searchsorted(keys, after_key, side='right'))
+
+    page = ordered_ids[start:start + limit]
+    has_next = start + limit < len(ordered_ids)
+    return page, (int(page[-1]) if has_next and len(page) else None)
+
+def format_tracks(df_tracks, row_ids=None, start=None, stop=None, fields=None):
+    """Pistes à afficher (row_ids, ou la tranche start:stop du catalogue) sous forme de liste de dicts."""
+    fields = fields or TRACK_DISPLAY_COLUMNS
+    tracks_columns = [col for col in df_tracks.columns if col in fields]
+    if row_ids is not None:
+        tracks = df_tracks[tracks_columns].take(row_ids)
+    else:
+        tracks = df_tracks[tracks_columns].iloc[start:stop]
+
+    # On transforme la duration de secondes à minutes
+    if 'duration' in tracks_columns:
+        duration = tracks['duration']
+        tracks = tracks.assign(duration=(duration // 60).astype(int).astype(str) + ':' + (duration % 60).astype(int).astype(str).str.zfill(2))
+
+    # Les valeurs manquantes deviennent null (NaN n'est pas du JSON valide)
+    if tracks.isna().any().any():
+        tracks = tracks.astype(object).where(tracks.notna(), None)
+
+    return tracks.to_dict('records')
+
+def stream_tracks(df_tracks, row_ids=None, output='json', chunk_size=TRACKS_STREAM_CHUNK_SIZE, fields=None):
+    """Sérialise les pistes morceau par morceau : la mémoire ne dépend que de chunk_size.
+
+    output='json' produit {"tracks": [...]}, output='ndjson' une piste par ligne.
+    """
+    total = len(df_tracks) if row_ids is None else len(row_ids)
+
+    if output != 'ndjson':
+        yield b'{"tracks":['
+
+    for start in range(0, total, chunk_size):
+        stop = min(start + chunk_size, total)
+        if row_ids is None:
+            records = format_tracks(df_tracks, start=start, stop=stop, fields=fields)
+        else:
+            records = format_tracks(df_tracks, row_ids[start:stop], fields=fields)
+
+        lines = [json.dumps(record, ensure_ascii=False) for record in records]
+        if output == 'ndjson':
+            yield (''.join(line + '\n' for line in lines)).encode('utf-8')
+        else:
+            yield ((',' if start else '') + ','.join(lines)).encode('utf-8')
+
+    if output != 'ndjson':
+        yield b']}'
+
+# Tranches d'âge du tenseur genre_scores : âge maximum (exclu) de chaque tranche
+AGE_GROUPS = [('Jeune', 30), ('Adulte', 60), ('Senior', None)]
+
+# Poids des composantes du score de recommandation personnalisée
+RECOMMENDATION_WEIGHTS = {
+    'popularity': 0.4,   # popularité de la piste
+    'region_age': 0.3,   # popularité de ses genres dans la région pour la tranche d'âge
+    'favorite': 0.2,     # un de ses genres fait partie des genres favoris
+    'region': 0.1,       # piste recommandée dans la région
+}
+
+DEFAULT_RECOMMENDATIONS = 20
+MAX_RECOMMENDATIONS = 100
+
+# Noms de genres écrits différemment entre les pistes et le tenseur région × genre × âge
+GENRE_ALIASES = {'inde': 'indie', 'chanson': 'variete', 'hiphop': 'rap'}
+
+# Genres des pistes (all_genres) rattachés à chaque genre du tenseur région × genre × âge.
+# Table fermée : un genre de piste absent n'appartient à aucun genre du tenseur.
+TABLE_GENRE_TRACK_GENRES = {
+    'Pop': ['Pop', 'Pop Indé', 'Pop internationale', 'Pop indé/Folk', 'Electro Pop/Electro Rock'],
+    'Rap': ['Rap/Hip Hop', 'Rap français'],
+    'Rock': ['Rock', 'Rock indé', 'Electro Pop/Electro Rock'],
+    'Electro': ['Electro', 'Electro Pop/Electro Rock', 'Dubstep'],
+    'Reggae': ['Reggae'],
+    'Variete': ['Chanson française', 'Variété Internationale'],
+    'RnB': ['R&B', 'R&B contemporain'],
+    'Funk': ['Soul & Funk'],
+    'Disco': ['Disco'],
+    'Techno': ['Techno/House'],
+    'House': ['Techno/House'],
+    'Folk': ['Pop indé/Folk'],
+    'Soul': ['Soul', 'Soul & Funk'],
+    'Indie': ['Pop Indé', 'Rock indé', 'Pop indé/Folk'],
+}
+
+def age_group_from_birth_date(birth_date, today=None):
+    """Tranche d'âge (Jeune/Adulte/Senior) correspondant à une date de naissance, None si inconnue."""
+    if birth_date is None:
+        return None
+    today = today or date.today()
+    age = today.year - birth_date.year - ((today.month, today.day) < (birth_date.month, birth_date.day))
+    for age_group, max_age in AGE_GROUPS:
+        if max_age is None or age < max_age:
+            return age_group
+
+def normalize_genre(name):
+    # Sans accents ni majuscules, '&' lu comme 'n' : 'R&B' -> 'rnb', 'Variété' -> 'variete'
+    return unicodedata.normalize('NFKD', str(name)).encode('ascii', 'ignore').decode().lower().replace('&', 'n')
+
+def genre_key(name):
+    """Clé d'un genre saisi par l'utilisateur ou du tenseur : 'R&B' -> 'rnb'."""
+    key = re.sub(r'[^a-z0-9]+', '', normalize_genre(name))
+    return GENRE_ALIASES.get(key, key)
+
+def table_genre_keys(track_genre):
+    """Clés des genres du tenseur d'un genre de piste (TABLE_GENRE_TRACK_GENRES) : 'Rap français' -> {'rap'}."""
+    key = genre_key(track_genre)
+    return {
+        genre_key(table_genre) for table_genre, track_genres in TABLE_GENRE_TRACK_GENRES.items()
+        if key in {genre_key(name) for name in track_genres}
+    }
+
+def build_genre_links(track_genres, genres):
+    """Matrice (genres des pistes × genres du tenseur) : 1 quand le genre de piste relève du genre du tenseur.
+
+    'Rap/Hip Hop' et 'Rap français' relèvent de Rap, 'Electro Pop/Electro Rock' de Electro, Pop et Rock
+    (TABLE_GENRE_TRACK_GENRES). track_genre_keys sert aux genres favoris : nom du genre de piste ou du tenseur.
+    """
+    genre_ids = {genre_key(genre): i for i, genre in enumerate(genres)}
+    track_genre_keys = [table_genre_keys(track_genre) | {genre_key(track_genre)} for track_genre in track_genres]
+    links = np.zeros((len(track_genres), len(genres)), dtype=np.float64)
+    for row, keys in enumerate(track_genre_keys):
+        for key in keys & genre_ids.keys():
+            links[row, genre_ids[key]] = 1.0
+    return {'links': links, 'track_genre_keys': track_genre_keys}
+
+def build_genre_groups(genre_lists):
+    """Colonne de listes dérivée de all_genres : les genres du tenseur de chaque piste (table_genre_keys), sans doublon.
+
+    Un nom du tenseur comme 'Rap' ou 'House' (envoyé par la carte) regroupe ainsi 'Rap/Hip Hop' et
+    'Rap français', ou 'Techno/House' ; index et agrégats de ces groupes comptent chaque piste une fois.
+    """
+    categories, category_index = [], {}
+    key_codes, key_offsets = [], [0]
+    for genre in genre_lists['categories']:
+        for key in sorted(table_genre_keys(genre)):
+            if key not in category_index:
+                category_index[key] = len(categories)
+                categories.append(key)
+            key_codes.append(category_index[key])
+        key_offsets.append(len(key_codes))
+    key_codes, key_offsets = np.array(key_codes, dtype=np.int64), np.array(key_offsets, dtype=np.int64)
+
+    # Un couple (piste, genre) donne autant de couples (piste, clé) que le genre a de clés
+    codes = np.asarray(genre_lists['codes'], dtype=np.int64)
+    n_tracks = len(genre_lists['offsets']) - 1
+    rows = np.repeat(np.arange(n_tracks, dtype=np.int64), np.diff(genre_lists['offsets']))
+    n_keys = np.diff(key_offsets)[codes]
+    first = np.repeat(key_offsets[codes] - (np.cumsum(n_keys) - n_keys), n_keys)
+    keys = key_codes[first + np.arange(len(first), dtype=np.int64)] if len(first) else np.empty(0, dtype=np.int64)
+
+    # Dédoublonnage par piste ; les couples restent triés par piste
+    pairs = np.unique(np.repeat(rows, n_keys) * max(len(categories), 1) + keys)
+    pair_rows = pairs // max(len(categories), 1)
+    offsets = np.zeros(n_tracks + 1, dtype=np.int64)
+    np.cumsum(np.bincount(pair_rows, minlength=n_tracks), out=offsets[1:])
+
+    return {
+        'categories': categories,
+        'category_index': category_index,
+        'codes': (pairs % max(len(categories), 1)).astype(np.int32),
+        'offsets': offsets,
+    }
+
+def genre_group(genre, categories):
+    """Clé du groupe de pistes d'un genre du tenseur (TABLE_GENRE_TRACK_GENRES), None pour tout autre nom."""
+    key = genre_key(genre)
+    return key if key in categories else None
+
+def max_per_track(values, offsets):
+    """Maximum des valeurs de chaque piste (values à plat, découpées par offsets), 0 si la piste n'en a pas."""
+    result = np.zeros(len(offsets) - 1, dtype=np.float64)
+    non_empty = np.diff(offsets) > 0
+    if len(values):
+        result[non_empty] = np.maximum.reduceat(values, offsets[:-1][non_empty])
+    return result
+
+def recommend_tracks(tracks_data, genre_scores, genre_links, region=None, age_group=None, favorite_genres=(), k=DEFAULT_RECOMMENDATIONS):
+    """Top-k pistes pour un profil : un seul passage vectorisé sur toutes les pistes puis tri partiel.
+
+    Sans région, la popularité des genres est moyennée sur toutes les régions ;
+    sans tranche d'âge, sur toutes les tranches.
+    """
+    if tracks_data is None or genre_scores is None:
+        return {"error": "Données non chargées."}
+
+    region_ids, error = select_regions(genre_scores, region)
+    if error:
+        return error
+    if age_group and age_group not in genre_scores['age_index']:
+        return {"error": f"Tranche d'âge '{age_group}' non trouvée."}
+
+    df_tracks = tracks_data['df_tracks']
+    lists = tracks_data['track_lists']['genres']
+    if len(df_tracks) == 0:
+        return {"error": "Aucune chanson disponible"}
+
+    # Popularité de chaque genre du tenseur dans la région et la tranche d'âge, ramenée à [0, 1]
+    scores = genre_scores['scores'][region_ids]
+    scores = scores[:, :, genre_scores['age_index'][age_group]] if age_group else scores.mean(axis=2)
+    genre_popularity = scores.mean(axis=0)
+    genre_popularity = genre_popularity / genre_popularity.max() if genre_popularity.max() > 0 else genre_popularity
+
+    # Puis de chaque genre des pistes (meilleur genre du tenseur correspondant)
+    links = genre_links['links']
+    category_popularity = (links * genre_popularity).max(axis=1) if links.size else np.zeros(len(links))
+    favorite_keys = {genre_key(genre) for genre in favorite_genres if genre_key(genre)}
+    category_favorite = np.array([bool(keys & favorite_keys) for keys in genre_links['track_genre_keys']], dtype=np.float64)
+
+    popularity = df_tracks['popularity'].to_numpy(dtype=np.float64)
+    popularity = np.nan_to_num(popularity / popularity.max()) if popularity.max() > 0 else np.zeros(len(df_tracks))
+
+    in_region = np.zeros(len(df_tracks), dtype=np.float64)
+    if region:
+        in_region[tracks_data['track_index']['regions'].get(region, np.empty(0, dtype=np.int64))] = 1.0
+
+    score = (RECOMMENDATION_WEIGHTS['popularity'] * popularity
+             + RECOMMENDATION_WEIGHTS['region_age'] * max_per_track(category_popularity[lists['codes']], lists['offsets'])
+             + RECOMMENDATION_WEIGHTS['favorite'] * max_per_track(category_favorite[lists['codes']], lists['offsets'])
+             + RECOMMENDATION_WEIGHTS['region'] * in_region)
+
+    # Tri partiel : seules les k meilleures pistes sont triées (égalités départagées par position)
+    k = min(k, len(score))
+    top = np.argpartition(-score, k - 1)[:k]
+    top = top[np.lexsort((top, -score[top]))]
+
+    tracks = format_tracks(df_tracks, top, fields=TRACK_DISPLAY_COLUMNS + ['main_genre'])
+    for track, track_score in zip(tracks, score[top]):
+        track['score'] = round(float(track_score), 4)
+
+    return {
+        'region': region,
+        'age_group': age_group,
+        'tracks': tracks,
+    }
+
+# Caractéristiques audio utilisées pour la recherche de pistes similaires
+SIMILARITY_FEATURES = ['danceability', 'energy', 'acousticness', 'instrumentalness', 'valence', 'bpm', 'gain']
+
+DEFAULT_SIMILAR_TRACKS = 10
+MAX_SIMILAR_TRACKS = 100
+
+# Nombre de lignes de la matrice multipliées à la fois (borne la mémoire temporaire)
+SIMILARITY_BATCH_SIZE = 65536
+
+# Au-delà de ce nombre de candidats, recherche approchée dans les groupes les plus proches de la piste
+SIMILARITY_EXACT_MAX_ROWS = 50000
+SIMILARITY_PROBES = 16
+SIMILARITY_KMEANS_ITERATIONS = 10
+
+def normalize_features(df_tracks, features, mean, scale):
+    """Lignes centrées-réduites puis ramenées à la norme 1 : le produit scalaire est une similarité cosinus."""
+    values = df_tracks[features].to_numpy(dtype=np.float64)
+    # Valeur manquante = valeur moyenne de la caractéristique
+    values = np.nan_to_num((values - mean) / scale)
+    norms = np.linalg.norm(values, axis=1, keepdims=True)
+    return np.ascontiguousarray(values / np.where(norms > 0, norms, 1), dtype=np.float32)
+
+def build_feature_index(df_tracks, features=SIMILARITY_FEATURES):
+    """Matrice float32 contiguë (pistes × caractéristiques) construite une fois au chargement."""
+    features = [feature for feature in features if feature in df_tracks.columns]
+    values = df_tracks[features].to_numpy(dtype=np.float64)
+    if len(values):
+        mean, scale = np.nanmean(values, axis=0), np.nanstd(values, axis=0)
+    else:
+        mean, scale = np.zeros(len(features)), np.ones(len(features))
+    mean, scale = np.nan_to_num(mean), np.where(np.nan_to_num(scale) > 0, np.nan_to_num(scale), 1.0)
+
+    matrix = normalize_features(df_tracks, features, mean, scale)
+    return {
+        'features': features,
+        'mean': mean,
+        'scale': scale,
+        'matrix': matrix,
+        'clusters': build_similarity_clusters(matrix),
+    }
+
+def assign_clusters(centroids, matrix, batch_size=SIMILARITY_BATCH_SIZE):
+    """Groupe de chaque ligne : centroïde de plus grande similarité cosinus."""
+    assignment = np.empty(len(matrix), dtype=np.int32)
+    for start in range(0, len(matrix), batch_size):
+        assignment[start:start + batch_size] = np.argmax(matrix[start:start + batch_size] @ centroids.T, axis=1)
+    return assignment
+
+def cluster_layout(centroids, assignment, matrix):
+    """Lignes rangées groupe par groupe : la matrice d'un groupe est la tranche offsets[c]:offsets[c + 1]."""
+    order = np.argsort(assignment, kind='stable')
+    offsets = np.zeros(len(centroids) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(assignment, minlength=len(centroids)), out=offsets[1:])
+    return {
+        'centroids': centroids,
+        'assignment': assignment,
+        'order': order,
+        'offsets': offsets,
+        'matrix': np.ascontiguousarray(matrix[order]),
+    }
+
+def build_similarity_clusters(matrix, n_iterations=SIMILARITY_KMEANS_ITERATIONS, seed=0):
+    """Index approché : k-means sphérique (√n groupes) appris sur un échantillon, None sous SIMILARITY_EXACT_MAX_ROWS.
+
+    Une requête ne parcourt que les SIMILARITY_PROBES groupes dont le centroïde est le plus proche de la piste.
+    """
+    if len(matrix) <= SIMILARITY_EXACT_MAX_ROWS:
+        return None
+
+    n_clusters = int(np.sqrt(len(matrix)))
+    rng = np.random.default_rng(seed)
+    sample = matrix[np.sort(rng.choice(len(matrix), min(len(matrix), 32 * n_clusters), replace=False))]
+    centroids = sample[rng.choice(len(sample), n_clusters, replace=False)]
+    for _ in range(n_iterations):
+        sample_assignment = assign_clusters(centroids, sample)
+        sums = np.zeros_like(centroids)
+        for column in range(sample.shape[1]):
+            sums[:, column] = np.bincount(sample_assignment, weights=sample[:, column], minlength=n_clusters)
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        # Un groupe vide garde son centroïde
+        centroids = np.where(norms > 0, sums / np.where(norms > 0, norms, 1), centroids).astype(np.float32)
+
+    return cluster_layout(centroids, assign_clusters(centroids, matrix), matrix)
+
+def append_feature_index(feature_index, df_new):
+    """Ajoute les nouvelles pistes normalisées avec la moyenne et l'écart-type du chargement initial.
+
+    Les nouvelles pistes rejoignent le groupe de centroïde le plus proche ; l'index approché est
+    construit quand le catalogue dépasse SIMILARITY_EXACT_MAX_ROWS.
+    """
+    new_rows = normalize_features(df_new, feature_index['features'], feature_index['mean'], feature_index['scale'])
+    matrix = np.concatenate([feature_index['matrix'], new_rows])
+    clusters = feature_index.get('clusters')
+    if clusters is None:
+        clusters = build_similarity_clusters(matrix)
+    else:
+        assignment = np.concatenate([clusters['assignment'], assign_clusters(clusters['centroids'], new_rows)])
+        clusters = cluster_layout(clusters['centroids'], assignment, matrix)
+    return {**feature_index, 'matrix': matrix, 'clusters': clusters}
+
+def find_track_by_rank(df_tracks, track_orders, rank):
+    """Position de la piste de rang `rank` (recherche dichotomique dans l'ordre précalculé), None si absente."""
+    order = track_orders['rank']['order']
+    ranks = df_tracks['rank'].to_numpy()
+    i = np.searchsorted(ranks, rank, sorter=order)
+    if i < len(order) and ranks[order[i]] == rank:
+        return int(order[i])
+    return None
+
+def probe_similar_tracks(clusters, query, row, candidate_ids=None, k=DEFAULT_SIMILAR_TRACKS, n_probes=SIMILARITY_PROBES):
+    """k plus proches voisins approchés : seuls les groupes les plus proches de la requête sont parcourus.
+
+    Le nombre de groupes est doublé tant que moins de k candidats s'y trouvent ; None si tous y passent
+    sans en trouver k (la recherche exacte prend alors le relais).
+    """
+    centroids, offsets = clusters['centroids'], clusters['offsets']
+    closeness = centroids @ query
+    if candidate_ids is not None:
+        selected = np.zeros(len(clusters['order']), dtype=bool)
+        selected[candidate_ids] = True
+    while True:
+        n_probes = min(n_probes, len(centroids))
+        probes = np.argpartition(-closeness, n_probes - 1)[:n_probes]
+        ids = np.concatenate([clusters['order'][offsets[c]:offsets[c + 1]] for c in probes])
+        scores = np.concatenate([clusters['matrix'][offsets[c]:offsets[c + 1]] @ query for c in probes])
+        valid = ids != row
+        if candidate_ids is not None:
+            valid &= selected[ids]
+        ids, scores = ids[valid], scores[valid]
+        if len(ids) >= k:
+            top = np.argpartition(-scores, k - 1)[:k]
+            order = np.lexsort((ids[top], -scores[top]))
+            return ids[top][order], scores[top][order]
+        if n_probes == len(centroids):
+            return None
+        n_probes *= 2
+
+def similar_tracks(feature_index, row, candidate_ids=None, k=DEFAULT_SIMILAR_TRACKS, batch_size=SIMILARITY_BATCH_SIZE):
+    """k plus proches voisins de la piste `row` (similarité cosinus), parmi candidate_ids (None = toutes).
+
+    Exacte jusqu'à SIMILARITY_EXACT_MAX_ROWS candidats, approchée au-delà (probe_similar_tracks).
+    Retourne (positions, similarités) triées par similarité décroissante, sans la piste elle-même.
+    """
+    matrix = feature_index['matrix']
+    query = matrix[row]
+    n_candidates = len(matrix) if candidate_ids is None else len(candidate_ids)
+
+    clusters = feature_index.get('clusters')
+    if clusters is not None and n_candidates > SIMILARITY_EXACT_MAX_ROWS:
+        result = probe_similar_tracks(clusters, query, row, candidate_ids, k)
+        if result is not None:
+            return result
+
+    # Produits scalaires par lots ; on ne garde que les k + 1 meilleurs de chaque lot
+    best_ids, best_scores = [], []
+    for start in range(0, n_candidates, batch_size):
+        ids = np.arange(start, min(start + batch_size, n_candidates)) if candidate_ids is None else candidate_ids[start:start + batch_size]
+        scores = matrix[start:start + len(ids)] @ query if candidate_ids is None else matrix[ids] @ query
+        scores[ids == row] = -np.inf
+        keep = min(k, len(ids))
+        top = np.argpartition(-scores, keep - 1)[:keep]
+        best_ids.append(ids[top])
+        best_scores.append(scores[top])
+
+    if not best_ids:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+    ids, scores = np.concatenate(best_ids), np.concatenate(best_scores)
+    valid = np.isfinite(scores)
+    ids, scores = ids[valid], scores[valid]
+    order = np.lexsort((ids, -scores))[:k]
+    return ids[order], scores[order]
+
+# Métriques audio agrégées par genre et par région
+TRACK_METRICS = ['bpm', 'gain', 'duration_minutes', 'danceability',
+                 'energy', 'acousticness', 'instrumentalness', 'valence']
+
+# Percentiles renvoyés avec chaque métrique
+METRIC_PERCENTILES = (25, 50, 75)
+
+def build_metric_aggregates(df_tracks, lists, metrics):
+    """Agrégats par catégorie (genre ou région), calculés une fois au chargement.
+
+    count / sum / sumsq donnent moyenne et écart-type, et les valeurs de chaque catégorie
+    sont stockées triées (sorted_values[bounds[c]:bounds[c + 1]]) pour lire les percentiles.
+    Les NaN sont ignorés comme dans groupby().mean() et rangés en fin de chaque catégorie.
+    """
+    n_categories = len(lists['categories'])
+    codes = np.asarray(lists['codes'], dtype=np.int64)
+    counts = np.diff(lists['offsets'])
+    rows = np.repeat(np.arange(len(counts), dtype=np.int64), counts)
+
+    # Une ligne par couple (piste, catégorie), équivalent de df.explode()
+    values = df_tracks[metrics].to_numpy(dtype=np.float64)[rows]
+    valid = ~np.isnan(values)
+    filled = np.where(valid, values, 0.0)
+
+    count = np.empty((n_categories, len(metrics)), dtype=np.int64)
+    total = np.empty((n_categories, len(metrics)), dtype=np.float64)
+    total_sq = np.empty((n_categories, len(metrics)), dtype=np.float64)
+    sorted_values = np.empty(values.shape, dtype=np.float64)
+    for m in range(len(metrics)):
+        count[:, m] = np.bincount(codes, weights=valid[:, m], minlength=n_categories)
+        total[:, m] = np.bincount(codes, weights=filled[:, m], minlength=n_categories)
+        total_sq[:, m] = np.bincount(codes, weights=filled[:, m] ** 2, minlength=n_categories)
+        sorted_values[:, m] = values[np.lexsort((values[:, m], codes)), m]
+
+    bounds = np.zeros(n_categories + 1, dtype=np.int64)
+    np.cumsum(np.bincount(codes, minlength=n_categories), out=bounds[1:])
+
+    return {
+        'metrics': list(metrics),
+        'categories': lists['categories'],
+        'category_index': lists['category_index'],
+        'count': count,
+        'sum': total,
+        'sumsq': total_sq,
+        'sorted_values': sorted_values,
+        'bounds': bounds,
+    }
+
+def describe_metrics(aggregates, code):
+    """Moyenne, écart-type et percentiles d'une catégorie, sans parcourir les pistes."""
+    start = aggregates['bounds'][code]
+    metrics, std, percentiles = {}, {}, {}
+    for m, metric in enumerate(aggregates['metrics']):
+        n = int(aggregates['count'][code, m])
+        if n == 0:
+            metrics[metric], std[metric] = 0, 0
+            percentiles[metric] = {f"p{p}": 0 for p in METRIC_PERCENTILES}
+            continue
+
+        mean = aggregates['sum'][code, m] / n
+        variance = max(aggregates['sumsq'][code, m] / n - mean ** 2, 0.0)
+        metrics[metric] = round(float(mean), 2)
+        std[metric] = round(float(np.sqrt(variance)), 2)
+
+        # Interpolation linéaire entre les deux rangs encadrants (comme np.percentile)
+        values = aggregates['sorted_values'][start:start + n, m]
+        percentiles[metric] = {}
+        for p in METRIC_PERCENTILES:
+            position = (n - 1) * p / 100
+            low, high = int(np.floor(position)), int(np.ceil(position))
+            value = values[low] + (values[high] - values[low]) * (position - low)
+            percentiles[metric][f"p{p}"] = round(float(value), 2)
+
+    return {
+        'count': int(aggregates['bounds'][code + 1] - start),
+        'metrics': metrics,
+        'std': std,
+        'percentiles': percentiles,
+    }
+
+def calculate_genre_metrics(genre_aggregates, genre, group_aggregates=None):
+    # Genre d'une piste : correspondance exacte ; sinon nom du tenseur ('Rap', 'House') : genres de pistes regroupés
+    if genre and genre not in genre_aggregates['category_index']:
+        group = genre_group(genre, group_aggregates['category_index']) if group_aggregates else None
+        if group is None:
+            return {"error": f"Aucune donnée pour le genre: {genre}"}
+        return {'genre': genre, **describe_metrics(group_aggregates, group_aggregates['category_index'][group])}
 
     # On filtre par genre
     if genre:
-        df_exploded = df_exploded[df_exploded['all_genres'].str.contains(genre, na=False)]
-        if df_exploded.empty:
-            return {"error": f"Aucune donnée pour le genre: {genre}"}
-    
-    resuls = df_exploded.groupby('all_genres')[valid_metrics].mean().reset_index()
+        codes = [genre_aggregates['category_index'][genre]]
+    else:
+        codes = range(len(genre_aggregates['categories']))
 
     # Formatage des résultats
-    genre_stats = []
-    for _, row in resuls.iterrows():
-        genre_data = {
-            'genre': genre,
-            'metrics': {metric: round(row[metric], 2) if not pd.isna(row[metric]) else 0 for metric in valid_metrics}
-        }
-        genre_stats.append(genre_data)
-    
+    genre_stats = [
+        {'genre': genre_aggregates['categories'][code], **describe_metrics(genre_aggregates, code)}
+        for code in codes
+    ]
+
     # On retourne les résultats du genre passé en paramètre
     if genre:
         return genre_stats[0] if genre_stats else {"error": f"Aucune donnée pour le genre: {genre}"}
     return genre_stats
 
-def calculate_region_metrics(df, region, valid_metrics):
-    # On explode la liste des regions pour avoir une ligne par région
-    df_exploded = df.explode('regions_recommandees')
+def calculate_region_metrics(region_aggregates, region):
     # On filtre par région
     if region:
-        df_exploded = df_exploded[df_exploded['regions_recommandees'].str.contains(region, na=False)]
-        if df_exploded.empty:
+        if region not in region_aggregates['category_index']:
             return {"error": f"Aucune donnée pour la région: {region}"}
-
-    # Groupement par région et calcul de la moyenne
-    resuls = df_exploded.groupby('regions_recommandees')[valid_metrics].mean().reset_index()
+        codes = [region_aggregates['category_index'][region]]
+    else:
+        codes = range(len(region_aggregates['categories']))
 
     # Formatage des résultats
-    region_stats = []
-    for _, row in resuls.iterrows():
-        region_data = {
-            'region': region,
-            'metrics': {metric: round(row[metric], 2) if not pd.isna(row[metric]) else 0 for metric in valid_metrics}
-        }
-        region_stats.append(region_data)
+    region_stats = [
+        {'region': region_aggregates['categories'][code], **describe_metrics(region_aggregates, code)}
+        for code in codes
+    ]
 
     # On retourne les résultats de la région passée en paramètre
     if region:
         return region_stats[0] if region_stats else {"error": f"Aucune donnée pour la région: {region}"}
     return region_stats
-    
+
+def append_list_column(lists, new_lists):
+    """Ajoute les listes d'un lot à une colonne encodée ; les codes du lot sont recodés sur les catégories existantes."""
+    categories = list(lists['categories'])
+    category_index = dict(lists['category_index'])
+    remap = []
+    for item in new_lists['categories']:
+        if item not in category_index:
+            category_index[item] = len(categories)
+            categories.append(item)
+        remap.append(category_index[item])
+
+    new_codes = np.array(remap, dtype=np.int32)[new_lists['codes']] if remap else np.empty(0, dtype=np.int32)
+    merged = {
+        'categories': categories,
+        'category_index': category_index,
+        'codes': np.concatenate([lists['codes'], new_codes]),
+        'offsets': np.concatenate([lists['offsets'], lists['offsets'][-1] + new_lists['offsets'][1:]]),
+    }
+    return merged, new_codes
+
+def append_track_index(postings, categories, new_codes, new_offsets, first_row):
+    """Ajoute les positions des nouvelles pistes en fin des listes concernées (elles restent triées)."""
+    postings = dict(postings)
+    rows = first_row + np.repeat(np.arange(len(new_offsets) - 1, dtype=np.int64), np.diff(new_offsets))
+    for code in np.unique(new_codes):
+        name = categories[code]
+        ids = np.unique(rows[new_codes == code])
+        postings[name] = np.concatenate([postings[name], ids]) if name in postings else ids
+    return postings
+
+def append_metric_aggregates(aggregates, df_new, lists, new_codes, new_offsets):
+    """Met à jour count / sum / sumsq et insère les nouvelles valeurs dans les valeurs triées de chaque catégorie."""
+    metrics = aggregates['metrics']
+    n_categories = len(lists['categories'])
+    added = n_categories - len(aggregates['categories'])
+    codes = np.asarray(new_codes, dtype=np.int64)
+    rows = np.repeat(np.arange(len(new_offsets) - 1, dtype=np.int64), np.diff(new_offsets))
+
+    values = df_new[metrics].to_numpy(dtype=np.float64)[rows]
+    valid = ~np.isnan(values)
+    filled = np.where(valid, values, 0.0)
+
+    # Nouvelles catégories : lignes à zéro, placées en fin des valeurs triées
+    pad = ((0, added), (0, 0))
+    count = np.pad(aggregates['count'], pad)
+    total = np.pad(aggregates['sum'], pad)
+    total_sq = np.pad(aggregates['sumsq'], pad)
+    bounds = np.concatenate([aggregates['bounds'], np.repeat(aggregates['bounds'][-1], added)])
+
+    sorted_columns = []
+    for m in range(len(metrics)):
+        # Lot trié par (catégorie, valeur) : les insertions à la même position restent ordonnées
+        order = np.lexsort((values[:, m], codes))
+        column = aggregates['sorted_values'][:, m]
+        positions = np.empty(len(order), dtype=np.int64)
+        for k, entry in enumerate(order):
+            code = codes[entry]
+            if valid[entry, m]:
+                start = bounds[code]
+                positions[k] = start + np.searchsorted(column[start:start + count[code, m]], values[entry, m], side='right')
+            else:
+                positions[k] = bounds[code + 1]
+        sorted_columns.append(np.insert(column, positions, values[order, m]))
+
+        count[:, m] += np.bincount(codes, weights=valid[:, m], minlength=n_categories).astype(np.int64)
+        total[:, m] += np.bincount(codes, weights=filled[:, m], minlength=n_categories)
+        total_sq[:, m] += np.bincount(codes, weights=filled[:, m] ** 2, minlength=n_categories)
+
+    bounds = bounds + np.concatenate([[0], np.cumsum(np.bincount(codes, minlength=n_categories))])
+
+    return {
+        'metrics': metrics,
+        'categories': lists['categories'],
+        'category_index': lists['category_index'],
+        'count': count,
+        'sum': total,
+        'sumsq': total_sq,
+        'sorted_values': np.column_stack(sorted_columns) if sorted_columns else np.empty((len(lists['codes']), 0)),
+        'bounds': bounds,
+    }
+
+def append_track_orders(track_orders, df_tracks, first_row):
+    """Insère les nouvelles pistes dans les ordres précalculés (fusion par recherche dichotomique, sans retrier)."""
+    new_rows = np.arange(first_row, len(df_tracks), dtype=np.int64)
+    rows = np.arange(len(df_tracks), dtype=np.int64)
+    updated = {}
+    for order_by, orders in track_orders.items():
+        values = track_sort_values(df_tracks[order_by.lstrip('-')], order_by.startswith('-'))
+        new_sorted = new_rows[np.lexsort((new_rows, values[new_rows]))]
+        # side='right' : à valeur égale, les nouvelles pistes (positions plus grandes) passent après
+        insert_at = np.searchsorted(values[orders['order']], values[new_sorted], side='right')
+        order = np.insert(orders['order'], insert_at, new_sorted)
+        position = np.empty_like(order)
+        position[order] = rows
+        updated[order_by] = {'order': order, 'position': position}
+    return updated
+
+def append_tracks(tracks_data, df_new):
+    """Ajoute un lot de pistes au jeu de données chargé, sans relire le CSV ni retrier le catalogue.
+
+    Seul le lot est parsé, encodé et trié, puis fusionné par recherche dichotomique. Les tableaux
+    du catalogue sont en revanche recopiés une fois (concaténations, insertions, positions) :
+    l'ajout reste linéaire en la taille du catalogue, mais en copies mémoire seulement.
+    Retourne un nouveau jeu de données : l'ancien (partagé, en lecture seule) n'est pas modifié.
+    """
+    df_tracks = tracks_data['df_tracks']
+    first_row = len(df_tracks)
+    new_lists = parse_track_lists(df_new)
+    df_new = df_new.reindex(columns=df_tracks.columns).reset_index(drop=True)
+    new_lists['genre_groups'] = build_genre_groups(new_lists['genres'])
+
+    columns = {}
+    for col in df_tracks.columns:
+        if isinstance(df_tracks[col].dtype, pd.CategoricalDtype):
+            # Seules les valeurs du lot sont encodées, les codes existants sont recopiés
+            new_values = pd.Categorical(df_new[col].astype(df_tracks[col].cat.categories.dtype))
+            columns[col] = pd.api.types.union_categoricals([df_tracks[col].array, new_values], ignore_order=True)
+        else:
+            columns[col] = np.concatenate([df_tracks[col].to_numpy(), df_new[col].to_numpy(dtype=df_tracks[col].dtype)])
+
+    track_lists, track_index, metric_aggregates = {}, {}, {}
+    for key in tracks_data['track_lists']:
+        track_lists[key], new_codes = append_list_column(tracks_data['track_lists'][key], new_lists[key])
+        track_index[key] = append_track_index(tracks_data['track_index'][key], track_lists[key]['categories'], new_codes, new_lists[key]['offsets'], first_row)
+        metric_aggregates[key] = append_metric_aggregates(tracks_data['metric_aggregates'][key], df_new, track_lists[key], new_codes, new_lists[key]['offsets'])
+
+    df_tracks = pd.DataFrame(columns, copy=False)
+
+    return {
+        'df_tracks': df_tracks,
+        'track_lists': track_lists,
+        'track_index': track_index,
+        'metric_aggregates': metric_aggregates,
+        'track_orders': append_track_orders(tracks_data['track_orders'], df_tracks, first_row),
+        'feature_index': append_feature_index(tracks_data['feature_index'], df_new),
+    }
+
+def append_tracks_from_csv(tracks_data, raw_rows):
+    """Applique les lignes CSV (sans en-tête) ajoutées en fin de df_tracks.csv."""
+    try:
+        # Noms des colonnes du CSV (df_tracks n'a pas les colonnes de listes)
+        header = pd.read_csv(os.path.join(settings.DATA_DIR, SNAPSHOT_SOURCES['tracks']), nrows=0).columns
+        df_new = pd.read_csv(io.BytesIO(raw_rows), header=None, names=list(header))
+        return append_tracks(tracks_data, df_new)
+    except Exception as e:
+        print(f"Erreur lors de l'ajout des pistes : {e}")
+        return None
+
+def write_tracks_batch(df_new):
+    """Ajoute un lot de pistes à la fin de df_tracks.csv (même ordre de colonnes, sans en-tête)."""
+    tracks_path = os.path.join(settings.DATA_DIR, SNAPSHOT_SOURCES['tracks'])
+    header = pd.read_csv(tracks_path, nrows=0).columns
+    df_new = df_new.copy()
+    for col in header:
+        # Colonne en double dans le CSV ('artist_name' -> 'artist_name.1' à la lecture)
+        base = col.rsplit('.', 1)[0]
+        if col not in df_new.columns and base != col and base in df_new.columns:
+            df_new[col] = df_new[base]
+    missing = [col for col in header if col not in df_new.columns]
+    if missing:
+        raise ValueError(f"Colonnes manquantes : {', '.join(missing)}")
+
+    # Une seule écriture : les workers qui surveillent le fichier ne voient pas de ligne partielle
+    rows = df_new[list(header)].to_csv(header=False, index=False)
+    with open(tracks_path, 'a', encoding='utf-8', newline='') as tracks_file:
+        tracks_file.write(rows)
+    return len(df_new)
@@ -0,0 +1,147 @@
+import functools
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import HttpResponse, StreamingHttpResponse
+from rest_framework.exceptions import AuthenticationFailed, NotAuthenticated
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from recoMusique.executors import ExecutorOverloaded
+from recoMusique.responses import json_response
+from .services.AsyncExecutor import async_executor
+from .services.ComputeBackend import ComputeUnavailable
+from .services.DatasetRegistry import dataset_registry
+from .services.ResponseCache import MISSING, response_cache
+from .views import (
+    music_listeners_service, music_artist_service, response_etag, is_not_modified, compute_cached,
+    split_param, parse_tracks_params, tracks_cache_params, compute_tracks, TRACKS_STREAM_FORMATS,
+)
+
+# Versions async (ASGI) des endpoints de recommandation, activées par RECOMMENDATIONS_ASYNC['ENABLED'].
+# Mêmes paramètres et mêmes réponses que views.py, mais le calcul se fait dans le pool borné
+# de async_executor : la boucle d'événements reste libre pour les autres sessions.
+
+async def authenticate(request):
+    """Authentification JWT comme DRF ; la lecture de l'utilisateur en base passe par un thread."""
+    try:
+        result = await sync_to_async(JWTAuthentication().authenticate)(request)
+    except AuthenticationFailed as e:
+        return None, e.detail
+    if result is None:
+        return None, NotAuthenticated.default_detail
+    return result[0], None
+
+def async_api_view(view):
+    """Équivalent async de @api_view(['GET']) + IsAuthenticated."""
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if request.method != 'GET':
+            return json_response({"detail": f'Method "{request.method}" not allowed.'}, status=405, headers={'Allow': 'GET'})
+
+        user, error = await authenticate(request)
+        if user is None or not user.is_authenticated:
+            return json_response({"detail": error}, status=401, headers={'WWW-Authenticate': 'Bearer realm="api"'})
+        request.user = user
+
+        return await view(request, *args, **kwargs)
+    return wrapper
+
+async def async_cached_response(request, endpoint, params, compute):
+    etag = response_etag(endpoint, params)
+    headers = {'ETag': etag, 'Cache-Control': settings.RECOMMENDATIONS_CACHE_CONTROL, 'Vary': 'Authorization'}
+
+    # Le client a déjà cette réponse : 304 avant tout calcul
+    if is_not_modified(request, etag):
+        return HttpResponse(status=304, headers=headers)
+
+    # Cache en mémoire lu directement ; sinon calcul dans le pool, partagé entre requêtes identiques
+    result = response_cache.get(endpoint, params) if response_cache.backend.local else MISSING
+    if result is MISSING:
+        key = response_cache.key(endpoint, params, dataset_registry.version())
+        try:
+            result = await async_executor.run(key, lambda: compute_cached(endpoint, params, compute))
+        except ExecutorOverloaded:
+            return json_response({"error": "Serveur surchargé, réessayez dans un instant"}, status=503, headers={'Retry-After': '1'})
+        except ComputeUnavailable as e:
+            return json_response({"error": e.message}, status=e.status)
+
+    if "error" in result:
+        return json_response({"error": result["error"]}, status=400)
+
+    return json_response(result, status=200, headers=headers)
+
+async def stream_chunks(chunks):
+    # Chaque morceau est sérialisé dans le pool, jamais dans la boucle d'événements.
+    # La requête a été admise avant l'envoi du 200 : une surcharge ne doit pas tronquer la réponse
+    while True:
+        chunk = await async_executor.submit(next, chunks, None, admitted=True)
+        if chunk is None:
+            return
+        yield chunk
+
+# Endpoints pour les listeners
+@async_api_view
+async def get_popular_genres_by_region(request):
+
+    region = split_param(request.GET.get('region', None))
+
+    return await async_cached_response(request, 'listeners/popular-genres-region', {'region': region}, lambda: music_listeners_service.get_listeners_genre_by_region(region))
+
+@async_api_view
+async def get_popular_genres_by_region_and_age(request):
+
+    region = split_param(request.GET.get('region', None))
+    age = split_param(request.GET.get('age', None))
+
+    return await async_cached_response(request, 'listeners/popular-genres-region-age', {'region': region, 'age': age}, lambda: music_listeners_service.get_listeners_genre_by_region_and_age(region, age))
+
+# Endpoints pour les artistes
+@async_api_view
+async def get_popular_genres_by_region_artist(request):
+
+    region = split_param(request.GET.get('region', None))
+
+    return await async_cached_response(request, 'artists/popular-genres-region', {'region': region}, lambda: music_artist_service.get_artists_genre_by_region(region))
+
+@async_api_view
+async def get_popular_genres_by_region_and_age_artist(request):
+
+    region = split_param(request.GET.get('region', None))
+    age = split_param(request.GET.get('age', None))
+
+    return await async_cached_response(request, 'artists/popular-genres-region-age', {'region': region, 'age': age}, lambda: music_artist_service.get_artists_genre_by_region_and_age(region, age))
+
+@async_api_view
+async def get_tracks_from_genre_and_region_artist(request):
+
+    options, error = parse_tracks_params(request.GET)
+    if error:
+        return json_response({"error": error}, status=400)
+
+    if options['stream']:
+        try:
+            result = await async_executor.submit(
+                music_artist_service.stream_tracks_from_genre_and_region,
+                options['region'], options['genre'], options['stream'], options['order_by'], options['fields'],
+            )
+        except ExecutorOverloaded:
+            return json_response({"error": "Serveur surchargé, réessayez dans un instant"}, status=503, headers={'Retry-After': '1'})
+
+        if isinstance(result, dict) and "error" in result:
+            return json_response({"error": result["error"]}, status=400)
+
+        return StreamingHttpResponse(stream_chunks(result), content_type=TRACKS_STREAM_FORMATS[options['stream']])
+
+    return await async_cached_response(request, 'artists/tracks-genre-region', tracks_cache_params(options), lambda: compute_tracks(options))
+
+@async_api_view
+async def get_metrics_by_genre(request):
+
+    genre = request.GET.get('genre', None)
+
+    return await async_cached_response(request, 'artists/metrics-genre', {'genre': genre}, lambda: music_artist_service.get_metrics_by_genre(genre))
+
+@async_api_view
+async def get_metrics_by_region(request):
+
+    region = request.GET.get('region', None)
+
+    return await async_cached_response(request, 'artists/metrics-region', {'region': region}, lambda: music_artist_service.get_metrics_by_region(region))
@@ -0,0 +1,22 @@
+import pandas as pd
+from django.core.management.base import BaseCommand, CommandError
+from recommendations.Utils import write_tracks_batch
+
+
+class Command(BaseCommand):
+    help = "Ajoute un lot de pistes (CSV avec les colonnes de df_tracks.csv) à la fin de df_tracks.csv"
+
+    def add_arguments(self, parser):
+        parser.add_argument('batch', help="Chemin du CSV contenant les nouvelles pistes")
+
+    def handle(self, *args, **options):
+        try:
+            appended = write_tracks_batch(pd.read_csv(options['batch']))
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(self.style.SUCCESS(f"{appended} pistes ajoutées à df_tracks.csv"))
+        self.stdout.write(
+            "Les workers avec DATASET_RELOAD_INTERVAL les intègrent sans rechargement complet ; "
+            "relancez build_data_snapshot pour mettre à jour le snapshot."
+        )
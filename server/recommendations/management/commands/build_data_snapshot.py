@@ -0,0 +1,16 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from recommendations.Snapshot import write_data_snapshot
+from recommendations.Utils import read_csv_datasets
+
+
+class Command(BaseCommand):
+    help = "Convertit les CSV de data/csv en snapshot binaire colonne par colonne (chargé en mmap au démarrage)"
+
+    def handle(self, *args, **options):
+        frames = read_csv_datasets(('genre_region_age', 'tracks'))
+        manifest = write_data_snapshot(settings.DATA_SNAPSHOT_DIR, settings.DATA_DIR, frames)
+
+        for name, frame in manifest['frames'].items():
+            self.stdout.write(f"- {name} : {frame['rows']} lignes, {len(frame['columns'])} colonnes")
+        self.stdout.write(self.style.SUCCESS(f"Snapshot écrit dans {settings.DATA_SNAPSHOT_DIR}"))
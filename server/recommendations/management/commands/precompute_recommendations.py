@@ -0,0 +1,94 @@
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from recommendations.services.DatasetRegistry import dataset_registry
+from recommendations.services.MusicServiceArtist import MusicServiceArtist
+from recommendations.services.MusicServiceListener import MusicServiceListeners
+from recommendations.services.PrecomputedStore import write_precomputed_store
+from recommendations.services.ResponseCache import ResponseCache
+
+# Services utilisés directement, sans le SingleFlight ni le pool de calcul des vues :
+# chaque processus fils calcule lui-même au lieu de démarrer son propre pool
+music_listeners_service = MusicServiceListeners()
+music_artist_service = MusicServiceArtist()
+
+# Calcul de chaque endpoint précalculé, avec les mêmes paramètres que la vue correspondante
+PRECOMPUTED_ENDPOINTS = {
+    'listeners/popular-genres-region': lambda p: music_listeners_service.get_listeners_genre_by_region(p['region']),
+    'listeners/popular-genres-region-age': lambda p: music_listeners_service.get_listeners_genre_by_region_and_age(p['region'], p['age']),
+    'artists/popular-genres-region': lambda p: music_artist_service.get_artists_genre_by_region(p['region']),
+    'artists/popular-genres-region-age': lambda p: music_artist_service.get_artists_genre_by_region_and_age(p['region'], p['age']),
+    'artists/metrics-genre': lambda p: music_artist_service.get_metrics_by_genre(p['genre']),
+    'artists/metrics-region': lambda p: music_artist_service.get_metrics_by_region(p['region']),
+}
+
+def enumerate_tasks():
+    """Toutes les combinaisons (endpoint, paramètres) servies par recommendations/urls.py.
+
+    Les réponses par utilisateur (recommended-tracks), par piste (similar-tracks) et les listes
+    de pistes (tracks-genre-region, de la taille du catalogue : une lecture d'index suffit) restent
+    calculées en direct.
+    """
+    genre_scores = dataset_registry.get('genre_region_age')['genre_scores']
+    track_index = dataset_registry.get('tracks')['track_index']
+    regions = [None] + genre_scores['regions']
+    ages = [None] + genre_scores['ages']
+    track_regions = [None] + sorted(track_index['regions'])
+    track_genres = [None] + sorted(track_index['genres'])
+
+    tasks = []
+    for prefix in ('listeners', 'artists'):
+        tasks += [(f'{prefix}/popular-genres-region', {'region': region}) for region in regions]
+        tasks += [(f'{prefix}/popular-genres-region-age', {'region': region, 'age': age}) for region in regions for age in ages]
+    tasks += [('artists/metrics-genre', {'genre': genre}) for genre in track_genres]
+    tasks += [('artists/metrics-region', {'region': region}) for region in track_regions]
+    return tasks
+
+def compute_task(task):
+    # Exécuté dans les processus du pool : les données sont héritées du parent (fork) ou rechargées
+    endpoint, params = task
+    return endpoint, ResponseCache.normalize(params), PRECOMPUTED_ENDPOINTS[endpoint](params)
+
+
+class Command(BaseCommand):
+    help = "Précalcule les réponses des endpoints de recommandation pour toutes les combinaisons région / âge / genre"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count(), help="Nombre de processus de calcul")
+        parser.add_argument('--output', default=settings.PRECOMPUTED_DIR, help="Répertoire du store de réponses")
+
+    def handle(self, *args, **options):
+        # Chargées avant la création du pool : les processus fils partagent les pages en copy-on-write
+        dataset_registry.load_all()
+        if not music_artist_service.data_loaded:
+            self.stderr.write(self.style.ERROR("Données non chargées, rien à précalculer"))
+            return
+
+        version = dataset_registry.version()
+        tasks = enumerate_tasks()
+        workers = max(1, options['workers'] or 1)
+        self.stdout.write(f"{len(tasks)} réponses à calculer sur {workers} processus (version {version})")
+
+        start = time.perf_counter()
+        results = {endpoint: {} for endpoint in PRECOMPUTED_ENDPOINTS}
+        errors = 0
+        chunksize = max(1, len(tasks) // (workers * 4))
+        context = multiprocessing.get_context('fork') if 'fork' in multiprocessing.get_all_start_methods() else None
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+            for endpoint, key, result in executor.map(compute_task, tasks, chunksize=chunksize):
+                # Les erreurs ne sont pas stockées : elles restent calculées (et mises en cache) en direct
+                if isinstance(result, dict) and "error" in result:
+                    errors += 1
+                    continue
+                results[endpoint][key] = result
+
+        manifest = write_precomputed_store(options['output'], version, results)
+
+        for endpoint, info in manifest['endpoints'].items():
+            self.stdout.write(f"- {endpoint} : {info['entries']} réponses")
+        self.stdout.write(self.style.SUCCESS(
+            f"Réponses précalculées écrites dans {options['output']} en {time.perf_counter() - start:.1f}s ({errors} combinaisons sans résultat)"
+        ))
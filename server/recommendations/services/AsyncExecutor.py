@@ -0,0 +1,5 @@
+from django.conf import settings
+from recoMusique.executors import AsyncExecutor
+
+# Pool du calcul pandas/NumPy des vues async de recommandation (recoMusique/executors.py)
+async_executor = AsyncExecutor(settings.RECOMMENDATIONS_ASYNC['MAX_WORKERS'], settings.RECOMMENDATIONS_ASYNC['MAX_PENDING'], 'reco-compute')
@@ -0,0 +1,171 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+import django
+from django.conf import settings
+from ..Snapshot import current_snapshot_manifest
+from .DatasetRegistry import dataset_registry
+
+
+class ComputeUnavailable(Exception):
+    """Le calcul n'a pas pu être fait par le pool de processus (status : code HTTP à renvoyer)."""
+    status = 503
+    message = "Calcul indisponible, réessayez dans un instant"
+
+
+class ComputeOverloaded(ComputeUnavailable):
+    message = "Trop de calculs en attente, réessayez dans un instant"
+
+
+class ComputeTimeout(ComputeUnavailable):
+    status = 504
+    message = "Le calcul a dépassé le temps maximum autorisé"
+
+
+# Service du processus de calcul, créé une fois par l'initializer du pool
+_worker_service = None
+
+def _init_worker():
+    # Les jeux de données sont relus par le registre : depuis le snapshot en mmap s'il existe,
+    # les pages sont alors partagées entre tous les processus au lieu d'être copiées
+    django.setup()
+    global _worker_service
+    from .MusicServiceArtist import MusicServiceArtist
+    _worker_service = MusicServiceArtist()
+
+def _run_operation(operation, args, kwargs, version):
+    # Le processus principal a rechargé des données plus récentes : on se met à jour avant de calculer
+    if dataset_registry.version() != version:
+        dataset_registry.refresh()
+    return getattr(_worker_service, operation)(*args, **kwargs)
+
+
+class ProcessPoolBackend:
+    """Exécute les opérations lourdes de MusicServiceArtist dans un pool de processus.
+
+    Seuls le nom de l'opération, ses arguments et le résultat passent entre processus.
+    Le nombre de calculs en attente est borné (ComputeOverloaded) et chaque calcul a un
+    temps maximum (ComputeTimeout) : une requête lente n'immobilise plus un worker HTTP.
+    """
+
+    def __init__(self, max_workers=2, timeout=10, max_queue=32, start_method=None):
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.max_queue = max_queue
+        self.start_method = start_method
+        self._executor = None
+        self._executor_pid = None
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._submitted = 0
+        self._rejected = 0
+        self._timeouts = 0
+        self._failures = 0
+        self._snapshot_checked = None
+
+    def _pool(self):
+        # Créé à la demande dans chaque processus HTTP, jamais hérité d'un fork
+        with self._lock:
+            if self._executor is None or self._executor_pid != os.getpid():
+                # forkserver / spawn : pas de fork d'un processus serveur multi-threadé
+                methods = multiprocessing.get_all_start_methods()
+                method = self.start_method or ('forkserver' if 'forkserver' in methods else 'spawn')
+                self._executor = ProcessPoolExecutor(
+                    self.max_workers, mp_context=multiprocessing.get_context(method), initializer=_init_worker,
+                )
+                self._executor_pid = os.getpid()
+            return self._executor
+
+    def _check_snapshot(self, version):
+        # Sans snapshot à jour (absent, ou CSV complété depuis), chaque processus relit les CSV
+        # et garde sa propre copie des données au lieu de partager les pages du snapshot
+        if version == self._snapshot_checked:
+            return
+        self._snapshot_checked = version
+        if current_snapshot_manifest(settings.DATA_SNAPSHOT_DIR, settings.DATA_DIR, ('genre_region_age', 'tracks')) is None:
+            print(
+                f"Attention : snapshot absent ou périmé, les {self.max_workers} processus de calcul chargent "
+                "chacun une copie des CSV (python manage.py build_data_snapshot)."
+            )
+
+    def _done(self, _future):
+        with self._lock:
+            self._pending -= 1
+
+    def run(self, operation, args, kwargs, version):
+        self._check_snapshot(version)
+        with self._lock:
+            if self._pending >= self.max_queue:
+                self._rejected += 1
+                raise ComputeOverloaded()
+            self._pending += 1
+            self._submitted += 1
+
+        try:
+            future = self._pool().submit(_run_operation, operation, args, kwargs, version)
+        except BaseException:
+            with self._lock:
+                self._pending -= 1
+            raise
+        future.add_done_callback(self._done)
+
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            # Un calcul déjà démarré ne peut pas être interrompu : il se termine, sans être attendu
+            future.cancel()
+            with self._lock:
+                self._timeouts += 1
+            raise ComputeTimeout()
+        except BrokenProcessPool:
+            # Un processus de calcul est mort (mémoire, signal) : le pool sera recréé au prochain appel
+            with self._lock:
+                self._failures += 1
+                self._executor = None
+            raise ComputeUnavailable()
+
+    def stats(self):
+        return {
+            'backend': 'process',
+            'max_workers': self.max_workers,
+            'timeout': self.timeout,
+            'max_queue': self.max_queue,
+            'pending': self._pending,
+            'submitted': self._submitted,
+            'rejected': self._rejected,
+            'timeouts': self._timeouts,
+            'failures': self._failures,
+        }
+
+
+class ComputeBackendService:
+    """Enveloppe MusicServiceArtist : les opérations listées passent par le backend de calcul."""
+
+    def __init__(self, service, backend, operations):
+        self._service = service
+        self._backend = backend
+        self._operations = set(operations)
+
+    def __getattr__(self, attr):
+        value = getattr(self._service, attr)
+        if attr not in self._operations:
+            return value
+
+        def call(*args, **kwargs):
+            return self._backend.run(attr, args, kwargs, self._service.registry.version())
+        return call
+
+
+def build_compute_backend(config):
+    if config.get('BACKEND', 'local') != 'process':
+        return None
+    return ProcessPoolBackend(config.get('MAX_WORKERS', 2), config.get('TIMEOUT', 10), config.get('MAX_QUEUE', 32), config.get('START_METHOD'))
+
+def with_compute_backend(service, backend=None, operations=()):
+    # Backend 'local' : le service est utilisé tel quel, dans le thread de la requête
+    return ComputeBackendService(service, backend, operations) if backend is not None else service
+
+
+compute_backend = build_compute_backend(settings.RECOMMENDATIONS_COMPUTE)
@@ -0,0 +1,253 @@
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from types import MappingProxyType
+from django.conf import settings
+import numpy as np
+import pandas as pd
+from ..Snapshot import SNAPSHOT_SOURCES, source_signature
+from ..Utils import load_data_genre_region_age, load_data_tracks, append_tracks_from_csv
+
+
+def freeze(value):
+    """Rend un jeu de données partageable en lecture seule (dicts figés, tableaux non modifiables)."""
+    if isinstance(value, dict):
+        return MappingProxyType({key: freeze(item) for key, item in value.items()})
+    if isinstance(value, np.ndarray):
+        value.flags.writeable = False
+    return value
+
+def nbytes(value):
+    """Estimation de l'empreinte mémoire d'un jeu de données."""
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True).sum())
+    if isinstance(value, np.ndarray):
+        return int(value.nbytes)
+    if isinstance(value, (dict, MappingProxyType)):
+        return sum(nbytes(key) + nbytes(item) for key, item in value.items())
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(nbytes(item) for item in value)
+    return sys.getsizeof(value)
+
+def source_path(name):
+    return os.path.join(settings.DATA_DIR, SNAPSHOT_SOURCES[name])
+
+def source_version(name):
+    """Version d'un jeu de données, dérivée de la signature de son CSV (identique dans tous les workers)."""
+    path = source_path(name)
+    signature = source_signature(path) if os.path.exists(path) else None
+    return hashlib.sha1(json.dumps([name, signature]).encode()).hexdigest()[:12]
+
+def reload_signal():
+    """Identité du dernier signal de rechargement (fichier DATASET_RELOAD_SIGNAL), None si jamais demandé."""
+    try:
+        stat = os.stat(settings.DATASET_RELOAD_SIGNAL)
+    except FileNotFoundError:
+        return None
+    return stat.st_ino, stat.st_mtime_ns
+
+def versions_hash(versions):
+    return hashlib.sha1('|'.join(f"{name}:{version or '-'}" for name, version in sorted(versions.items())).encode()).hexdigest()[:12]
+
+def source_tail(path, size, length=4096):
+    """Empreinte des derniers octets lus : permet de vérifier qu'un fichier a seulement été complété."""
+    if not os.path.exists(path):
+        return None
+    with open(path, 'rb') as source:
+        source.seek(max(0, size - length))
+        return hashlib.sha1(source.read(min(size, length))).hexdigest()
+
+
+class DatasetRegistry:
+    """Registre des jeux de données du processus : chacun est chargé une seule fois et partagé par tous les services.
+
+    Les jeux de données sont regroupés dans une génération immuable. Un rechargement construit
+    la nouvelle génération à côté puis la remplace d'un coup : une requête qui a déjà lu
+    un jeu de données garde la même version jusqu'au bout.
+
+    Un rechargement demandé à un worker (request_reload) touche le fichier DATASET_RELOAD_SIGNAL :
+    les autres workers le voient à leur prochaine lecture et se rechargent à leur tour.
+    """
+
+    def __init__(self, loaders, watch_interval=0, appenders=None):
+        self._loaders = loaders
+        # Mise à jour incrémentale quand le CSV a seulement été complété : (jeu de données, lignes ajoutées) -> jeu de données
+        self._appenders = appenders or {}
+        self._watch_interval = watch_interval
+        self._current = MappingProxyType({})
+        self._lock = threading.Lock()
+        # Réentrant : refresh() le garde pendant append() / reload()
+        self._reload_lock = threading.RLock()
+        self._watcher_pid = None
+        # Signal de rechargement déjà traité par ce processus (hérité au fork, comme les données)
+        self._signal = reload_signal()
+
+    def _load(self, name):
+        path = source_path(name)
+        size = os.path.getsize(path) if os.path.exists(path) else 0
+        version = source_version(name)
+        dataset = self._loaders[name]()
+        if dataset is None:
+            return None
+        return freeze({**dataset, 'version': version, 'source_size': size, 'source_tail': source_tail(path, size)})
+
+    def _swap(self, datasets):
+        # Une seule affectation : les lecteurs voient l'ancienne ou la nouvelle génération, jamais un mélange
+        self._current = MappingProxyType({**self._current, **datasets})
+        return self._current
+
+    def get(self, name):
+        # Retourne None si le chargement a échoué (comme data_loaded = False)
+        self.watch()
+        self.check_reload_signal()
+        datasets = self._current
+        if name not in datasets:
+            with self._lock:
+                datasets = self._current
+                if name not in datasets:
+                    datasets = self._swap({name: self._load(name)})
+        return datasets[name]
+
+    def load_all(self):
+        # À appeler avant le fork des workers (gunicorn --preload) : pages partagées en copy-on-write
+        for name in self._loaders:
+            self.get(name)
+
+    def version(self):
+        """Version globale des données chargées, utilisable dans les clés de cache."""
+        return versions_hash({name: dataset['version'] if dataset else None for name, dataset in self._current.items()})
+
+    def source_version(self):
+        """Version que serviront les workers une fois les CSV actuels rechargés."""
+        return versions_hash({name: source_version(name) for name in self._loaders})
+
+    def request_reload(self):
+        """Rechargement de tous les workers : signal pour les autres processus, rechargement de celui-ci."""
+        signal_path = settings.DATASET_RELOAD_SIGNAL
+        os.makedirs(os.path.dirname(signal_path), exist_ok=True)
+        # Nouveau fichier mis en place d'un coup : nouvel inode, même si deux demandes tombent dans la même milliseconde
+        tmp_path = f"{signal_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as signal_file:
+            signal_file.write(f"{time.time()}\n")
+        os.replace(tmp_path, signal_path)
+        with self._lock:
+            self._signal = reload_signal()
+        return self.reload()
+
+    def check_reload_signal(self):
+        # Un os.stat par lecture : le signal d'un autre worker est vu à la requête suivante
+        signal = reload_signal()
+        if signal == self._signal:
+            return None
+        with self._lock:
+            if signal == self._signal:
+                return None
+            self._signal = signal
+        return self.reload() if self._current else None
+
+    def reload(self, names=None, background=True):
+        """Reconstruit les jeux de données (tous par défaut) puis les échange atomiquement."""
+        if background:
+            thread = threading.Thread(target=self.reload, args=(names, False), daemon=True)
+            thread.start()
+            return thread
+
+        with self._reload_lock:
+            fresh = {name: self._load(name) for name in (names or self._loaders)}
+            # En cas d'échec on garde la version déjà servie
+            fresh = {name: dataset for name, dataset in fresh.items() if dataset is not None}
+            with self._lock:
+                self._swap(fresh)
+            print(f"Jeux de données rechargés : {', '.join(fresh) or 'aucun'} (version {self.version()})")
+            return list(fresh)
+
+    def stale(self):
+        """Jeux de données dont le CSV a changé depuis leur chargement."""
+        return [
+            name for name, dataset in self._current.items()
+            if dataset is None or dataset['version'] != source_version(name)
+        ]
+
+    def appended(self, name):
+        """Vrai si le CSV a seulement été complété depuis le chargement (ajout de pistes en fin de fichier)."""
+        dataset = self._current.get(name)
+        path = source_path(name)
+        if dataset is None or name not in self._appenders or not os.path.exists(path):
+            return False
+        return os.path.getsize(path) > dataset['source_size'] and source_tail(path, dataset['source_size']) == dataset['source_tail']
+
+    def append(self, name):
+        """Applique les lignes ajoutées en fin de CSV sans tout recharger, puis échange le jeu de données."""
+        with self._reload_lock:
+            dataset = self._current.get(name)
+            if not self.appended(name):
+                return False
+
+            path = source_path(name)
+            with open(path, 'rb') as source:
+                source.seek(dataset['source_size'])
+                raw_rows = source.read()
+            # On s'arrête à la dernière ligne complète, la suite sera lue au prochain passage
+            raw_rows = raw_rows[:raw_rows.rfind(b'\n') + 1]
+            if not raw_rows:
+                return False
+
+            updated = self._appenders[name](dataset, raw_rows)
+            if updated is None:
+                return False
+
+            size = dataset['source_size'] + len(raw_rows)
+            complete = size == os.path.getsize(path)
+            version = source_version(name) if complete else hashlib.sha1(f"{dataset['version']}+{size}".encode()).hexdigest()[:12]
+            fresh = freeze({**updated, 'version': version, 'source_size': size, 'source_tail': source_tail(path, size)})
+            with self._lock:
+                self._swap({name: fresh})
+            print(f"Jeu de données {name} complété : {len(raw_rows)} octets ajoutés (version {self.version()})")
+            return True
+
+    def refresh(self):
+        """Met à jour les jeux de données dont le CSV a changé : ajout incrémental si possible, sinon rechargement."""
+        # stale() est lu sous le verrou : un refresh concurrent (watcher, ajout de pistes) a pu déjà
+        # intégrer les lignes, on ne recharge alors pas tout le jeu de données pour rien
+        with self._reload_lock:
+            stale = self.stale()
+            reload = [name for name in stale if not self.append(name)]
+            if reload:
+                self.reload(reload, background=False)
+        return stale
+
+    def watch(self):
+        # Démarré à la demande dans chaque processus : les threads ne survivent pas au fork des workers
+        if not self._watch_interval or self._watcher_pid == os.getpid():
+            return
+        with self._lock:
+            if self._watcher_pid == os.getpid():
+                return
+            self._watcher_pid = os.getpid()
+        threading.Thread(target=self._watch_loop, daemon=True).start()
+
+    def _watch_loop(self):
+        while True:
+            time.sleep(self._watch_interval)
+            self.refresh()
+
+    def footprint(self):
+        return {
+            name: {
+                'loaded': dataset is not None,
+                'version': dataset['version'] if dataset is not None else None,
+                'bytes': nbytes(dataset) if dataset is not None else 0,
+            }
+            for name, dataset in self._current.items()
+        }
+
+
+dataset_registry = DatasetRegistry({
+    'genre_region_age': load_data_genre_region_age,
+    'tracks': load_data_tracks,
+}, watch_interval=settings.DATASET_RELOAD_INTERVAL, appenders={
+    'tracks': append_tracks_from_csv,
+})
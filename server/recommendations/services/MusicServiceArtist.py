@@ -1,100 +1,202 @@
-from ..Utils import load_data_artists, get_popular_genres_by_region, get_popular_genres_by_region_and_age, calculate_genre_metrics, calculate_region_metrics
+import numpy as np
+import pandas as pd
+from ..Utils import get_popular_genres_by_region, get_popular_genres_by_region_and_age, get_popular_genres_map, calculate_genre_metrics, calculate_region_metrics, write_tracks_batch, format_tracks, stream_tracks, order_tracks, page_tracks, encode_tracks_cursor, decode_tracks_cursor, DEFAULT_TRACKS_PAGE_SIZE, find_track_by_rank, similar_tracks, DEFAULT_SIMILAR_TRACKS, TRACK_DISPLAY_COLUMNS, genre_group
+from .DatasetRegistry import dataset_registry
 
 
 class MusicServiceArtist:
-    def __init__(self):
-        self.df_genre_region_age, self.df_tracks, self.data_loaded = load_data_artists()
+    def __init__(self, registry=dataset_registry):
+        self.registry = registry
+        # Chargement au démarrage (les données sont partagées via le registre)
+        self.registry.get('genre_region_age')
+        self.registry.get('tracks')
+
+    @property
+    def data_loaded(self):
+        return self.registry.get('genre_region_age') is not None and self.registry.get('tracks') is not None
+
+    def _genre_scores(self):
+        genre_region_age = self.registry.get('genre_region_age')
+        return genre_region_age['genre_scores'] if genre_region_age else None
+
+    def _tracks(self):
+        # Chaque méthode lit le registre une seule fois : DF et index restent de la même version
+        # même si un rechargement a lieu pendant la requête
+        tracks_data = self.registry.get('tracks')
+        if tracks_data is None or tracks_data['df_tracks'].empty:
+            return None
+        return tracks_data
 
     def get_artists_genre_by_region(self, region=None):
-        return get_popular_genres_by_region(self.df_genre_region_age, region, True)
+        return get_popular_genres_by_region(self._genre_scores(), region, True)
 
     def get_artists_genre_by_region_and_age(self, region=None, age=None):
-        return get_popular_genres_by_region_and_age(self.df_genre_region_age, region, age, True)
-    
-    def get_tracks_from_genre_and_region(self, region=None, genre=None):
-        
-        tracks = self.df_tracks.copy()
+        return get_popular_genres_by_region_and_age(self._genre_scores(), region, age, True)
 
-        results = []
+    def get_artists_genre_map(self):
+        return get_popular_genres_map(self._genre_scores(), True)
+    
+    def _select_tracks(self, track_index, region=None, genre=None):
+        """Positions des pistes correspondant au genre et à la région (None = tout le catalogue)."""
 
-        if tracks is None or tracks.empty:
-            return {"error": "Données des chansons non chargées"}
+        row_ids = None
 
         if genre:
-            contains_genre = lambda x: genre in x if isinstance(x, list) else genre in str(x)
-            # Vérifie que le genre est présent dans au moins une ligne
-            if not tracks['all_genres'].apply(contains_genre).any():
-                return {"error": "Ce genre n'est pas présent dans les données des chansons"}
-
-            # Filtrer les lignes où le genre est présent dans all_genres
-            tracks = tracks[tracks['all_genres'].apply(contains_genre)]
-        
-        # on filtre par region dans les chansons restants 
+            # Genre d'une piste : correspondance exacte ; sinon nom du tenseur ('Rap', 'House') :
+            # toutes les pistes des genres correspondants ('Rap/Hip Hop', 'Rap français', ...)
+            if genre in track_index['genres']:
+                row_ids = track_index['genres'][genre]
+            else:
+                group = genre_group(genre, track_index['genre_groups'])
+                # Vérifie que le genre est présent dans au moins une chanson
+                if group is None:
+                    return None, {"error": "Ce genre n'est pas présent dans les données des chansons"}
+                row_ids = track_index['genre_groups'][group]
+
+        # on filtre par region dans les chansons restants
         if region:
-            contains_region = lambda x: region in x if isinstance(x, list) else region in str(x)
-            # Vérifie que la région est présente dans au moins une ligne
-            if not tracks['regions_recommandees'].apply(contains_region).any():
-                return {"error": "Aucune chanson disponible pour cette région"}
-            
-            # Filtrer les lignes où la région est présente dans regions_recommandees
-            tracks = tracks[tracks['regions_recommandees'].apply(contains_region)]
-
-        result_data = {
-            'tracks' : []
-        }
+            region_ids = track_index['regions'].get(region, np.empty(0, dtype=np.int64))
+            # Intersection des deux listes triées de positions
+            row_ids = region_ids if row_ids is None else np.intersect1d(row_ids, region_ids, assume_unique=True)
+
+            # Vérifie que la région est présente dans au moins une chanson restante
+            if len(row_ids) == 0:
+                return None, {"error": "Aucune chanson disponible pour cette région"}
+
+        return row_ids, None
 
-        # On transforme la duration de secondes à minutes
-        tracks['duration'] = tracks['duration'].apply(lambda x: f"{int(x // 60)}:{int(x % 60):02d}")
-        # On utilise que les colonnes pertinantes pour l'affichage (titre, artist, longeur)
-        tracks_columns = [col for col in tracks.columns if col in ['title', 'artist_name', 'duration']]
+    def get_tracks_from_genre_and_region(self, region=None, genre=None, order_by=None, fields=None, limit=None, cursor=None):
 
-        # On transforme le DF en liste de dictionnaires
-        for idx, row in tracks.iterrows():
-            track_data = {col: row[col] for col in tracks_columns}
-            result_data['tracks'].append(track_data)
+        results = []
+
+        tracks_data = self._tracks()
+        if tracks_data is None:
+            return {"error": "Données des chansons non chargées"}
+
+        row_ids, error = self._select_tracks(tracks_data['track_index'], region, genre)
+        if error:
+            return error
+
+        df_tracks = tracks_data['df_tracks']
+        ordered_ids = order_tracks(tracks_data['track_orders'], row_ids, order_by, len(df_tracks))
+
+        # Sans limit ni cursor : toutes les pistes, comme avant
+        if limit is None and cursor is None:
+            result_data = {
+                'tracks' : format_tracks(df_tracks, ordered_ids, fields=fields)
+            }
+        else:
+            after = None
+            if cursor:
+                decoded = decode_tracks_cursor(cursor)
+                if decoded is None or decoded[0] != order_by or not 0 <= decoded[1] < len(df_tracks):
+                    return {"error": "Curseur invalide pour ce tri"}
+                after = decoded[1]
+
+            # Sans filtre, la page est lue dans l'ordre précalculé sans parcourir la sélection
+            page_ids, last_row = page_tracks(
+                tracks_data['track_orders'], None if row_ids is None else ordered_ids, len(df_tracks),
+                order_by, after, limit or DEFAULT_TRACKS_PAGE_SIZE,
+            )
+
+            # Une page est toujours un objet, avec le curseur de la page suivante
+            return {
+                'tracks': format_tracks(df_tracks, page_ids, fields=fields),
+                'count': len(df_tracks) if ordered_ids is None else len(ordered_ids),
+                'next_cursor': encode_tracks_cursor(order_by, last_row) if last_row is not None else None,
+            }
 
         # On ajoute le résultat à la liste des résultats
         results.append(result_data)
 
         if region and genre:
             return results[0] if results else {"error": f"Aucune donnée pour la région: {region} et le genre: {genre}"}
-        
+
         return results
 
+    def stream_tracks_from_genre_and_region(self, region=None, genre=None, output='json', order_by=None, fields=None):
+
+        tracks_data = self._tracks()
+        if tracks_data is None:
+            return {"error": "Données des chansons non chargées"}
+
+        row_ids, error = self._select_tracks(tracks_data['track_index'], region, genre)
+        if error:
+            return error
+
+        df_tracks = tracks_data['df_tracks']
+        ordered_ids = order_tracks(tracks_data['track_orders'], row_ids, order_by, len(df_tracks))
+
+        # Le générateur garde la version des données lue ici, même si un rechargement a lieu pendant l'envoi
+        return stream_tracks(df_tracks, ordered_ids, output, fields=fields)
+
+    def get_similar_tracks(self, rank, region=None, genre=None, k=DEFAULT_SIMILAR_TRACKS):
+
+        tracks_data = self._tracks()
+        if tracks_data is None:
+            return {"error": "Données des chansons non chargées"}
+
+        df_tracks = tracks_data['df_tracks']
+        row = find_track_by_rank(df_tracks, tracks_data['track_orders'], rank)
+        if row is None:
+            return {"error": f"Aucune chanson de rang {rank}"}
+
+        # Filtre optionnel par genre / région avant le calcul des similarités
+        candidate_ids, error = self._select_tracks(tracks_data['track_index'], region, genre)
+        if error:
+            return error
+
+        row_ids, similarity = similar_tracks(tracks_data['feature_index'], row, candidate_ids, k)
+
+        tracks = format_tracks(df_tracks, row_ids, fields=['rank'] + TRACK_DISPLAY_COLUMNS)
+        for track, score in zip(tracks, similarity):
+            track['similarity'] = round(float(score), 4)
+
+        return {
+            'track': format_tracks(df_tracks, [row], fields=['rank'] + TRACK_DISPLAY_COLUMNS)[0],
+            'tracks': tracks,
+        }
+
     def get_metrics_by_genre(self, genre=None):
         
-        if self.df_tracks is None or self.df_tracks.empty:
+        tracks_data = self._tracks()
+        if tracks_data is None:
             return {"error": "Données des chansons non chargées"}
-        
-        tracks = self.df_tracks.copy()
 
-        # Liste des métriques à analyser
-        metrics = ['bpm', 'gain', 'duration_minutes', 'danceability', 
-                   'energy', 'acousticness', 'instrumentalness', 'valence']
-        
-        # On s'assure d'avoir les colonnes dans le DF
-        valid_metrics = [metric for metric in metrics if metric in tracks.columns]
+        # Agrégats précalculés au chargement (voir build_metric_aggregates)
+        genre_aggregates = tracks_data['metric_aggregates']['genres']
 
-        if not valid_metrics:
+        if not genre_aggregates['metrics']:
             return {"error": "Aucune métrique valide à analyser"}
         
-        return calculate_genre_metrics(tracks, genre, valid_metrics)
+        return calculate_genre_metrics(genre_aggregates, genre, tracks_data['metric_aggregates']['genre_groups'])
         
     def get_metrics_by_region(self, region=None):
 
-        if self.df_tracks is None or self.df_tracks.empty:
+        tracks_data = self._tracks()
+        if tracks_data is None:
             return {"error": "Données des chansons non chargées"}
-        
-        tracks = self.df_tracks.copy()
 
-        # Liste des métriques à analyser
-        metrics = ['bpm', 'gain', 'duration_minutes', 'danceability', 
-                   'energy', 'acousticness', 'instrumentalness', 'valence']
-        
-        # On s'assure d'avoir les colonnes dans le DF
-        valid_metrics = [metric for metric in metrics if metric in tracks.columns]
+        # Agrégats précalculés au chargement (voir build_metric_aggregates)
+        region_aggregates = tracks_data['metric_aggregates']['regions']
 
-        if not valid_metrics:
+        if not region_aggregates['metrics']:
             return {"error": "Aucune métrique valide à analyser"}
         
-        return calculate_region_metrics(tracks, region, valid_metrics)
\ No newline at end of file
+        return calculate_region_metrics(region_aggregates, region)
+
+    def append_tracks(self, tracks):
+
+        if not tracks or not isinstance(tracks, list):
+            return {"error": "Aucune piste à ajouter"}
+
+        # Les pistes sont ajoutées en fin de CSV : les autres workers les intègrent au prochain passage du watcher
+        try:
+            appended = write_tracks_batch(pd.DataFrame(tracks))
+        except ValueError as e:
+            return {"error": str(e)}
+
+        # Mise à jour incrémentale des index et agrégats de ce processus (rechargement complet si elle échoue)
+        self.registry.refresh()
+
+        return {"appended": appended, "version": self.registry.version()}
@@ -1,11 +1,46 @@
-from ..Utils import load_data_listeners, get_popular_genres_by_region, get_popular_genres_by_region_and_age
+from ..Utils import get_popular_genres_by_region, get_popular_genres_by_region_and_age, get_popular_genres_map, build_genre_links, recommend_tracks, DEFAULT_RECOMMENDATIONS
+from .DatasetRegistry import dataset_registry
 
 class MusicServiceListeners:
-    def __init__(self):
-        self.df_genre_region_age, self.data_loaded = load_data_listeners()
+    def __init__(self, registry=dataset_registry):
+        self.registry = registry
+        self._genre_links_cache = None
+        # Chargement au démarrage (les données sont partagées via le registre)
+        self.registry.get('genre_region_age')
+
+    @property
+    def data_loaded(self):
+        return self.registry.get('genre_region_age') is not None
+
+    def _tracks(self):
+        tracks_data = self.registry.get('tracks')
+        return tracks_data if tracks_data and len(tracks_data['df_tracks']) else None
+
+    def _genre_links(self, tracks_data, genre_region_age):
+        # Correspondance genres des pistes / genres du tenseur, recalculée seulement quand une des versions change
+        key = (tracks_data['version'], genre_region_age['version'])
+        cached = self._genre_links_cache
+        if cached is None or cached[0] != key:
+            cached = (key, build_genre_links(tracks_data['track_lists']['genres']['categories'], genre_region_age['genre_scores']['genres']))
+            self._genre_links_cache = cached
+        return cached[1]
+
+    def _genre_scores(self):
+        genre_region_age = self.registry.get('genre_region_age')
+        return genre_region_age['genre_scores'] if genre_region_age else None
 
     def get_listeners_genre_by_region(self, region=None):
-        return get_popular_genres_by_region(self.df_genre_region_age, region)
+        return get_popular_genres_by_region(self._genre_scores(), region)
     
     def get_listeners_genre_by_region_and_age(self, region=None, age=None):
-        return get_popular_genres_by_region_and_age(self.df_genre_region_age, region, age)
\ No newline at end of file
+        return get_popular_genres_by_region_and_age(self._genre_scores(), region, age)
+
+    def get_listeners_genre_map(self):
+        return get_popular_genres_map(self._genre_scores())
+
+    def get_recommended_tracks(self, region=None, age_group=None, favorite_genres=(), k=DEFAULT_RECOMMENDATIONS):
+        tracks_data, genre_region_age = self._tracks(), self.registry.get('genre_region_age')
+        if tracks_data is None or genre_region_age is None:
+            return {"error": "Données non chargées."}
+        genre_links = self._genre_links(tracks_data, genre_region_age)
+        return recommend_tracks(tracks_data, genre_region_age['genre_scores'], genre_links, region, age_group, favorite_genres, k)
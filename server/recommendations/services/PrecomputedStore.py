@@ -0,0 +1,109 @@
+import gzip
+import json
+import os
+import threading
+from django.conf import settings
+from rest_framework.utils.encoders import JSONEncoder
+from ..Snapshot import MANIFEST_NAME, write_manifest_directory
+from .DatasetRegistry import dataset_registry
+from .ResponseCache import MISSING, ResponseCache
+
+def endpoint_file_name(endpoint):
+    # 'artists/metrics-genre' -> 'artists__metrics-genre.json.gz'
+    return f"{endpoint.replace('/', '__')}.json.gz"
+
+def write_precomputed_store(directory, version, results):
+    """Écrit les réponses précalculées ({endpoint: {paramètres normalisés: réponse}}) puis les met en place d'un coup."""
+    def write_endpoints(tmp_dir):
+        manifest = {'version': version, 'endpoints': {}}
+        for endpoint, entries in results.items():
+            file_name = endpoint_file_name(endpoint)
+            with gzip.open(os.path.join(tmp_dir, file_name), 'wt', encoding='utf-8') as store_file:
+                json.dump(entries, store_file, cls=JSONEncoder, ensure_ascii=False, separators=(',', ':'))
+            manifest['endpoints'][endpoint] = {'file': file_name, 'entries': len(entries)}
+        return manifest
+
+    return write_manifest_directory(directory, write_endpoints)
+
+
+class PrecomputedStore:
+    """Réponses calculées hors ligne par la commande precompute_recommendations.
+
+    Le store n'est utilisé que s'il a été construit pour la version des données actuellement
+    chargée ; sinon (ou si la combinaison n'a pas été précalculée) on calcule en direct.
+    """
+
+    def __init__(self, directory, registry=dataset_registry):
+        self.directory = directory
+        self.registry = registry
+        self._state = None
+        self._manifest = None
+        self._entries = {}
+        self._hits = 0
+        self._misses = 0
+        self._lock = threading.Lock()
+
+    def _manifest_state(self):
+        manifest_path = os.path.join(self.directory, MANIFEST_NAME)
+        mtime = os.stat(manifest_path).st_mtime_ns if os.path.exists(manifest_path) else None
+        return self.registry.version(), mtime
+
+    def _refresh(self):
+        # Nouvelle version des données ou store réécrit : on relit le manifeste, les fichiers à la demande
+        state = self._manifest_state()
+        if state == self._state:
+            return
+        with self._lock:
+            if state == self._state:
+                return
+            manifest = None
+            if state[1] is not None:
+                with open(os.path.join(self.directory, MANIFEST_NAME), encoding='utf-8') as manifest_file:
+                    manifest = json.load(manifest_file)
+                if manifest['version'] != state[0]:
+                    print(f"Réponses précalculées périmées (version {manifest['version']}, données {state[0]}), calcul en direct.")
+                    manifest = None
+            self._manifest, self._entries, self._state = manifest, {}, state
+
+    def _endpoint_entries(self, endpoint):
+        manifest = self._manifest
+        if manifest is None or endpoint not in manifest['endpoints']:
+            return None
+        entries = self._entries.get(endpoint)
+        if entries is None:
+            with self._lock:
+                entries = self._entries.get(endpoint)
+                if entries is None:
+                    with gzip.open(os.path.join(self.directory, manifest['endpoints'][endpoint]['file']), 'rt', encoding='utf-8') as store_file:
+                        entries = json.load(store_file)
+                    self._entries[endpoint] = entries
+        return entries
+
+    def get(self, endpoint, params):
+        self._refresh()
+        entries = self._endpoint_entries(endpoint)
+        if entries is None:
+            return MISSING
+        return entries.get(ResponseCache.normalize(params), MISSING)
+
+    def get_or_compute(self, endpoint, params, compute):
+        result = self.get(endpoint, params)
+        with self._lock:
+            if result is MISSING:
+                self._misses += 1
+            else:
+                self._hits += 1
+        return compute() if result is MISSING else result
+
+    def stats(self):
+        total = self._hits + self._misses
+        return {
+            'version': self._manifest['version'] if self._manifest else None,
+            'endpoints': {endpoint: info['entries'] for endpoint, info in self._manifest['endpoints'].items()} if self._manifest else {},
+            'hits': self._hits,
+            'misses': self._misses,
+            'hit_rate': round(self._hits / total, 4) if total else 0,
+        }
+
+
+precomputed_store = PrecomputedStore(settings.PRECOMPUTED_DIR)
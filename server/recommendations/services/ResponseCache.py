@@ -0,0 +1,140 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from django.conf import settings
+from django.core.cache import caches
+from .DatasetRegistry import dataset_registry
+
+# Valeur absente du cache (None peut être une réponse valide)
+MISSING = object()
+
+
+class LRUBackend:
+    """Cache en mémoire du processus, borné en nombre d'entrées (éviction LRU)."""
+
+    # Lecture sans I/O : peut être faite directement depuis la boucle d'événements (vues async)
+    local = True
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._entries:
+                return MISSING
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class DjangoCacheBackend:
+    """Cache du framework Django (CACHES) : LocMemCache, RedisCache, ... La taille est bornée par sa config."""
+
+    local = False
+
+    def __init__(self, alias='default', timeout=None):
+        self.cache = caches[alias]
+        self.timeout = timeout
+
+    def get(self, key):
+        return self.cache.get(key, MISSING)
+
+    def set(self, key, value):
+        self.cache.set(key, value, self.timeout)
+
+    def clear(self):
+        # Les clés contiennent la version des données : les anciennes expirent d'elles-mêmes
+        pass
+
+    def __len__(self):
+        return 0
+
+
+class ResponseCache:
+    """Cache des réponses des endpoints de recommandation, indexé par (endpoint, paramètres, version des données)."""
+
+    def __init__(self, backend, registry=dataset_registry):
+        self.backend = backend
+        self.registry = registry
+        self._version = None
+        self._hits = 0
+        self._misses = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def normalize(params):
+        # Paramètres vides ignorés et ordre fixe : ?age=Jeune&region=Corse == ?region=Corse&age=Jeune
+        return '&'.join(f"{key}={str(value).strip()}" for key, value in sorted(params.items()) if value not in (None, ''))
+
+    def key(self, endpoint, params, version):
+        # Paramètres hachés : clé courte et sans espace ni caractère de contrôle, valide pour tous les backends (memcached)
+        params_hash = hashlib.sha1(self.normalize(params).encode()).hexdigest()
+        return f"reco:{version}:{endpoint}:{params_hash}"
+
+    def _current_key(self, endpoint, params):
+        version = self.registry.version()
+        if version != self._version:
+            # Données rechargées : on vide le cache local
+            self._version = version
+            self.backend.clear()
+        return self.key(endpoint, params, version)
+
+    def get(self, endpoint, params):
+        """Réponse en cache ou MISSING, sans calcul."""
+        result = self.backend.get(self._current_key(endpoint, params))
+        if result is not MISSING:
+            with self._lock:
+                self._hits += 1
+        return result
+
+    def get_or_compute(self, endpoint, params, compute):
+        result = self.get(endpoint, params)
+        if result is not MISSING:
+            return result
+
+        with self._lock:
+            self._misses += 1
+        key = self._current_key(endpoint, params)
+        result = compute()
+        # Les erreurs (paramètre inconnu, données non chargées) ne sont pas gardées : elles peuvent
+        # être transitoires, et n'importe quelle valeur de paramètre créerait une entrée
+        if not (isinstance(result, dict) and "error" in result):
+            self.backend.set(key, result)
+        return result
+
+    def stats(self):
+        total = self._hits + self._misses
+        return {
+            'backend': type(self.backend).__name__,
+            'version': self._version,
+            'entries': len(self.backend),
+            'hits': self._hits,
+            'misses': self._misses,
+            'hit_rate': round(self._hits / total, 4) if total else 0,
+        }
+
+
+def build_response_cache(config):
+    if config.get('BACKEND', 'lru') == 'django':
+        backend = DjangoCacheBackend(config.get('ALIAS', 'default'), config.get('TIMEOUT'))
+    else:
+        backend = LRUBackend(config.get('MAX_ENTRIES', 1024))
+    return ResponseCache(backend)
+
+
+response_cache = build_response_cache(settings.RECOMMENDATIONS_CACHE)
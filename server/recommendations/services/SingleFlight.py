@@ -0,0 +1,100 @@
+import functools
+import json
+import threading
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Fusion des calculs concurrents : les appels avec la même clé attendent le calcul déjà en cours.
+
+    Juste après un démarrage ou un rechargement, les dizaines de requêtes identiques
+    arrivant en même temps sur chaque thread ne font qu'un seul calcul.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        # label -> [appels, calculs effectués, appels fusionnés]
+        self._counters = {}
+
+    def do(self, key, func, label='default'):
+        with self._lock:
+            counters = self._counters.setdefault(label, [0, 0, 0])
+            counters[0] += 1
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                counters[1] += 1
+            else:
+                counters[2] += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = func()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            # Retiré avant de réveiller les autres : un appel arrivant après relance un calcul
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def stats(self):
+        with self._lock:
+            counters = {label: list(values) for label, values in self._counters.items()}
+            in_flight = len(self._calls)
+        return {
+            'in_flight': in_flight,
+            'services': {
+                label: {
+                    'calls': calls,
+                    'executions': executions,
+                    'coalesced': coalesced,
+                    'coalescing_rate': round(coalesced / calls, 4) if calls else 0,
+                }
+                for label, (calls, executions, coalesced) in counters.items()
+            },
+        }
+
+
+class SingleFlightService:
+    """Enveloppe un service de recommandation : ses méthodes get_* passent par SingleFlight.
+
+    La clé contient le nom de la méthode, ses arguments et la version des données :
+    un calcul en cours sur l'ancienne version n'est jamais partagé après un rechargement.
+    Les autres attributs (data_loaded, registry, stream_*, append_*) sont ceux du service.
+    """
+
+    def __init__(self, service, group, label):
+        self._service = service
+        self._group = group
+        self._label = label
+
+    def __getattr__(self, attr):
+        value = getattr(self._service, attr)
+        if not attr.startswith('get_') or not callable(value):
+            return value
+
+        @functools.wraps(value)
+        def call(*args, **kwargs):
+            arguments = json.dumps([args, kwargs], sort_keys=True, default=str)
+            key = (self._label, attr, self._service.registry.version(), arguments)
+            return self._group.do(key, lambda: value(*args, **kwargs), self._label)
+        return call
+
+
+single_flight = SingleFlight()
@@ -1,3 +1,927 @@
-from django.test import TestCase
+import ast
+import asyncio
+import base64
+import contextlib
+import gzip
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import warnings
+from unittest import mock
+from datetime import date, timedelta
+import numpy as np
+import pandas as pd
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import CacheKeyWarning, caches
+from django.core.management import call_command
+from django.test import AsyncRequestFactory, SimpleTestCase, TestCase, override_settings
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+from .Snapshot import SNAPSHOT_SOURCES, write_data_snapshot
+from accounts.models import UserProfile
+from . import async_views
+from .views import accepts_gzip
+from .services.AsyncExecutor import async_executor
+from .services.DatasetRegistry import DatasetRegistry, dataset_registry
+from .services.ResponseCache import MISSING, LRUBackend, ResponseCache, response_cache
+from .services.SingleFlight import SingleFlight, SingleFlightService
+from .services import ComputeBackend
+from .services.ComputeBackend import ComputeOverloaded, ComputeTimeout, ComputeUnavailable, ProcessPoolBackend
+from .services.MusicServiceArtist import MusicServiceArtist
+from .services.PrecomputedStore import PrecomputedStore, write_precomputed_store
+from . import views
+from .Utils import (
+    DEFAULT_RECOMMENDATIONS, MAX_RECOMMENDATIONS, RECOMMENDATION_WEIGHTS, MAX_SIMILAR_TRACKS, SIMILARITY_EXACT_MAX_ROWS,
+    SIMILARITY_FEATURES, build_feature_index, similar_tracks,
+    append_tracks_from_csv, build_genre_scores, calculate_genre_metrics, get_popular_genres_by_region,
+    get_popular_genres_by_region_and_age, load_data_tracks, TABLE_GENRE_TRACK_GENRES, normalize_features, read_csv_datasets, write_tracks_batch,
+)
 
-# Create your tests here.
+def read_genre_region_age():
+    return pd.read_csv(os.path.join(settings.DATA_DIR, SNAPSHOT_SOURCES['genre_region_age']))
+
+def encode_cursor(value):
+    return base64.urlsafe_b64encode(json.dumps(value).encode()).decode().rstrip('=')
+
+def quiet(function, *args, **kwargs):
+    """Appelle function sans les messages de chargement."""
+    with contextlib.redirect_stdout(io.StringIO()):
+        return function(*args, **kwargs)
+
+def assertTracksDataEqual(test, actual, expected):
+    """Compare deux jeux de pistes chargés : DataFrame, colonnes de listes, index et agrégats."""
+    test.assertEqual(list(actual['df_tracks'].columns), list(expected['df_tracks'].columns))
+    for col in expected['df_tracks'].columns:
+        test.assertEqual(
+            actual['df_tracks'][col].astype(object).fillna('NA').tolist(),
+            expected['df_tracks'][col].astype(object).fillna('NA').tolist(), col,
+        )
+    for key, expected_index in expected['track_index'].items():
+        actual_index = actual['track_index'][key]
+        test.assertEqual(set(actual_index), set(expected_index), key)
+        for name, rows in expected_index.items():
+            np.testing.assert_array_equal(actual_index[name], rows, err_msg=f"{key} {name}")
+    for key, expected_aggregates in expected['metric_aggregates'].items():
+        actual_aggregates = actual['metric_aggregates'][key]
+        # Les codes peuvent différer (ordre d'apparition) : comparaison par nom
+        for name, expected_code in expected_aggregates['category_index'].items():
+            code = actual_aggregates['category_index'][name]
+            np.testing.assert_array_equal(actual_aggregates['count'][code], expected_aggregates['count'][expected_code])
+            np.testing.assert_allclose(actual_aggregates['sum'][code], expected_aggregates['sum'][expected_code])
+            np.testing.assert_allclose(actual_aggregates['sumsq'][code], expected_aggregates['sumsq'][expected_code])
+    for order_by, expected_order in expected['track_orders'].items():
+        np.testing.assert_array_equal(actual['track_orders'][order_by]['position'], expected_order['position'], err_msg=order_by)
+
+def reference_genres(row, age_group=None, artist=False):
+    """Classement calculé comme la version d'origine : cumul colonne par colonne puis sorted() stable."""
+    genres_scores = {}
+    for col in row.index:
+        genre_part = col.split('_')
+        if col == 'Nom_region' or len(genre_part) < 2 or (age_group is not None and genre_part[1] != age_group):
+            continue
+        genres_scores[genre_part[0]] = genres_scores.get(genre_part[0], 0) + row[col]
+
+    sorted_genres = sorted(genres_scores.items(), key=lambda x: x[1], reverse=True)
+    max_score = sorted_genres[0][1] if sorted_genres else 1
+    return [
+        {'genre': genre, 'score': f"{min(10, round((score / max_score) * 10, 1))}/10", 'raw_score': score}
+        for genre, score in (sorted_genres if artist else sorted_genres[:10])
+    ]
+
+
+class GenreScoresTests(SimpleTestCase):
+    """Classements du tenseur région × genre × âge identiques à ceux de la version d'origine."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.df = read_genre_region_age()
+        cls.genre_scores = build_genre_scores(cls.df)
+
+    def test_genres_by_region(self):
+        for _, row in self.df.iterrows():
+            for artist in (False, True):
+                result = get_popular_genres_by_region(self.genre_scores, row['Nom_region'], artist)
+                self.assertEqual(result['genres'], reference_genres(row, artist=artist), row['Nom_region'])
+
+    def test_genres_by_region_and_age(self):
+        for _, row in self.df.iterrows():
+            for age in self.genre_scores['ages']:
+                for artist in (False, True):
+                    result = get_popular_genres_by_region_and_age(self.genre_scores, row['Nom_region'], age, artist)
+                    self.assertEqual(result['genres'], reference_genres(row, age, artist), (row['Nom_region'], age))
+
+    def test_ties_keep_column_order(self):
+        # 12 genres à égalité : le top 10 garde les 10 premiers dans l'ordre des colonnes
+        columns = {f"G{i:02d}_Jeune": [1.0] for i in range(12)}
+        genre_scores = build_genre_scores(pd.DataFrame({'Nom_region': ['R'], **columns}))
+        genres = [genre['genre'] for genre in get_popular_genres_by_region(genre_scores, 'R')['genres']]
+        self.assertEqual(genres, [f"G{i:02d}" for i in range(10)])
+
+    def test_unknown_region(self):
+        self.assertIn('error', get_popular_genres_by_region(self.genre_scores, 'Atlantide'))
+        self.assertIn('error', get_popular_genres_by_region_and_age(self.genre_scores, 'Atlantide', 'Jeune'))
+
+    def test_all_regions(self):
+        regions = self.df['Nom_region'].tolist()
+        for artist in (False, True):
+            results = get_popular_genres_by_region(self.genre_scores, None, artist)
+            self.assertEqual([result['region'] for result in results], regions)
+            for result, (_, row) in zip(results, self.df.iterrows()):
+                self.assertEqual(result['genres'], reference_genres(row, artist=artist))
+
+    def test_unknown_age_group(self):
+        result = get_popular_genres_by_region_and_age(self.genre_scores, 'Corse', 'Enfant')
+        self.assertEqual(result, {'region': 'Corse', 'genres': [], 'age_group': 'Enfant'})
+        results = get_popular_genres_by_region_and_age(self.genre_scores, 'Corse', ['Jeune', 'Enfant'])
+        self.assertEqual([result['age_group'] for result in results], ['Jeune', 'Enfant'])
+        self.assertTrue(results[0]['genres'])
+        self.assertEqual(results[1]['genres'], [])
+
+
+class GenreRegionViewsTests(SimpleTestCase):
+    """popular-genres-region(-age) : plusieurs régions et tranches d'âge en un appel, toutes les régions par défaut."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.rows = {row['Nom_region']: row for _, row in read_genre_region_age().iterrows()}
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User(username='listener'))
+
+    def test_all_regions(self):
+        for variant, artist in (('listeners', False), ('artists', True)):
+            response = self.client.get(f'/api/music/{variant}/popular-genres-region/')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual([result['region'] for result in response.data], list(self.rows))
+            for result in response.data:
+                self.assertEqual(result['genres'], reference_genres(self.rows[result['region']], artist=artist))
+
+    def test_region_and_age_lists(self):
+        for variant, artist in (('listeners', False), ('artists', True)):
+            response = self.client.get(f'/api/music/{variant}/popular-genres-region-age/', {'region': 'Corse,Bretagne', 'age': 'Jeune,Senior'})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(
+                [(result['region'], result['age_group']) for result in response.data],
+                [('Corse', 'Jeune'), ('Corse', 'Senior'), ('Bretagne', 'Jeune'), ('Bretagne', 'Senior')],
+            )
+            for result in response.data:
+                self.assertEqual(result['genres'], reference_genres(self.rows[result['region']], result['age_group'], artist))
+
+    def test_unknown_age_group(self):
+        response = self.client.get('/api/music/listeners/popular-genres-region-age/', {'region': 'Corse', 'age': 'Enfant'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['genres'], [])
+        response = self.client.get('/api/music/listeners/popular-genres-region-age/', {'region': 'Corse,Atlantide', 'age': 'Jeune'})
+        self.assertEqual(response.status_code, 400)
+
+
+class SnapshotTests(SimpleTestCase):
+    """Le snapshot binaire donne les mêmes données que la lecture des CSV."""
+
+    def test_snapshot_equals_csv(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            snapshot_dir = os.path.join(tmp_dir, 'snapshot')
+            with override_settings(DATA_SNAPSHOT_DIR=snapshot_dir):
+                from_csv = quiet(load_data_tracks)
+                write_data_snapshot(snapshot_dir, settings.DATA_DIR, quiet(read_csv_datasets, ('genre_region_age', 'tracks')))
+                from_snapshot = quiet(load_data_tracks)
+
+        self.assertIsNotNone(from_snapshot)
+        assertTracksDataEqual(self, from_snapshot, from_csv)
+        # Les colonnes de listes ne restent qu'encodées
+        self.assertNotIn('all_genres', from_snapshot['df_tracks'].columns)
+        for key, lists in from_csv['track_lists'].items():
+            self.assertEqual(from_snapshot['track_lists'][key]['categories'], lists['categories'], key)
+            np.testing.assert_array_equal(from_snapshot['track_lists'][key]['codes'], lists['codes'])
+            np.testing.assert_array_equal(from_snapshot['track_lists'][key]['offsets'], lists['offsets'])
+
+
+class TracksPaginationTests(SimpleTestCase):
+    """artists/tracks-genre-region : pages par curseur et erreurs de curseur."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User(username='artist'))
+
+    def get(self, **params):
+        return self.client.get('/api/music/artists/tracks-genre-region/', params)
+
+    def all_pages(self, **params):
+        tracks, cursor = [], None
+        while True:
+            response = self.get(limit=7, **params, **({'cursor': cursor} if cursor else {}))
+            self.assertEqual(response.status_code, 200)
+            tracks += response.data['tracks']
+            cursor = response.data['next_cursor']
+            if cursor is None:
+                return tracks, response.data['count']
+
+    def test_pages_equal_full_listing(self):
+        for params in ({}, {'order_by': 'bpm'}, {'order_by': '-popularity'}, {'genre': 'Pop'}, {'genre': 'Pop', 'order_by': '-bpm'}):
+            full = self.get(fields='rank,title,bpm', **params).data
+            if isinstance(full, list):
+                full = full[0]
+            tracks, count = self.all_pages(fields='rank,title,bpm', **params)
+            self.assertEqual(tracks, full['tracks'], params)
+            self.assertEqual(count, len(full['tracks']), params)
+
+    def test_invalid_cursors(self):
+        for cursor in (
+            'pas-un-curseur',
+            encode_cursor(['bpm', True]),
+            encode_cursor(['bpm', 1.5]),
+            encode_cursor(['bpm', -1]),
+            encode_cursor(['bpm', 10 ** 9]),
+            encode_cursor({'bpm': 1}),
+            encode_cursor(['bpm', 1, 2]),
+        ):
+            response = self.get(order_by='bpm', limit=5, cursor=cursor)
+            self.assertEqual(response.status_code, 400, cursor)
+            self.assertIn('error', response.data)
+
+    def test_invalid_limits(self):
+        for limit in ('0', '-1', '³', '²', 'abc', '1.5', str(10 ** 6)):
+            response = self.get(limit=limit)
+            self.assertEqual(response.status_code, 400, limit)
+            self.assertIn('error', response.data)
+
+    def test_cursor_from_other_order(self):
+        cursor = self.get(order_by='bpm', limit=5).data['next_cursor']
+        self.assertEqual(self.get(order_by='-bpm', limit=5, cursor=cursor).status_code, 400)
+        self.assertEqual(self.get(order_by='bpm', limit=5, cursor=cursor).status_code, 200)
+
+    def test_stream_rejects_pagination(self):
+        for params in ({'limit': 5}, {'cursor': self.get(limit=5).data['next_cursor']}):
+            response = self.get(stream='ndjson', **params)
+            self.assertEqual(response.status_code, 400, params)
+            self.assertIn('error', response.data)
+
+    def test_stream_equals_full_listing(self):
+        response = self.get(stream='ndjson', genre='Pop', order_by='-bpm', fields='rank,title')
+        self.assertEqual(response.status_code, 200)
+        streamed = [json.loads(line) for line in b''.join(response.streaming_content).splitlines() if line]
+        self.assertEqual(streamed, self.get(genre='Pop', order_by='-bpm', fields='rank,title').data[0]['tracks'])
+
+
+class GenreMatchTests(SimpleTestCase):
+    """Genre demandé : genre de piste exact, genre du tenseur via TABLE_GENRE_TRACK_GENRES, sinon 400."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        df = pd.read_csv(os.path.join(settings.DATA_DIR, SNAPSHOT_SOURCES['tracks']))
+        cls.track_genres = [set(ast.literal_eval(genres)) for genres in df['all_genres']]
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User(username='artist'))
+
+    def count(self, genre):
+        tracks = self.client.get('/api/music/artists/tracks-genre-region/', {'genre': genre, 'fields': 'rank'})
+        metrics = self.client.get('/api/music/artists/metrics-genre/', {'genre': genre})
+        self.assertEqual(tracks.status_code, 200, genre)
+        self.assertEqual(metrics.status_code, 200, genre)
+        self.assertEqual(metrics.data['count'], len(tracks.data[0]['tracks']), genre)
+        return metrics.data['count']
+
+    def test_exact_track_genre(self):
+        for genre in ('Rock indé', 'Rap français', 'Techno/House', 'R&B'):
+            self.assertEqual(self.count(genre), sum(genre in genres for genres in self.track_genres), genre)
+
+    def test_table_genre(self):
+        for genre in ('Rap', 'Indie', 'House', 'RnB', 'Variete'):
+            expected = sum(bool(genres & set(TABLE_GENRE_TRACK_GENRES[genre])) for genres in self.track_genres)
+            self.assertGreater(expected, 0, genre)
+            self.assertEqual(self.count(genre), expected, genre)
+
+    def test_unknown_genre(self):
+        for genre in ('n', 'de', 'Hop', 'Internationale', 'Musique', 'Jazz'):
+            for url in ('/api/music/artists/tracks-genre-region/', '/api/music/artists/metrics-genre/'):
+                response = self.client.get(url, {'genre': genre})
+                self.assertEqual(response.status_code, 400, (url, genre))
+                self.assertIn('error', response.data)
+
+
+class RecommendedTracksTests(TestCase):
+    """listeners/recommended-tracks : tranche d'âge du profil, genres favoris et bornes de k."""
+
+    def recommend(self, birth_date=None, favorite_genres='', **params):
+        user = User.objects.create_user(f"listener{User.objects.count()}")
+        UserProfile.objects.create(user=user, role='listener', birth_date=birth_date, favorite_genres=favorite_genres)
+        client = APIClient()
+        client.force_authenticate(user)
+        return client.get('/api/music/listeners/recommended-tracks/', params)
+
+    def years_ago(self, years):
+        today = date.today()
+        # Un 29 février, la date d'il y a `years` ans est prise au 28 (année peut-être non bissextile)
+        return date(today.year - years, today.month, min(today.day, 28) if today.month == 2 else today.day)
+
+    def test_age_group_from_birth_date(self):
+        for birth_date, age_group in (
+            (self.years_ago(18), 'Jeune'),
+            (self.years_ago(30), 'Adulte'),
+            (self.years_ago(59), 'Adulte'),
+            (self.years_ago(60), 'Senior'),
+            (self.years_ago(30) + timedelta(days=1), 'Jeune'),
+            (None, None),
+        ):
+            response = self.recommend(birth_date)
+            self.assertEqual(response.status_code, 200, birth_date)
+            self.assertEqual(response.data['age_group'], age_group, birth_date)
+            self.assertEqual(len(response.data['tracks']), DEFAULT_RECOMMENDATIONS)
+
+    def test_favorite_genre_boost(self):
+        df = pd.read_csv(os.path.join(settings.DATA_DIR, SNAPSHOT_SOURCES['tracks']))
+        soul = {
+            (title, artist) for title, artist, genres in zip(df['title'], df['artist_name'], df['all_genres'])
+            if set(ast.literal_eval(genres)) & {'Soul', 'Soul & Funk'}
+        }
+        self.assertTrue(soul)
+
+        scores = {}
+        for favorite_genres in ('', 'Soul'):
+            tracks = self.recommend(self.years_ago(40), favorite_genres, k=MAX_RECOMMENDATIONS).data['tracks']
+            scores[favorite_genres] = {(track['title'], track['artist_name']): track['score'] for track in tracks}
+        self.assertEqual(scores[''].keys(), scores['Soul'].keys())
+        for track, score in scores[''].items():
+            boost = RECOMMENDATION_WEIGHTS['favorite'] if track in soul else 0
+            self.assertAlmostEqual(scores['Soul'][track] - score, boost, places=3, msg=track)
+
+    def test_k_bounds(self):
+        self.assertEqual(len(self.recommend(k=1).data['tracks']), 1)
+        self.assertEqual(len(self.recommend(k=MAX_RECOMMENDATIONS).data['tracks']), min(MAX_RECOMMENDATIONS, 100))
+        for k in ('0', '-1', str(MAX_RECOMMENDATIONS + 1), '²', 'abc'):
+            response = self.recommend(k=k)
+            self.assertEqual(response.status_code, 400, k)
+            self.assertIn('error', response.data)
+
+
+class SimilarTracksTests(SimpleTestCase):
+    """artists/similar-tracks : piste exclue de ses résultats, préfiltre, k, et index approché."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        df = pd.read_csv(os.path.join(settings.DATA_DIR, SNAPSHOT_SOURCES['tracks']))
+        cls.n_tracks = len(df)
+        cls.genres = {rank: set(ast.literal_eval(genres)) for rank, genres in zip(df['rank'], df['all_genres'])}
+        cls.regions = {rank: set(ast.literal_eval(regions)) for rank, regions in zip(df['rank'], df['regions_recommandees'])}
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User(username='artist'))
+
+    def get(self, **params):
+        return self.client.get('/api/music/artists/similar-tracks/', params)
+
+    def test_query_track_excluded(self):
+        for rank in (1, 50, 100):
+            response = self.get(rank=rank, k=MAX_SIMILAR_TRACKS)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.data['track']['rank'], rank)
+            ranks = [track['rank'] for track in response.data['tracks']]
+            self.assertNotIn(rank, ranks)
+            self.assertEqual(len(ranks), self.n_tracks - 1)
+            similarities = [track['similarity'] for track in response.data['tracks']]
+            self.assertEqual(similarities, sorted(similarities, reverse=True))
+
+    def test_prefilter(self):
+        tracks = self.get(rank=1, genre='Pop', k=MAX_SIMILAR_TRACKS).data['tracks']
+        self.assertEqual({track['rank'] for track in tracks}, {rank for rank, genres in self.genres.items() if 'Pop' in genres} - {1})
+        tracks = self.get(rank=1, region='Bretagne', k=MAX_SIMILAR_TRACKS).data['tracks']
+        self.assertEqual({track['rank'] for track in tracks}, {rank for rank, regions in self.regions.items() if 'Bretagne' in regions} - {1})
+        self.assertEqual(self.get(rank=1, genre='Musique').status_code, 400)
+
+    def test_k_and_rank_bounds(self):
+        self.assertEqual(len(self.get(rank=1, k=1).data['tracks']), 1)
+        self.assertEqual(len(self.get(rank=1).data['tracks']), 10)
+        for params in (
+            {'rank': 1, 'k': 0}, {'rank': 1, 'k': MAX_SIMILAR_TRACKS + 1}, {'rank': 1, 'k': '²'}, {'rank': 1, 'k': '--3'},
+            {}, {'rank': '--3'}, {'rank': '³'}, {'rank': '1.5'}, {'rank': 10 ** 30}, {'rank': 10 ** 6},
+        ):
+            response = self.get(**params)
+            self.assertEqual(response.status_code, 400, params)
+            self.assertIn('error', response.data)
+
+    def test_approximate_index(self):
+        # Catalogue synthétique au-delà de SIMILARITY_EXACT_MAX_ROWS : recherche par groupes
+        rng = np.random.default_rng(0)
+        df = pd.DataFrame(rng.standard_normal((SIMILARITY_EXACT_MAX_ROWS + 10000, len(SIMILARITY_FEATURES))), columns=SIMILARITY_FEATURES)
+        feature_index = build_feature_index(df)
+        self.assertIsNotNone(feature_index['clusters'])
+        exact_index = {**feature_index, 'clusters': None}
+        candidate_ids = np.sort(rng.choice(len(df), SIMILARITY_EXACT_MAX_ROWS + 1, replace=False))
+
+        recalls = []
+        for row in rng.choice(len(df), 20, replace=False):
+            for candidates in (None, candidate_ids):
+                ids, scores = similar_tracks(feature_index, row, candidates, 10)
+                exact_ids, _ = similar_tracks(exact_index, row, candidates, 10)
+                self.assertEqual(len(ids), 10)
+                self.assertNotIn(row, ids)
+                self.assertTrue(np.all(np.diff(scores) <= 0))
+                if candidates is not None:
+                    self.assertTrue(np.isin(ids, candidates).all())
+                recalls.append(len(set(ids) & set(exact_ids)) / 10)
+        self.assertGreater(np.mean(recalls), 0.95)
+
+
+class AppendTracksTests(SimpleTestCase):
+    """Ajout incrémental de pistes : même résultat qu'un rechargement complet du CSV complété."""
+
+    def test_append_equals_rebuild(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            data_dir = os.path.join(tmp_dir, 'csv')
+            shutil.copytree(settings.DATA_DIR, data_dir)
+            with override_settings(DATA_DIR=data_dir, DATA_SNAPSHOT_DIR=os.path.join(tmp_dir, 'snapshot')):
+                registry = DatasetRegistry({'tracks': load_data_tracks}, appenders={'tracks': append_tracks_from_csv})
+                before = quiet(registry.get, 'tracks')
+
+                # Nouveaux genre et région, valeur manquante, nouvelle catégorie de colonne texte
+                batch = pd.read_csv(os.path.join(data_dir, SNAPSHOT_SOURCES['tracks'])).head(7)
+                batch['title'] = batch['title'] + ' (remix)'
+                batch.loc[0, 'all_genres'] = "['Zouk', 'Pop']"
+                batch.loc[1, 'regions_recommandees'] = "['Atlantide']"
+                batch.loc[2, 'bpm'] = np.nan
+                batch.loc[3, 'main_genre'] = 'Nouveau'
+                write_tracks_batch(batch)
+
+                self.assertTrue(registry.appended('tracks'))
+                self.assertEqual(quiet(registry.refresh), ['tracks'])
+                self.assertEqual(registry.stale(), [])
+                appended = registry.get('tracks')
+                rebuilt = quiet(load_data_tracks)
+
+        self.assertEqual(len(appended['df_tracks']), len(before['df_tracks']) + 7)
+        assertTracksDataEqual(self, appended, rebuilt)
+        # Le lot est normalisé avec la moyenne et l'écart-type du chargement initial
+        np.testing.assert_array_equal(appended['feature_index']['matrix'][:len(before['df_tracks'])], before['feature_index']['matrix'])
+        np.testing.assert_allclose(
+            appended['feature_index']['matrix'][len(before['df_tracks']):],
+            normalize_features(rebuilt['df_tracks'].iloc[len(before['df_tracks']):], before['feature_index']['features'], before['feature_index']['mean'], before['feature_index']['scale']),
+        )
+        self.assertEqual(calculate_genre_metrics(appended['metric_aggregates']['genres'], 'Zouk'), calculate_genre_metrics(rebuilt['metric_aggregates']['genres'], 'Zouk'))
+
+
+class ReloadSignalTests(SimpleTestCase):
+    """Un rechargement demandé à un worker est appliqué par tous les workers."""
+
+    def test_reload_reaches_other_workers(self):
+        loads = []
+
+        def loader():
+            loads.append(1)
+            return {'loads': len(loads)}
+
+        with tempfile.TemporaryDirectory() as tmp_dir, override_settings(DATASET_RELOAD_SIGNAL=os.path.join(tmp_dir, 'reload_signal')):
+            # Deux registres du même processus jouent deux workers
+            workers = [DatasetRegistry({'tracks': loader}) for _ in range(2)]
+            for worker in workers:
+                worker.get('tracks')
+            self.assertEqual(workers[1].check_reload_signal(), None)
+
+            quiet(lambda: workers[0].request_reload().join())
+            self.assertEqual(workers[0].check_reload_signal(), None)
+            quiet(lambda: workers[1].check_reload_signal().join())
+            self.assertEqual(len(loads), 4)
+            self.assertEqual(workers[0].version(), workers[0].source_version())
+
+
+class ConditionalResponseTests(SimpleTestCase):
+    """ETag et 304 des endpoints de /api/music/, jamais partagés entre utilisateurs par défaut."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User(username='artist'))
+
+    def test_not_modified(self):
+        for url, params in (
+            ('/api/music/listeners/popular-genres-region/', {'region': 'Bretagne'}),
+            ('/api/music/artists/tracks-genre-region/', {'genre': 'Pop', 'limit': 5}),
+            ('/api/music/popular-genres-map/', {}),
+        ):
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, 200, url)
+            self.assertTrue(response['Cache-Control'].startswith('private'), url)
+            self.assertIn('Authorization', response['Vary'])
+
+            not_modified = self.client.get(url, params, HTTP_IF_NONE_MATCH=response['ETag'])
+            self.assertEqual(not_modified.status_code, 304, url)
+            self.assertEqual(not_modified['ETag'], response['ETag'])
+            self.assertEqual(self.client.get(url, params, HTTP_IF_NONE_MATCH='"autre"').status_code, 200, url)
+
+    def test_etag_depends_on_params(self):
+        url = '/api/music/listeners/popular-genres-region/'
+        etag = self.client.get(url, {'region': 'Bretagne'})['ETag']
+        self.assertEqual(self.client.get(url, {'region': 'Auvergne-Rhône-Alpes'}, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+class AcceptEncodingTests(SimpleTestCase):
+    """popular-genres-map n'est compressé que si le client accepte gzip."""
+
+    def test_accepts_gzip(self):
+        for header, expected in (
+            ('', False),
+            ('gzip', True),
+            ('gzip, deflate, br', True),
+            ('GZIP;q=0.5', True),
+            ('gzip;q=0', False),
+            ('gzip; q=0.0, deflate', False),
+            ('br, *;q=0.1', True),
+            ('*;q=0', False),
+            ('gzip;q=0, *', False),
+            ('x-gzip', True),
+            ('identity', False),
+            ('gzip;q=abc', False),
+        ):
+            self.assertEqual(accepts_gzip(header), expected, header)
+
+    def test_genre_map_encoding(self):
+        client = APIClient()
+        client.force_authenticate(User(username='listener'))
+        url = '/api/music/popular-genres-map/'
+
+        compressed = client.get(url, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(compressed['Content-Encoding'], 'gzip')
+        plain = client.get(url, HTTP_ACCEPT_ENCODING='gzip;q=0')
+        self.assertFalse(plain.has_header('Content-Encoding'))
+        self.assertEqual(gzip.decompress(compressed.content), plain.content)
+        self.assertNotEqual(compressed['ETag'], plain['ETag'])
+
+
+class ResponseCacheTests(SimpleTestCase):
+    """Clés valides pour tous les backends de cache, erreurs jamais mises en cache."""
+
+    def setUp(self):
+        self.cache = ResponseCache(LRUBackend())
+
+    def test_key_is_hashed(self):
+        key = self.cache.key('artists/metrics-genre', {'genre': 'Musique du monde\n' + 'x' * 300}, 'v1')
+        self.assertLessEqual(len(key), 250)
+        self.assertFalse(any(char.isspace() or ord(char) < 32 for char in key))
+        with warnings.catch_warnings():
+            warnings.simplefilter('error', CacheKeyWarning)
+            caches['default'].validate_key(key)
+        # Même clé quel que soit l'ordre des paramètres
+        self.assertEqual(self.cache.key('e', {'a': 1, 'b': 2}, 'v1'), self.cache.key('e', {'b': 2, 'a': 1}, 'v1'))
+        self.assertNotEqual(self.cache.key('e', {'a': 1}, 'v1'), self.cache.key('e', {'a': 2}, 'v1'))
+
+    def test_errors_not_cached(self):
+        calls = []
+
+        def compute(result):
+            calls.append(result)
+            return result
+
+        self.cache.get_or_compute('e', {'genre': 'Inconnu'}, lambda: compute({'error': 'Genre inconnu'}))
+        self.cache.get_or_compute('e', {'genre': 'Inconnu'}, lambda: compute({'error': 'Genre inconnu'}))
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(len(self.cache.backend), 0)
+
+        self.cache.get_or_compute('e', {'genre': 'Pop'}, lambda: compute({'genre': 'Pop'}))
+        self.assertEqual(self.cache.get_or_compute('e', {'genre': 'Pop'}, lambda: compute({'genre': 'Pop'})), {'genre': 'Pop'})
+        self.assertEqual(len(calls), 3)
+
+
+class SingleFlightTests(SimpleTestCase):
+    """SingleFlight : un seul calcul par clé pour des appels concurrents, clé liée à la version des données."""
+
+    N_CALLS = 8
+
+    def setUp(self):
+        self.group = SingleFlight()
+
+    def concurrent_calls(self, call):
+        """Lance N_CALLS appels dans des threads ; rend (résultats, exceptions) une fois tous terminés."""
+        results, errors = [], []
+
+        def run():
+            try:
+                results.append(call())
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=run) for _ in range(self.N_CALLS)]
+        for thread in threads:
+            thread.start()
+        return threads, results, errors
+
+    def wait_until(self, condition):
+        deadline = time.monotonic() + 5
+        while not condition():
+            self.assertLess(time.monotonic(), deadline)
+            time.sleep(0.001)
+
+    def wait_for_calls(self, label, calls):
+        self.wait_until(lambda: self.group.stats()['services'].get(label, {}).get('calls', 0) >= calls)
+
+    def run_concurrently(self, func, label):
+        release = threading.Event()
+
+        def blocked():
+            release.wait(5)
+            return func()
+
+        threads, results, errors = self.concurrent_calls(lambda: self.group.do('key', blocked, label))
+        # Tous les appels sont arrivés avant la fin du premier calcul
+        self.wait_for_calls(label, self.N_CALLS)
+        release.set()
+        for thread in threads:
+            thread.join()
+        return results, errors
+
+    def test_one_execution_per_key(self):
+        executions = []
+        results, errors = self.run_concurrently(lambda: executions.append(1) or {'value': 42}, 'ok')
+        self.assertEqual(len(executions), 1)
+        self.assertEqual(errors, [])
+        self.assertEqual(results, [{'value': 42}] * self.N_CALLS)
+        self.assertEqual(self.group.stats()['in_flight'], 0)
+
+    def test_error_shared(self):
+        executions = []
+
+        def fail():
+            executions.append(1)
+            raise ValueError('calcul impossible')
+
+        results, errors = self.run_concurrently(fail, 'error')
+        self.assertEqual(len(executions), 1)
+        self.assertEqual(results, [])
+        self.assertEqual(len(errors), self.N_CALLS)
+        self.assertTrue(all(isinstance(error, ValueError) for error in errors))
+        # Le calcul suivant est relancé
+        self.assertEqual(self.group.do('key', lambda: 'ok', 'error'), 'ok')
+
+    def test_stats(self):
+        self.run_concurrently(lambda: 'ok', 'a')
+        self.group.do('other', lambda: 'ok', 'b')
+        self.assertEqual(self.group.stats(), {
+            'in_flight': 0,
+            'services': {
+                'a': {'calls': self.N_CALLS, 'executions': 1, 'coalesced': self.N_CALLS - 1,
+                      'coalescing_rate': round((self.N_CALLS - 1) / self.N_CALLS, 4)},
+                'b': {'calls': 1, 'executions': 1, 'coalesced': 0, 'coalescing_rate': 0},
+            },
+        })
+
+    def test_version_change_new_key(self):
+        release, executions = threading.Event(), []
+
+        class Registry:
+            current = 'v1'
+
+            def version(self):
+                return self.current
+
+        class Service:
+            registry = Registry()
+
+            def get_value(self, name):
+                executions.append(self.registry.current)
+                release.wait(5)
+                return {'name': name}
+
+        service = SingleFlightService(Service(), self.group, 'service')
+        first = threading.Thread(target=service.get_value, args=('x',))
+        first.start()
+        self.wait_until(lambda: len(executions) == 1)
+
+        # Calcul en cours sur v1 : un appel après rechargement ne l'attend pas
+        Service.registry.current = 'v2'
+        second = threading.Thread(target=service.get_value, args=('x',))
+        second.start()
+        self.wait_until(lambda: len(executions) == 2)
+        release.set()
+        first.join()
+        second.join()
+
+        self.assertEqual(executions, ['v1', 'v2'])
+        self.assertEqual(self.group.stats()['services']['service']['coalesced'], 0)
+
+
+class PrecomputedStoreTests(SimpleTestCase):
+    """Réponses précalculées : servies pour la version des données du store, ignorées sinon."""
+
+    def setUp(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.directory = os.path.join(tmp_dir.name, 'precomputed')
+        self.client = APIClient()
+        self.client.force_authenticate(User(username='artist'))
+        response_cache.backend.clear()
+        self.addCleanup(response_cache.backend.clear)
+
+    def get_metrics(self, store):
+        with mock.patch.object(views, 'precomputed_store', store):
+            return self.client.get('/api/music/artists/metrics-genre/', {'genre': 'Pop'})
+
+    def test_stored_response_served(self):
+        stored = {'genre': 'Pop', 'count': -1}
+        write_precomputed_store(self.directory, dataset_registry.version(), {'artists/metrics-genre': {'genre=Pop': stored}})
+        store = PrecomputedStore(self.directory)
+        response = self.get_metrics(store)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, stored)
+        self.assertEqual(store.stats()['hits'], 1)
+
+    def test_old_version_ignored(self):
+        write_precomputed_store(self.directory, 'ancienne-version', {'artists/metrics-genre': {'genre=Pop': {'genre': 'Pop', 'count': -1}}})
+        store = PrecomputedStore(self.directory)
+        with contextlib.redirect_stdout(io.StringIO()):
+            response = self.get_metrics(store)
+        self.assertEqual(response.data, MusicServiceArtist().get_metrics_by_genre('Pop'))
+        self.assertEqual(store.stats()['misses'], 1)
+
+    def test_command_output_served(self):
+        with contextlib.redirect_stdout(io.StringIO()):
+            call_command('precompute_recommendations', workers=1, output=self.directory, stdout=io.StringIO())
+        store = PrecomputedStore(self.directory)
+        self.assertEqual(self.get_metrics(store).data, MusicServiceArtist().get_metrics_by_genre('Pop'))
+        self.assertEqual(store.stats()['version'], dataset_registry.version())
+        self.assertEqual(store.stats()['hits'], 1)
+        self.assertFalse(os.path.exists(f"{self.directory}.tmp"))
+
+
+class ComputeBackendTests(SimpleTestCase):
+    """Pool de processus : 503 si la file est pleine, 504 au-delà du délai, pool recréé après un crash."""
+
+    def thread_backend(self, operation, **options):
+        # Pool de threads à la place des processus : seules les règles du backend sont testées
+        patches = [
+            mock.patch.object(ComputeBackend, 'ProcessPoolExecutor', lambda max_workers, **_: ThreadPoolExecutor(max_workers)),
+            mock.patch.object(ComputeBackend, '_run_operation', lambda _operation, args, kwargs, _version: operation(*args, **kwargs)),
+            mock.patch.object(ProcessPoolBackend, '_check_snapshot', lambda *_: None),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        return ProcessPoolBackend(**options)
+
+    def test_queue_full(self):
+        release = threading.Event()
+        backend = self.thread_backend(lambda: release.wait(5), max_queue=1)
+        first = threading.Thread(target=backend.run, args=('op', (), {}, 'v1'))
+        first.start()
+        try:
+            with self.assertRaises(ComputeOverloaded) as raised:
+                backend.run('op', (), {}, 'v1')
+        finally:
+            release.set()
+            first.join()
+        self.assertEqual(raised.exception.status, 503)
+        self.assertEqual(backend.stats()['rejected'], 1)
+        self.assertTrue(backend.run('op', (), {}, 'v1'))
+
+    def test_timeout(self):
+        release = threading.Event()
+        backend = self.thread_backend(lambda: release.wait(5), timeout=0.05)
+        try:
+            with self.assertRaises(ComputeTimeout) as raised:
+                backend.run('op', (), {}, 'v1')
+        finally:
+            release.set()
+        self.assertEqual(raised.exception.status, 504)
+        self.assertEqual(backend.stats()['timeouts'], 1)
+
+    def test_broken_pool_rebuilt(self):
+        backend = ProcessPoolBackend(max_workers=1, timeout=60)
+        self.addCleanup(lambda: backend._executor and backend._executor.shutdown())
+        version = dataset_registry.version()
+        expected = MusicServiceArtist().get_metrics_by_genre('Pop')
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.assertEqual(backend.run('get_metrics_by_genre', ('Pop',), {}, version), expected)
+
+            # Processus de calcul tué : une erreur 503, puis un nouveau pool
+            broken = backend._executor
+            for process in list(broken._processes.values()):
+                process.kill()
+            with self.assertRaises(ComputeUnavailable) as raised:
+                backend.run('get_metrics_by_genre', ('Pop',), {}, version)
+            self.assertEqual(raised.exception.status, 503)
+            self.assertEqual(backend.run('get_metrics_by_genre', ('Pop',), {}, version), expected)
+        self.assertIsNot(backend._executor, broken)
+        self.assertEqual(backend.stats()['failures'], 1)
+
+    def test_unavailable_never_cached(self):
+        client = APIClient()
+        client.force_authenticate(User(username='artist'))
+        response_cache.backend.clear()
+        for error in (ComputeOverloaded(), ComputeTimeout()):
+            with mock.patch.object(MusicServiceArtist, 'get_metrics_by_genre', side_effect=error):
+                response = client.get('/api/music/artists/metrics-genre/', {'genre': 'Pop'})
+            self.assertEqual(response.status_code, error.status)
+            self.assertIs(response_cache.get('artists/metrics-genre', {'genre': 'Pop'}), MISSING)
+        response = client.get('/api/music/artists/metrics-genre/', {'genre': 'Pop'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response_cache.get('artists/metrics-genre', {'genre': 'Pop'}), response.data)
+
+    def test_stale_snapshot_warning(self):
+        backend = ProcessPoolBackend()
+        with tempfile.TemporaryDirectory() as tmp_dir, override_settings(DATA_SNAPSHOT_DIR=os.path.join(tmp_dir, 'snapshot')):
+            snapshot_dir = settings.DATA_SNAPSHOT_DIR
+            output = io.StringIO()
+            with contextlib.redirect_stdout(output):
+                backend._check_snapshot('v1')
+                backend._check_snapshot('v1')
+            self.assertEqual(output.getvalue().count('snapshot absent ou périmé'), 1)
+
+            write_data_snapshot(snapshot_dir, settings.DATA_DIR, quiet(read_csv_datasets, ('genre_region_age', 'tracks')))
+            output = io.StringIO()
+            with contextlib.redirect_stdout(output):
+                backend._check_snapshot('v2')
+            self.assertEqual(output.getvalue(), '')
+
+
+class AsyncViewsTests(TestCase):
+    """Vues async : JWT, calculs identiques partagés, surcharge et streaming dans le pool."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('async-artist')
+
+    def setUp(self):
+        self.factory = AsyncRequestFactory()
+        self.headers = {'Authorization': f"Bearer {AccessToken.for_user(self.user)}"}
+        response_cache.backend.clear()
+
+    def get(self, path, params=None, headers=None):
+        return self.factory.get(path, params or {}, headers=self.headers if headers is None else headers)
+
+    async def test_jwt_authentication(self):
+        path = '/api/music/artists/metrics-genre/'
+        response = await async_views.get_metrics_by_genre(self.get(path, {'genre': 'Pop'}))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content)['genre'], 'Pop')
+
+        for headers in ({}, {'Authorization': 'Bearer pas-un-jeton'}):
+            response = await async_views.get_metrics_by_genre(self.get(path, {'genre': 'Pop'}, headers))
+            self.assertEqual(response.status_code, 401, headers)
+
+        response = await async_views.get_metrics_by_genre(self.get(path, {'genre': 'Musique'}))
+        self.assertEqual(response.status_code, 400)
+
+    async def test_concurrent_calls_coalesced(self):
+        calls, release = [], threading.Event()
+
+        def compute():
+            calls.append(1)
+            release.wait(5)
+            return {'value': len(calls)}
+
+        async def release_later():
+            await asyncio.sleep(0.05)
+            release.set()
+
+        coalesced = async_executor.stats()['coalesced']
+        request = self.get('/')
+        first, second, _ = await asyncio.gather(
+            async_views.async_cached_response(request, 'tests/coalesced', {'id': 1}, compute),
+            async_views.async_cached_response(request, 'tests/coalesced', {'id': 1}, compute),
+            release_later(),
+        )
+        self.assertEqual(len(calls), 1)
+        self.assertEqual((first.status_code, second.status_code), (200, 200))
+        self.assertEqual(first.content, second.content)
+        self.assertEqual(async_executor.stats()['coalesced'], coalesced + 1)
+
+    async def test_overloaded(self):
+        max_pending = async_executor.max_pending
+        async_executor.max_pending = 0
+        try:
+            response = await async_views.get_metrics_by_genre(self.get('/api/music/artists/metrics-genre/', {'genre': 'Rock'}))
+            stream = await async_views.get_tracks_from_genre_and_region_artist(self.get('/api/music/artists/tracks-genre-region/', {'stream': 'ndjson'}))
+        finally:
+            async_executor.max_pending = max_pending
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '1')
+        self.assertEqual(stream.status_code, 503)
+
+    async def test_stream(self):
+        params = {'stream': 'ndjson', 'genre': 'Pop', 'order_by': '-bpm', 'fields': 'rank,title'}
+        response = await async_views.get_tracks_from_genre_and_region_artist(self.get('/api/music/artists/tracks-genre-region/', params))
+        self.assertEqual(response.status_code, 200)
+
+        # Admise avant le 200 : une surcharge pendant l'envoi ne tronque pas la réponse
+        max_pending = async_executor.max_pending
+        async_executor.max_pending = 0
+        try:
+            content = b''.join([chunk async for chunk in response.streaming_content])
+        finally:
+            async_executor.max_pending = max_pending
+
+        client = APIClient()
+        client.force_authenticate(self.user)
+        expected = (await sync_to_async(client.get)('/api/music/artists/tracks-genre-region/', {'genre': 'Pop', 'order_by': '-bpm', 'fields': 'rank,title'})).data[0]['tracks']
+        self.assertEqual([json.loads(line) for line in content.splitlines() if line], expected)
@@ -1,12 +1,23 @@
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import views, async_views
+
+# Sous ASGI, les endpoints de calcul peuvent être servis par leur version async (mêmes URLs, mêmes réponses)
+compute_views = async_views if settings.RECOMMENDATIONS_ASYNC['ENABLED'] else views
 
 urlpatterns = [
-    path('listeners/popular-genres-region/', views.get_popular_genres_by_region, name='popular_genres_by_region'),
-    path('listeners/popular-genres-region-age/', views.get_popular_genres_by_region_and_age, name='popular_genres_by_region_and_age'),
-    path('artists/popular-genres-region/', views.get_popular_genres_by_region_artist, name='popular_genres_by_region'),
-    path('artists/popular-genres-region-age/', views.get_popular_genres_by_region_and_age_artist, name='popular_genres_by_region_and_age'),
-    path('artists/tracks-genre-region/', views.get_tracks_from_genre_and_region_artist, name='tracks_from_genre_and_region_artist'),
-    path('artists/metrics-genre/', views.get_metrics_by_genre, name='metrics_by_genre'),
-    path('artists/metrics-region/', views.get_metrics_by_region, name='metrics_by_region'),
+    path('listeners/popular-genres-region/', compute_views.get_popular_genres_by_region, name='popular_genres_by_region'),
+    path('listeners/popular-genres-region-age/', compute_views.get_popular_genres_by_region_and_age, name='popular_genres_by_region_and_age'),
+    path('listeners/recommended-tracks/', views.get_recommended_tracks, name='recommended_tracks'),
+    path('artists/popular-genres-region/', compute_views.get_popular_genres_by_region_artist, name='popular_genres_by_region'),
+    path('artists/popular-genres-region-age/', compute_views.get_popular_genres_by_region_and_age_artist, name='popular_genres_by_region_and_age'),
+    path('artists/tracks-genre-region/', compute_views.get_tracks_from_genre_and_region_artist, name='tracks_from_genre_and_region_artist'),
+    path('artists/similar-tracks/', views.get_similar_tracks, name='similar_tracks'),
+    path('artists/metrics-genre/', compute_views.get_metrics_by_genre, name='metrics_by_genre'),
+    path('artists/metrics-region/', compute_views.get_metrics_by_region, name='metrics_by_region'),
+    path('popular-genres-map/', views.get_popular_genres_map, name='popular_genres_map'),
+    path('datasets/footprint/', views.get_datasets_footprint, name='datasets_footprint'),
+    path('datasets/reload/', views.reload_datasets, name='datasets_reload'),
+    path('datasets/tracks/append/', views.append_tracks, name='datasets_tracks_append'),
+    path('cache/stats/', views.get_cache_stats, name='cache_stats'),
 ]
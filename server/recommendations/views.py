@@ -1,82 +1,243 @@
+import gzip
+import hashlib
+import json
+from django.conf import settings
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils.http import parse_etags
 from rest_framework.decorators import api_view, permission_classes
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
 from rest_framework import permissions
 from .services.MusicServiceListener import MusicServiceListeners
 from .services.MusicServiceArtist import MusicServiceArtist
+from .services.DatasetRegistry import dataset_registry
+from .services.ResponseCache import response_cache
+from .services.PrecomputedStore import precomputed_store
+from .services.AsyncExecutor import async_executor
+from .services.SingleFlight import SingleFlightService, single_flight
+from .services.ComputeBackend import ComputeUnavailable, compute_backend, with_compute_backend
+from .Utils import TRACK_FIELDS, TRACK_SORT_KEYS, MAX_TRACKS_PAGE_SIZE, DEFAULT_RECOMMENDATIONS, MAX_RECOMMENDATIONS, age_group_from_birth_date, genre_key, DEFAULT_SIMILAR_TRACKS, MAX_SIMILAR_TRACKS
 
 # Init du service (une fois pour toute l'application)
-music_listeners_service = MusicServiceListeners()
-music_artist_service = MusicServiceArtist()
+# Les requêtes identiques simultanées (démarrage, rechargement, cache froid) partagent un seul calcul
+music_listeners_service = SingleFlightService(MusicServiceListeners(), single_flight, 'listeners')
+# Les opérations lourdes des artistes peuvent partir dans un pool de processus (RECOMMENDATIONS_COMPUTE)
+music_artist_service = SingleFlightService(
+    with_compute_backend(MusicServiceArtist(), compute_backend, settings.RECOMMENDATIONS_COMPUTE['OPERATIONS']),
+    single_flight, 'artists',
+)
+
+def response_etag(endpoint, params):
+    # ETag fort : ne dépend que de la requête et de la version des données, calculable sans rien calculer
+    key = response_cache.key(endpoint, params, dataset_registry.version())
+    return f'"{hashlib.sha1(key.encode()).hexdigest()[:20]}"'
+
+def is_not_modified(request, etag):
+    if_none_match = parse_etags(request.headers.get('If-None-Match', ''))
+    return etag in if_none_match or '*' in if_none_match
+
+def compute_cached(endpoint, params, compute):
+    # Cache des réponses, puis réponse précalculée hors ligne si elle existe, sinon calcul en direct
+    return response_cache.get_or_compute(endpoint, params, lambda: precomputed_store.get_or_compute(endpoint, params, compute))
+
+def cached_response(request, endpoint, params, compute, cache_control=None):
+    etag = response_etag(endpoint, params)
+    headers = {'ETag': etag, 'Cache-Control': cache_control or settings.RECOMMENDATIONS_CACHE_CONTROL, 'Vary': 'Authorization'}
+
+    # Le client a déjà cette réponse : 304 avant tout calcul
+    if is_not_modified(request, etag):
+        return Response(status=304, headers=headers)
+
+    try:
+        result = compute_cached(endpoint, params, compute)
+    except ComputeUnavailable as e:
+        # Pool de calcul saturé ou trop lent : rien n'est mis en cache
+        return Response({"error": e.message}, status=e.status)
+
+    if "error" in result:
+        return Response({"error": result["error"]}, status=400)
+
+    return Response(result, status=200, headers=headers)
+
+def split_param(value):
+    # 'Corse,Bretagne' -> ['Corse', 'Bretagne'] : plusieurs régions / tranches d'âge en un seul appel
+    if value and ',' in value:
+        return [item.strip() for item in value.split(',') if item.strip()]
+    return value
+
+def parse_int_param(value, minimum, maximum):
+    # Entier entre minimum et maximum, None sinon ('³' passe isdigit() mais pas int())
+    try:
+        number = int(value)
+    except ValueError:
+        return None
+    return number if minimum <= number <= maximum else None
+
+# Formats de streaming de artists/tracks-genre-region
+TRACKS_STREAM_FORMATS = {
+    'json': 'application/json',
+    'ndjson': 'application/x-ndjson',
+}
 
 # Endpoints pour les listeners
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
 def get_popular_genres_by_region(request):
     
-    region = request.query_params.get('region', None)
+    region = split_param(request.query_params.get('region', None))
 
-    result = music_listeners_service.get_listeners_genre_by_region(region)
-
-    if "error" in result:
-        return Response({"error": result["error"]}, status=400)
-    
-    return Response(result, status=200)
+    return cached_response(request, 'listeners/popular-genres-region', {'region': region}, lambda: music_listeners_service.get_listeners_genre_by_region(region))
 
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
 def get_popular_genres_by_region_and_age(request):
     
-    region = request.query_params.get('region', None)
-    age = request.query_params.get('age', None)
+    region = split_param(request.query_params.get('region', None))
+    age = split_param(request.query_params.get('age', None))
 
-    result = music_listeners_service.get_listeners_genre_by_region_and_age(region, age)
+    return cached_response(request, 'listeners/popular-genres-region-age', {'region': region, 'age': age}, lambda: music_listeners_service.get_listeners_genre_by_region_and_age(region, age))
 
-    if "error" in result:
-        return Response({"error": result["error"]}, status=400)
-    
-    return Response(result, status=200)
+def profile_params(profile):
+    """Tranche d'âge et genres favoris d'un profil, plus une empreinte utilisée comme clé de cache.
+
+    Deux profils avec les mêmes goûts et la même tranche d'âge partagent la même entrée.
+    """
+    age_group = age_group_from_birth_date(profile.birth_date)
+    favorite_genres = sorted({genre.strip() for genre in (profile.favorite_genres or '').split(',') if genre_key(genre)})
+    profile_hash = hashlib.sha1(json.dumps([age_group, sorted({genre_key(genre) for genre in favorite_genres})]).encode()).hexdigest()[:16]
+    return age_group, favorite_genres, profile_hash
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def get_recommended_tracks(request):
+
+    region = request.query_params.get('region', None) or None
+    k = request.query_params.get('k', None)
+
+    profile = getattr(request.user, 'profile', None)
+    if profile is None:
+        return Response({"error": "Aucun profil associé à cet utilisateur"}, status=400)
+
+    if k:
+        k = parse_int_param(k, 1, MAX_RECOMMENDATIONS)
+        if k is None:
+            return Response({"error": f"k doit être un entier entre 1 et {MAX_RECOMMENDATIONS}"}, status=400)
+    else:
+        k = DEFAULT_RECOMMENDATIONS
+
+    age_group, favorite_genres, profile_hash = profile_params(profile)
+
+    return cached_response(
+        request, 'listeners/recommended-tracks', {'profile': profile_hash, 'region': region, 'k': k},
+        lambda: music_listeners_service.get_recommended_tracks(region, age_group, favorite_genres, k),
+        cache_control=settings.RECOMMENDATIONS_PRIVATE_CACHE_CONTROL,
+    )
 
 # Endpoints pour les artistes
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
 def get_popular_genres_by_region_artist(request):
     
-    region = request.query_params.get('region', None)
-
-    result = music_artist_service.get_artists_genre_by_region(region)
+    region = split_param(request.query_params.get('region', None))
 
-    if "error" in result:
-        return Response({"error": result["error"]}, status=400)
-    
-    return Response(result, status=200)
+    return cached_response(request, 'artists/popular-genres-region', {'region': region}, lambda: music_artist_service.get_artists_genre_by_region(region))
 
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
 def get_popular_genres_by_region_and_age_artist(request):
     
-    region = request.query_params.get('region', None)
-    age = request.query_params.get('age', None)
+    region = split_param(request.query_params.get('region', None))
+    age = split_param(request.query_params.get('age', None))
 
-    result = music_artist_service.get_artists_genre_by_region_and_age(region, age)
+    return cached_response(request, 'artists/popular-genres-region-age', {'region': region, 'age': age}, lambda: music_artist_service.get_artists_genre_by_region_and_age(region, age))
 
-    if "error" in result:
-        return Response({"error": result["error"]}, status=400)
-    
-    return Response(result, status=200)
+def parse_tracks_params(query_params):
+    """Paramètres de artists/tracks-genre-region validés : (options, None) ou (None, message d'erreur)."""
+    options = {
+        'region': query_params.get('region', None),
+        'genre': query_params.get('genre', None),
+        'stream': query_params.get('stream', None) or None,
+        'order_by': query_params.get('order_by', None) or None,
+        'fields': None,
+        'limit': None,
+        'cursor': query_params.get('cursor', None) or None,
+    }
+
+    if options['stream'] and options['stream'] not in TRACKS_STREAM_FORMATS:
+        return None, f"Format de streaming invalide, valeurs possibles : {', '.join(TRACKS_STREAM_FORMATS)}"
+
+    if options['order_by'] is not None and options['order_by'].lstrip('-') not in TRACK_SORT_KEYS:
+        return None, f"Tri invalide, valeurs possibles : {', '.join(TRACK_SORT_KEYS)} (préfixe - pour l'ordre décroissant)"
+
+    # fields= : seules les colonnes demandées sont renvoyées
+    fields = query_params.get('fields', None)
+    if fields:
+        options['fields'] = parse_list_param(fields, TRACK_FIELDS)
+        if not options['fields']:
+            return None, f"Champs invalides, valeurs possibles : {', '.join(TRACK_FIELDS)}"
+
+    limit = query_params.get('limit', None)
+    if limit:
+        options['limit'] = parse_int_param(limit, 1, MAX_TRACKS_PAGE_SIZE)
+        if options['limit'] is None:
+            return None, f"limit doit être un entier entre 1 et {MAX_TRACKS_PAGE_SIZE}"
+
+    # Le streaming envoie toute la sélection : une pagination demandée ne doit pas être ignorée en silence
+    if options['stream'] and (options['limit'] is not None or options['cursor'] is not None):
+        return None, "stream ne se combine pas avec limit ni cursor (le streaming renvoie toutes les pistes)"
+
+    return options, None
+
+def tracks_cache_params(options):
+    return {
+        'region': options['region'], 'genre': options['genre'], 'order_by': options['order_by'],
+        'fields': ','.join(options['fields']) if options['fields'] else None, 'limit': options['limit'], 'cursor': options['cursor'],
+    }
+
+def compute_tracks(options):
+    return music_artist_service.get_tracks_from_genre_and_region(options['region'], options['genre'], options['order_by'], options['fields'], options['limit'], options['cursor'])
 
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
 def get_tracks_from_genre_and_region_artist(request):
 
+    options, error = parse_tracks_params(request.query_params)
+    if error:
+        return Response({"error": error}, status=400)
+
+    # ?stream=json ou ?stream=ndjson : envoi par morceaux, sans construire toute la réponse en mémoire
+    if options['stream']:
+        result = music_artist_service.stream_tracks_from_genre_and_region(options['region'], options['genre'], options['stream'], options['order_by'], options['fields'])
+
+        if isinstance(result, dict) and "error" in result:
+            return Response({"error": result["error"]}, status=400)
+
+        return StreamingHttpResponse(result, content_type=TRACKS_STREAM_FORMATS[options['stream']])
+
+    return cached_response(request, 'artists/tracks-genre-region', tracks_cache_params(options), lambda: compute_tracks(options))
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def get_similar_tracks(request):
+
+    rank = request.query_params.get('rank', None)
     region = request.query_params.get('region', None)
     genre = request.query_params.get('genre', None)
+    k = request.query_params.get('k', None)
 
-    result = music_artist_service.get_tracks_from_genre_and_region(region, genre)
+    # Borné aux entiers 64 bits de la colonne rank
+    rank = parse_int_param(rank, -2 ** 63, 2 ** 63 - 1) if rank else None
+    if rank is None:
+        return Response({"error": "Le paramètre rank (entier) est obligatoire"}, status=400)
 
-    if "error" in result:
-        return Response({"error": result["error"]}, status=400)
-    
-    return Response(result, status=200)
+    if k:
+        k = parse_int_param(k, 1, MAX_SIMILAR_TRACKS)
+        if k is None:
+            return Response({"error": f"k doit être un entier entre 1 et {MAX_SIMILAR_TRACKS}"}, status=400)
+    else:
+        k = DEFAULT_SIMILAR_TRACKS
+
+    return cached_response(request, 'artists/similar-tracks', {'rank': rank, 'region': region, 'genre': genre, 'k': k}, lambda: music_artist_service.get_similar_tracks(rank, region, genre, k))
 
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
@@ -84,12 +245,7 @@ def get_metrics_by_genre(request):
 
     genre = request.query_params.get('genre', None)
 
-    result = music_artist_service.get_metrics_by_genre(genre)
-
-    if "error" in result:
-        return Response({"error": result["error"]}, status=400)
-    
-    return Response(result, status=200)
+    return cached_response(request, 'artists/metrics-genre', {'genre': genre}, lambda: music_artist_service.get_metrics_by_genre(genre))
 
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
@@ -97,11 +253,119 @@ def get_metrics_by_region(request):
 
     region = request.query_params.get('region', None)
 
-    result = music_artist_service.get_metrics_by_region(region)
+    return cached_response(request, 'artists/metrics-region', {'region': region}, lambda: music_artist_service.get_metrics_by_region(region))
+
+# Carte complète : toutes les régions, tous les âges, variantes listeners et artists
+GENRE_MAP_VARIANTS = ('listeners', 'artists')
+GENRE_MAP_FIELDS = ('genre', 'score', 'raw_score')
+
+def parse_list_param(value, allowed):
+    if not value:
+        return list(allowed)
+    values = [item.strip() for item in value.split(',') if item.strip()]
+    return [item for item in allowed if item in values] if set(values) <= set(allowed) else None
+
+def build_genre_map_payload(variants, fields):
+    regions = {}
+    for variant in variants:
+        if variant == 'listeners':
+            genre_map = music_listeners_service.get_listeners_genre_map()
+        else:
+            genre_map = music_artist_service.get_artists_genre_map()
+        if "error" in genre_map:
+            return genre_map
+
+        for region, groups in genre_map.items():
+            regions.setdefault(region, {})[variant] = {
+                group: [{field: genre[field] for field in fields} for genre in genres]
+                for group, genres in groups.items()
+            }
+
+    # Sérialisé et compressé une seule fois par version des données
+    body = JSONRenderer().render({'regions': regions})
+    return {'json': body, 'gzip': gzip.compress(body)}
+
+def accepts_gzip(accept_encoding):
+    """Vrai si l'en-tête Accept-Encoding accepte gzip avec une qualité non nulle (gzip;q=0 le refuse)."""
+    qualities = {}
+    for item in accept_encoding.split(','):
+        coding, *options = [part.strip() for part in item.split(';')]
+        quality = 1.0
+        for option in options:
+            name, _, value = option.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if coding:
+            qualities[coding.lower()] = quality
+    # Un codage absent prend la qualité de '*', s'il est listé
+    quality = qualities.get('gzip', qualities.get('x-gzip', qualities.get('*', 0.0)))
+    return quality > 0
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def get_popular_genres_map(request):
+
+    variants = parse_list_param(request.query_params.get('variants', None), GENRE_MAP_VARIANTS)
+    fields = parse_list_param(request.query_params.get('fields', None), GENRE_MAP_FIELDS)
+
+    if not variants or not fields:
+        return Response({"error": f"Paramètres invalides : variants parmi {GENRE_MAP_VARIANTS}, fields parmi {GENRE_MAP_FIELDS}"}, status=400)
+
+    params = {'variants': ','.join(variants), 'fields': ','.join(fields)}
+    use_gzip = accepts_gzip(request.headers.get('Accept-Encoding', ''))
+    # Les deux représentations (gzip ou non) ont chacune leur ETag
+    etag = response_etag('popular-genres-map', {**params, 'encoding': 'gzip' if use_gzip else None})
+    headers = {'ETag': etag, 'Cache-Control': settings.RECOMMENDATIONS_CACHE_CONTROL, 'Vary': 'Accept-Encoding, Authorization'}
+
+    if is_not_modified(request, etag):
+        return Response(status=304, headers=headers)
+
+    payload = response_cache.get_or_compute('popular-genres-map', params, lambda: build_genre_map_payload(variants, fields))
+
+    if "error" in payload:
+        return Response({"error": payload["error"]}, status=400)
+
+    if use_gzip:
+        response = HttpResponse(payload['gzip'], content_type='application/json', headers=headers)
+        response['Content-Encoding'] = 'gzip'
+        return response
+
+    return HttpResponse(payload['json'], content_type='application/json', headers=headers)
+
+# Endpoint d'administration
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated, permissions.IsAdminUser])
+def get_datasets_footprint(request):
+    return Response(dataset_registry.footprint(), status=200)
+
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated, permissions.IsAdminUser])
+def reload_datasets(request):
+    # Rechargement en arrière-plan dans tous les workers : les requêtes en cours continuent sur l'ancienne version
+    dataset_registry.request_reload()
+    return Response({"status": "reloading", "version": dataset_registry.source_version()}, status=202)
+
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated, permissions.IsAdminUser])
+def append_tracks(request):
+
+    result = music_artist_service.append_tracks(request.data.get('tracks', None))
 
     if "error" in result:
         return Response({"error": result["error"]}, status=400)
-    
-    return Response(result, status=200)
 
+    return Response(result, status=201)
 
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated, permissions.IsAdminUser])
+def get_cache_stats(request):
+    return Response({
+        **response_cache.stats(),
+        'precomputed': precomputed_store.stats(),
+        'async': async_executor.stats(),
+        'single_flight': single_flight.stats(),
+        'compute': compute_backend.stats() if compute_backend else {'backend': 'local'},
+    }, status=200)